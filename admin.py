@@ -1,11 +1,26 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, School, Class, StudentEnrollment, Grade, Announcement
+from django.utils import timezone
 
-class CustomUserAdmin(UserAdmin):
+from .models import User, School, Class, StudentEnrollment, Grade, Announcement, GradeStatistics, Job
+from .pagination import EstimatedCountPaginator
+from .routers import use_replica
+from .tasks import schedule_school_reports, schedule_class_statistics
+
+class ReplicaChangeListMixin:
+    # Changelist pages are read-only lists, so serve them from the read replica (if configured)
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with use_replica():
+            return super().changelist_view(request, extra_context)
+
+class CustomUserAdmin(ReplicaChangeListMixin, UserAdmin):
     # Fields to display in the admin user list
     list_display = ('username', 'email', 'role', 'school', 'is_staff', 'is_active')
     list_filter = ('role', 'school', 'is_staff', 'is_active')
+    list_select_related = ('school',)
+    autocomplete_fields = ('school',)
 
     # Organize fields when editing/adding a user
     fieldsets = (
@@ -23,36 +38,98 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('username', 'email', 'first_name', 'last_name')
     ordering = ('username',)
 
-class SchoolAdmin(admin.ModelAdmin):
+class SchoolAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('name', 'address', 'phone', 'email', 'created_at')
     list_filter = ('created_at',)
     search_fields = ('name', 'address', 'email')
     ordering = ('name',)
+    actions = ['recompute_grade_reports']
+
+    @admin.action(description='Recompute grade reports in the background')
+    def recompute_grade_reports(self, request, queryset):
+        for school in queryset:
+            schedule_school_reports(school)
+        self.message_user(request, f'Queued grade reports for {len(queryset)} schools.')
 
-class ClassAdmin(admin.ModelAdmin):
+class ClassAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('name', 'subject', 'school', 'teacher', 'created_at')
     list_filter = ('school', 'subject', 'created_at')
+    list_select_related = ('school', 'teacher')
+    autocomplete_fields = ('school', 'teacher')
     search_fields = ('name', 'subject', 'teacher__username')
     ordering = ('name',)
+    actions = ['rebuild_statistics']
 
-class StudentEnrollmentAdmin(admin.ModelAdmin):
+    @admin.action(description='Rebuild grade statistics in the background')
+    def rebuild_statistics(self, request, queryset):
+        # One job per class; the workers rebuild them in batches
+        for class_obj in queryset:
+            schedule_class_statistics(class_obj)
+        self.message_user(request, f'Queued statistics rebuilds for {len(queryset)} classes.')
+
+class StudentEnrollmentAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('student', 'class_enrolled', 'enrolled_at')
-    list_filter = ('class_enrolled__school', 'enrolled_at')
+    list_filter = ('class_enrolled__school',)
+    list_select_related = ('student', 'class_enrolled')
+    autocomplete_fields = ('student', 'class_enrolled')
+    date_hierarchy = 'enrolled_at'
     search_fields = ('student__username', 'class_enrolled__name')
     ordering = ('-enrolled_at',)
 
-class GradeAdmin(admin.ModelAdmin):
-    list_display = ('student', 'class_enrolled', 'assignment_name', 'grade', 'max_grade', 'created_at')
-    list_filter = ('class_enrolled__school', 'created_at')
+class GradeAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('student', 'class_enrolled', 'assignment_name', 'category', 'grade', 'max_grade', 'created_at')
+    list_filter = ('class_enrolled__school', 'category')
+    list_select_related = ('student', 'class_enrolled')
+    autocomplete_fields = ('student', 'class_enrolled')
+    date_hierarchy = 'created_at'
+    # Millions of rows: estimate the unfiltered total, and don't count it again
+    # (or per filter choice) next to filtered results
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
     search_fields = ('student__username', 'assignment_name', 'class_enrolled__name')
     ordering = ('-created_at',)
 
-class AnnouncementAdmin(admin.ModelAdmin):
+class AnnouncementAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('title', 'school', 'class_target', 'created_by', 'created_at')
-    list_filter = ('school', 'created_at')
+    list_filter = ('school',)
+    list_select_related = ('school', 'class_target', 'created_by')
+    autocomplete_fields = ('school', 'class_target', 'created_by')
+    date_hierarchy = 'created_at'
     search_fields = ('title', 'content', 'created_by__username')
     ordering = ('-created_at',)
 
+class GradeStatisticsAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    # Maintained by signals; rebuild with `manage.py rebuild_grade_stats`. Rebuilds
+    # delete and recreate rows, so the table is counted rather than estimated
+    list_display = ('class_enrolled', 'student', 'count', 'total', 'min_grade', 'max_grade')
+    list_select_related = ('class_enrolled', 'student')
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    search_fields = ('student__username', 'class_enrolled__name')
+    readonly_fields = ('student', 'class_enrolled', 'count', 'total', 'total_squares', 'min_grade', 'max_grade')
+
+    def has_add_permission(self, request):
+        return False
+
+class JobAdmin(admin.ModelAdmin):
+    # Finished jobs are deleted, so this shows the queue plus failures
+    list_display = ('task', 'status', 'priority', 'attempts', 'run_after', 'shard', 'locked_by')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'dedupe_key')
+    ordering = ('status', '-priority', 'run_after')
+    readonly_fields = ('attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_jobs(self, request, queryset):
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, attempts=0, run_after=timezone.now(), finished_at=None,
+            # A newer pending job may hold the key by now
+            dedupe_key=None,
+        )
+        self.message_user(request, f'{count} jobs queued again.')
+
 # Register all models
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(School, SchoolAdmin)
@@ -60,3 +137,5 @@ admin.site.register(Class, ClassAdmin)
 admin.site.register(StudentEnrollment, StudentEnrollmentAdmin)
 admin.site.register(Grade, GradeAdmin)
 admin.site.register(Announcement, AnnouncementAdmin)
+admin.site.register(GradeStatistics, GradeStatisticsAdmin)
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,133 @@
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Announcement
+from .routers import primary_reads
+from .sharding import fan_out, shard_scoped
+
+# ==================== AUDIENCES ====================
+
+# Each audience has its own cached, bounded timeline, newest first:
+#   ALL            every announcement (super admins)
+#   GLOBAL         announcements with no school
+#   ('school', id) announcements for one school
+#   ('class', id)  announcements targeted at one class
+ALL = ('all', None)
+GLOBAL = ('global', None)
+
+def school_audience(school_id):
+    return ('school', school_id)
+
+def class_audience(class_id):
+    return ('class', class_id)
+
+def audiences_for(school_id, class_id):
+    """Every timeline an announcement with these targets appears in"""
+    audiences = [ALL, school_audience(school_id) if school_id else GLOBAL]
+    if class_id:
+        audiences.append(class_audience(class_id))
+    return audiences
+
+# ==================== TIMELINE CACHE ====================
+
+def timeline_length():
+    return getattr(settings, 'ANNOUNCEMENT_TIMELINE_LENGTH', 20)
+
+def _timeline_key(audience):
+    kind, pk = audience
+    key = f'arday:announcements:{kind}:{pk}'
+    # Class ids are only unique within one shard; ALL and GLOBAL span every shard
+    return shard_scoped(key) if kind == 'class' else key
+
+def _sort_key(announcement):
+    return (announcement.created_at, announcement.pk)
+
+def _identity(announcement):
+    # Primary keys repeat across shards
+    return (announcement._state.db, announcement.pk)
+
+def _base_queryset():
+    return Announcement.objects.select_related('created_by', 'school', 'class_target').order_by(
+        '-created_at', '-pk'
+    )
+
+def _load_timelines(audiences):
+    """Read timelines from the database, one query per kind of audience"""
+    length = timeline_length()
+    timelines = {audience: [] for audience in audiences}
+
+    for audience in audiences:
+        kind, pk = audience
+        if kind == 'all':
+            # Every shard's newest `length`, merged
+            shard_timelines = fan_out(lambda: list(_base_queryset()[:length]))
+            timelines[audience] = list(heapq.merge(*shard_timelines, key=_sort_key, reverse=True))[:length]
+        elif kind == 'global':
+            # Global announcements have no school, so they live in the directory
+            timelines[audience] = list(
+                _base_queryset().using(DEFAULT_DB_ALIAS).filter(school__isnull=True)[:length]
+            )
+
+    # Schools and classes are fetched together, keeping the newest `length` rows per target
+    for kind, field in (('school', 'school'), ('class', 'class_target')):
+        ids = [pk for audience_kind, pk in audiences if audience_kind == kind]
+        if not ids:
+            continue
+        rows = _base_queryset().filter(**{f'{field}__in': ids}).annotate(
+            timeline_rank=Window(
+                RowNumber(),
+                partition_by=F(field),
+                order_by=[F('created_at').desc(), F('pk').desc()],
+            )
+        ).filter(timeline_rank__lte=length)
+        for announcement in rows:
+            timelines[(kind, getattr(announcement, f'{field}_id'))].append(announcement)
+
+    return timelines
+
+def get_timelines(audiences):
+    """Cached timelines for the given audiences, loading any misses in bulk"""
+    keys = {audience: _timeline_key(audience) for audience in audiences}
+    cached = cache.get_many(keys.values())
+    timelines = {audience: cached[key] for audience, key in keys.items() if key in cached}
+
+    missing = [audience for audience in audiences if audience not in timelines]
+    if missing:
+        # From the primary, since they are cached
+        with primary_reads():
+            loaded = _load_timelines(missing)
+        timeout = getattr(settings, 'ANNOUNCEMENT_TIMELINE_TIMEOUT', 3600)
+        cache.set_many({keys[audience]: timeline for audience, timeline in loaded.items()}, timeout)
+        timelines.update(loaded)
+    return timelines
+
+def invalidate_timelines(school_id, class_id):
+    cache.delete_many([_timeline_key(audience) for audience in audiences_for(school_id, class_id)])
+
+# ==================== FEED ====================
+
+def get_feed(audiences, limit):
+    """The newest `limit` announcements across the audiences, without duplicates.
+
+    Each timeline is already sorted, so this is a k-way merge that stops after
+    `limit` distinct announcements. Timelines only hold ANNOUNCEMENT_TIMELINE_LENGTH
+    items, so longer feeds are cut to that.
+    """
+    limit = min(limit, timeline_length())
+
+    timelines = get_timelines(list(dict.fromkeys(audiences)))
+    feed = []
+    seen = set()
+    for announcement in heapq.merge(*timelines.values(), key=_sort_key, reverse=True):
+        if _identity(announcement) in seen:
+            continue
+        seen.add(_identity(announcement))
+        feed.append(announcement)
+        if len(feed) == limit:
+            break
+    return feed
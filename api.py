@@ -0,0 +1,258 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import wraps
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_safe
+
+from .models import User, Class, StudentEnrollment, Grade, GradeStatistics
+from .dashboard_cache import (
+    get_super_admin_kpis, get_student_report, data_stamp, version_token,
+    school_data_namespace, audience_namespace, SUPER_ADMIN_KPIS, ANNOUNCEMENTS,
+)
+from .session_auth import get_auth
+from .views import require_role, require_school_access
+from . import announcements
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library gives the same JSON, only slower
+    orjson = None
+
+# Read-only JSON versions of the role dashboards for the mobile and kiosk
+# clients. Rows are read with values(), never as model instances, and every
+# response carries an ETag and Last-Modified built from the data stamps in
+# dashboard_cache.py, so a client revalidating unchanged data gets a 304 Not
+# Modified before any dashboard query runs.
+
+# Part of every ETag; bump it when a payload's shape changes
+API_VERSION = 1
+
+# ==================== SERIALIZATION ====================
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def dumps(data):
+    """Compact UTF-8 JSON; dict keys may be ids"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+def json_response(data):
+    response = HttpResponse(dumps(data), content_type='application/json')
+    # Clients may keep the body but must revalidate it (cheaply, see conditional())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+def announcement_data(announcement):
+    # Feeds come from the cached timelines, so these are already in memory
+    return {
+        'id': announcement.pk,
+        'title': announcement.title,
+        'content': announcement.content,
+        'school': announcement.school_id,
+        'class': announcement.class_target_id,
+        'created_by': announcement.created_by_id,
+        'created_at': announcement.created_at,
+    }
+
+def school_data(school):
+    return {'id': school.pk, 'name': school.name, 'slug': school.slug}
+
+# ==================== CONDITIONAL REQUESTS ====================
+
+def api_login_required(view_func):
+    """Answer anonymous API requests with 401 rather than a redirect to a login page"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not get_auth(request).is_authenticated:
+            return JsonResponse({'error': 'Authentication required.'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+def conditional(namespaces):
+    """condition() with ETag and Last-Modified from the data stamps of `namespaces(request)`.
+
+    The stamp covers everything the view returns, and the ETag is per user
+    since the dashboards are.
+    """
+    def stamp(request):
+        if not hasattr(request, '_data_stamp'):
+            request._data_stamp = data_stamp(*namespaces(request))
+        return request._data_stamp
+
+    def etag(request, *args, **kwargs):
+        token, _ = stamp(request)
+        return version_token({'api': API_VERSION, 'user': request.auth.pk, 'data': token})
+
+    def last_modified(request, *args, **kwargs):
+        return stamp(request)[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+def school_stamp(request):
+    return [school_data_namespace(request.school.pk)]
+
+def school_admin_stamp(request):
+    # School admins also see announcements for every school
+    return [school_data_namespace(request.school.pk), audience_namespace(announcements.GLOBAL)]
+
+def super_admin_stamp(request):
+    return [SUPER_ADMIN_KPIS, ANNOUNCEMENTS]
+
+# ==================== DASHBOARDS ====================
+
+GRADE_FIELDS = ('id', 'assignment_name', 'category', 'grade', 'max_grade', 'created_at')
+
+def class_averages(stats):
+    """{class id: {'count', 'average'}} from GradeStatistics values() rows"""
+    return {
+        row['class_enrolled_id']: {
+            'count': row['count'],
+            'average': round(row['total'] / row['count'], 2) if row['count'] else 0,
+        }
+        for row in stats
+    }
+
+@api_login_required
+@require_role('superadmin')
+@require_safe
+@conditional(super_admin_stamp)
+def super_admin_dashboard(request):
+    kpis = get_super_admin_kpis()
+    return json_response({
+        'total_schools': kpis['total_schools'],
+        'total_classes': kpis['total_classes'],
+        'total_teachers': kpis['total_teachers'],
+        'total_students': kpis['total_students'],
+        'super_admin_count': kpis['super_admin_count'],
+        'school_admin_count': kpis['school_admin_count'],
+        'recent_schools': [school_data(school) for school in kpis['recent_schools']],
+        'schools_with_most_students': [
+            {**school_data(school), 'student_count': school.student_count}
+            for school in kpis['schools_with_most_students']
+        ],
+        'recent_announcements': [
+            announcement_data(announcement) for announcement in announcements.get_feed([announcements.ALL], 10)
+        ],
+    })
+
+@api_login_required
+@require_school_access()
+@require_role('schooladmin')
+@require_safe
+@conditional(school_admin_stamp)
+def school_admin_dashboard(request, school_slug):
+    school = request.school
+    people = User.objects.filter(school=school)
+    person_fields = ('id', 'username', 'first_name', 'last_name')
+    counts = people.aggregate(
+        total_teachers=Count('pk', filter=Q(role='teacher')),
+        total_students=Count('pk', filter=Q(role='student')),
+    )
+    classes = Class.objects.filter(school=school)
+    feed_audiences = [announcements.school_audience(school.pk), announcements.GLOBAL]
+
+    return json_response({
+        'school': school_data(school),
+        **counts,
+        'total_classes': classes.count(),
+        'school_teachers': list(people.filter(role='teacher').order_by('pk').values(*person_fields)[:10]),
+        'school_students': list(people.filter(role='student').order_by('pk').values(*person_fields)[:10]),
+        'school_classes': list(classes.order_by('pk').values('id', 'name', 'subject', 'teacher_id')[:10]),
+        'classes_with_enrollment': list(classes.values('id', 'name', 'subject').annotate(
+            enrollment_count=Count('studentenrollment')
+        ).order_by('-enrollment_count', 'pk')[:5]),
+        'recent_announcements': [
+            announcement_data(announcement) for announcement in announcements.get_feed(feed_audiences, 10)
+        ],
+    })
+
+@api_login_required
+@require_school_access()
+@require_role('teacher')
+@require_safe
+@conditional(school_stamp)
+def teacher_dashboard(request, school_slug):
+    student_count = StudentEnrollment.objects.filter(
+        class_enrolled=OuterRef('pk')
+    ).values('class_enrolled').annotate(student_count=Count('pk')).values('student_count')
+    classes = list(Class.objects.filter(teacher_id=request.auth.pk).order_by('pk').values(
+        'id', 'name', 'subject',
+    ).annotate(student_count=Coalesce(Subquery(student_count), 0)))
+    class_ids = [row['id'] for row in classes]
+
+    averages = class_averages(GradeStatistics.objects.filter(
+        class_enrolled__in=class_ids, student__isnull=True
+    ).values('class_enrolled_id', 'count', 'total'))
+    for row in classes:
+        row['avg_grade'] = averages.get(row['id'], {}).get('average', 0)
+
+    enrollments = StudentEnrollment.objects.filter(class_enrolled__in=class_ids)
+    feed_audiences = [announcements.school_audience(request.school.pk)] + [
+        announcements.class_audience(class_id) for class_id in class_ids
+    ]
+
+    return json_response({
+        'total_classes': len(classes),
+        'total_students': enrollments.values('student').distinct().count(),
+        'classes': classes,
+        'student_enrollments': list(enrollments.order_by('pk').values(
+            'student_id', 'enrolled_at',
+            class_id=F('class_enrolled_id'), username=F('student__username'),
+            first_name=F('student__first_name'), last_name=F('student__last_name'),
+        )[:20]),
+        'recent_grades': list(Grade.objects.filter(class_enrolled__in=class_ids).order_by('-created_at', '-pk').values(
+            *GRADE_FIELDS, 'student_id', class_id=F('class_enrolled_id'), username=F('student__username'),
+        )[:10]),
+        'recent_announcements': [
+            announcement_data(announcement) for announcement in announcements.get_feed(feed_audiences, 5)
+        ],
+    })
+
+@api_login_required
+@require_school_access()
+@require_role('student')
+@require_safe
+@conditional(school_stamp)
+def student_dashboard(request, school_slug):
+    enrollments = list(StudentEnrollment.objects.filter(student_id=request.auth.pk).order_by('pk').values(
+        'enrolled_at',
+        class_id=F('class_enrolled_id'), name=F('class_enrolled__name'),
+        subject=F('class_enrolled__subject'), teacher=F('class_enrolled__teacher__username'),
+    ))
+    averages = class_averages(
+        GradeStatistics.objects.filter(student_id=request.auth.pk).values('class_enrolled_id', 'count', 'total')
+    )
+    for row in enrollments:
+        row.update(averages.get(row['class_id'], {'count': 0, 'average': 0}))
+
+    # GPA and averages as a percentage of each grade's max, cached like the HTML dashboard's
+    grade_report = get_student_report(request.auth.pk, list(averages))
+    feed_audiences = [announcements.school_audience(request.school.pk)] + [
+        announcements.class_audience(row['class_id']) for row in enrollments
+    ]
+
+    return json_response({
+        'total_classes': len(enrollments),
+        'gpa': grade_report['gpa'],
+        'average_percent': grade_report['percent'],
+        'grade_report': grade_report,
+        'classes': enrollments,
+        'recent_grades': list(Grade.objects.filter(student_id=request.auth.pk).order_by('-created_at', '-pk').values(
+            *GRADE_FIELDS, class_id=F('class_enrolled_id'),
+        )[:10]),
+        'recent_announcements': [
+            announcement_data(announcement) for announcement in announcements.get_feed(feed_audiences, 5)
+        ],
+    })
@@ -6,3 +6,5 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         import accounts.admin_custom  # 👈 add this line
+        import accounts.signals
+        import accounts.tasks
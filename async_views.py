@@ -0,0 +1,274 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.utils.dateparse import parse_datetime
+
+from .models import User, Class, StudentEnrollment, Grade, GradeStatistics
+from .dashboard_cache import (
+    get_super_admin_kpis, get_class_performance, get_grades_by_class, get_student_report,
+    fragment_version, class_namespace, audience_namespace, SUPER_ADMIN_KPIS, ANNOUNCEMENTS,
+)
+from .routers import replica_reads
+from .session_auth import login_required
+from .views import require_role, require_school_access
+from . import announcements, live
+
+# ASGI-native versions of the dashboards in views.py, selected with
+# settings.ASYNC_DASHBOARDS (see urls.py). Independent queries are started
+# together with asyncio.gather.
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+async def arender(request, template_name, context):
+    # Context processors may still touch request.user lazily, so render off the event loop
+    return await sync_to_async(render)(request, template_name, context)
+
+# ==================== SCHOOL-BASED DASHBOARD VIEWS ====================
+
+@login_required
+@require_role('superadmin')
+@replica_reads
+async def super_admin_dashboard(request):
+    """Super Admin Dashboard - Shows all data across all schools"""
+    kpis, recent_announcements, top_schools_version, announcements_version = await asyncio.gather(
+        sync_to_async(get_super_admin_kpis)(),
+        sync_to_async(announcements.get_feed)([announcements.ALL], 10),
+        sync_to_async(fragment_version)(SUPER_ADMIN_KPIS),
+        sync_to_async(fragment_version)(ANNOUNCEMENTS),
+    )
+
+    context = {
+        **kpis,
+        'recent_announcements': recent_announcements,
+        'fragment_versions': {
+            'top_schools': top_schools_version,
+            'announcements': announcements_version,
+        },
+    }
+
+    return await arender(request, 'accounts/dashboards/super_admin.html', context)
+
+@login_required
+@require_school_access()
+@replica_reads
+async def school_admin_dashboard(request, school_slug):
+    """School Admin Dashboard - Shows data for their school only"""
+    school = request.school
+    user = request.auth
+
+    # Additional security check
+    if user.role != 'schooladmin':
+        raise PermissionDenied("School Admin access required.")
+
+    school_teachers = User.objects.filter(school=school, role='teacher')
+    school_students = User.objects.filter(school=school, role='student')
+    school_classes = Class.objects.filter(school=school)
+    feed_audiences = [announcements.school_audience(school.pk), announcements.GLOBAL]
+
+    (
+        total_teachers, total_students, total_classes,
+        teachers_page, students_page, classes_page,
+        classes_with_enrollment, recent_announcements, announcements_version,
+    ) = await asyncio.gather(
+        school_teachers.acount(),
+        school_students.acount(),
+        school_classes.acount(),
+        alist(school_teachers[:10]),
+        alist(school_students[:10]),
+        alist(school_classes[:10]),
+        alist(school_classes.annotate(
+            enrollment_count=Count('studentenrollment')
+        ).order_by('-enrollment_count')[:5]),
+        sync_to_async(announcements.get_feed)(feed_audiences, 10),
+        sync_to_async(fragment_version)(*map(audience_namespace, feed_audiences)),
+    )
+
+    context = {
+        'school': school,
+        'total_teachers': total_teachers,
+        'total_students': total_students,
+        'total_classes': total_classes,
+        'school_teachers': teachers_page,
+        'school_students': students_page,
+        'school_classes': classes_page,
+        'recent_announcements': recent_announcements,
+        'classes_with_enrollment': classes_with_enrollment,
+        'fragment_versions': {
+            'announcements': announcements_version,
+        },
+    }
+
+    return await arender(request, 'accounts/dashboards/school_admin.html', context)
+
+@login_required
+@require_school_access()
+@replica_reads
+async def teacher_dashboard(request, school_slug):
+    """Teacher Dashboard - Shows only their classes and students"""
+    school = request.school
+    user = request.auth
+
+    # Additional security check
+    if user.role != 'teacher':
+        raise PermissionDenied("Teacher access required.")
+
+    teacher_classes = Class.objects.filter(teacher_id=user.pk)
+    class_ids = await alist(teacher_classes.values_list('pk', flat=True))
+    student_enrollments = StudentEnrollment.objects.filter(
+        class_enrolled__in=class_ids
+    ).select_related('student', 'class_enrolled')
+    feed_audiences = [announcements.school_audience(school.pk)] + [
+        announcements.class_audience(class_id) for class_id in class_ids
+    ]
+
+    (
+        classes, class_performance, enrollments_page, recent_grades, total_students,
+        recent_announcements, class_performance_version, announcements_version,
+    ) = await asyncio.gather(
+        alist(teacher_classes),
+        sync_to_async(get_class_performance)(class_ids),
+        alist(student_enrollments[:20]),
+        alist(Grade.objects.filter(
+            class_enrolled__in=class_ids
+        ).select_related('student', 'class_enrolled').order_by('-created_at')[:10]),
+        student_enrollments.values('student').distinct().acount(),
+        sync_to_async(announcements.get_feed)(feed_audiences, 5),
+        sync_to_async(fragment_version)(*map(class_namespace, class_ids)),
+        sync_to_async(fragment_version)(*map(audience_namespace, feed_audiences)),
+    )
+
+    context = {
+        'teacher_classes': classes,
+        'student_enrollments': enrollments_page,
+        'recent_grades': recent_grades,
+        'total_classes': len(class_ids),
+        'total_students': total_students,
+        'class_performance': class_performance,
+        'recent_announcements': recent_announcements,
+        'fragment_versions': {
+            'class_performance': class_performance_version,
+            'announcements': announcements_version,
+        },
+    }
+
+    return await arender(request, 'accounts/dashboards/teacher.html', context)
+
+@login_required
+@require_school_access()
+@replica_reads
+async def student_dashboard(request, school_slug):
+    """Student Dashboard - Shows only their own data"""
+    school = request.school
+    user = request.auth
+
+    # Additional security check
+    if user.role != 'student':
+        raise PermissionDenied("Student access required.")
+
+    student_grades = Grade.objects.filter(
+        student_id=user.pk
+    ).select_related('class_enrolled').order_by('-created_at', '-pk')
+
+    student_enrollments, student_stats, recent_grades = await asyncio.gather(
+        alist(StudentEnrollment.objects.filter(
+            student_id=user.pk
+        ).select_related('class_enrolled', 'class_enrolled__teacher')),
+        alist(GradeStatistics.objects.filter(student_id=user.pk)),
+        alist(student_grades[:10]),
+    )
+    student_classes = [enrollment.class_enrolled for enrollment in student_enrollments]
+    student_stats = {stats.class_enrolled_id: stats for stats in student_stats}
+    feed_audiences = [announcements.school_audience(school.pk)] + [
+        announcements.class_audience(class_obj.pk) for class_obj in student_classes
+    ]
+
+    grades_by_class, grade_report, recent_announcements, grades_by_class_version, announcements_version = await asyncio.gather(
+        # Five most recent grades and the average in each class, cached until one of the classes changes
+        sync_to_async(get_grades_by_class)(user.pk, student_classes),
+        # GPA and averages as a percentage of each grade's max, cached until one of the graded classes changes
+        sync_to_async(get_student_report)(user.pk, list(student_stats)),
+        sync_to_async(announcements.get_feed)(feed_audiences, 5),
+        sync_to_async(fragment_version)(*(class_namespace(class_obj.pk) for class_obj in student_classes)),
+        sync_to_async(fragment_version)(*map(audience_namespace, feed_audiences)),
+    )
+
+    context = {
+        'student_enrollments': student_enrollments,
+        'student_grades': student_grades,
+        'recent_grades': recent_grades,
+        'gpa': grade_report['gpa'],
+        'average_percent': grade_report['percent'],
+        'grade_report': grade_report,
+        'grades_by_class': grades_by_class,
+        'recent_announcements': recent_announcements,
+        'total_classes': len(student_enrollments),
+        'fragment_versions': {
+            'grades_by_class': grades_by_class_version,
+            'announcements': announcements_version,
+        },
+    }
+
+    return await arender(request, 'accounts/dashboards/student.html', context)
+
+# ==================== LIVE ANNOUNCEMENTS ====================
+
+async def stream_audiences(user, school):
+    """The announcement audiences the user's dashboard shows"""
+    if user.role == 'student':
+        class_ids = StudentEnrollment.objects.filter(student_id=user.pk).values_list('class_enrolled_id', flat=True)
+    elif user.role == 'teacher':
+        class_ids = Class.objects.filter(teacher_id=user.pk, school=school).values_list('pk', flat=True)
+    else:
+        return [announcements.school_audience(school.pk), announcements.GLOBAL]
+    return [announcements.school_audience(school.pk)] + [
+        announcements.class_audience(class_id) async for class_id in class_ids
+    ]
+
+async def missed_frames(audiences, last_event_id):
+    """Frames for announcements newer than a reconnecting client's Last-Event-ID"""
+    since = parse_datetime(last_event_id) if last_event_id else None
+    if since is None:
+        return []
+    feed = await sync_to_async(announcements.get_feed)(audiences, announcements.timeline_length())
+    return [live.announcement_event(announcement) for announcement in reversed(feed) if announcement.created_at > since]
+
+async def event_stream(channels, backlog):
+    keepalive = getattr(settings, 'LIVE_KEEPALIVE', 15)
+    # Subscribed only once the server starts streaming, so a response that is never sent can't leak
+    subscriber = live.hub.subscribe(channels)
+    try:
+        yield 'retry: 5000\n\n'
+        for frame in backlog:
+            yield frame
+        while True:
+            frame = await subscriber.get(keepalive)
+            # A comment line keeps proxies from closing an idle connection
+            yield frame if frame is not None else ': keepalive\n\n'
+    finally:
+        # Runs when the client disconnects and the server cancels the stream
+        live.hub.unsubscribe(subscriber)
+
+@login_required
+@require_school_access()
+async def announcement_stream(request, school_slug):
+    """Server-sent events for new announcements in the user's school and classes.
+
+    Everything that needs the database happens here, before streaming starts,
+    so an idle stream holds no connection or thread (serve it with ASGI).
+    """
+    audiences = await stream_audiences(request.auth, request.school)
+    backlog = await missed_frames(audiences, request.headers.get('Last-Event-ID'))
+    await sync_to_async(live.get_backend)()
+    channels = [live.channel(audience) for audience in audiences]
+
+    response = StreamingHttpResponse(event_stream(channels, backlog), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let nginx buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
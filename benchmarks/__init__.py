@@ -0,0 +1,22 @@
+"""
+Standalone benchmark scripts. Each one builds a throwaway SQLite database
+(never the configured one) and is run from the project root, e.g.
+
+    python -m accounts.benchmarks.index_benchmark
+"""
+import os
+
+
+def setup_django(db_path, keepdb=False):
+    """Configure Django and create (or reuse) the benchmark database at db_path"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'arday_project.settings')
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['TEST'] = {'NAME': str(db_path)}
+    if 'testserver' not in settings.ALLOWED_HOSTS:
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+    django.setup()
+
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
@@ -0,0 +1,145 @@
+"""
+Compare sync and ASGI-native dashboard latency under concurrent load.
+
+Requests go through Django's ASGI handler (the same application asgi.py
+serves) with --concurrency requests in flight, first with the sync views
+and then with ASYNC_DASHBOARDS on. Prints p50/p99 latency and throughput
+per dashboard. Run from the project root:
+
+    python -m accounts.benchmarks.async_dashboards --requests 500 --concurrency 20
+
+To measure behind a real server instead, run e.g.
+`uvicorn arday_project.asgi:application` once with ASYNC_DASHBOARDS = False
+and once with True, and point any HTTP load generator at the same URLs.
+"""
+import argparse
+import asyncio
+import importlib
+import statistics
+import time
+
+from accounts.benchmarks import setup_django
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.sqlite3')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per dashboard and mode')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--classes', type=int, default=30)
+    parser.add_argument('--students', type=int, default=600)
+    parser.add_argument('--grades-per-student', type=int, default=40)
+    return parser.parse_args()
+
+
+def seed(args):
+    import random
+    from accounts.grade_stats import rebuild_grade_statistics
+    from accounts.models import User, School, Class, StudentEnrollment, Grade, Announcement
+
+    rng = random.Random(1)
+    school = School.objects.create(name='Bench School', address='-', phone='-', email='b@example.com')
+    users = {
+        role: User.objects.create_user(username=f'bench-{role}', password='x', role=role, school=school)
+        for role in ('schooladmin', 'teacher', 'student')
+    }
+    users['superadmin'] = User.objects.create_user(username='bench-superadmin', password='x', role='superadmin')
+    students = [users['student']] + User.objects.bulk_create([
+        User(username=f'bench-student-{i}', role='student', school=school) for i in range(args.students)
+    ])
+    classes = Class.objects.bulk_create([
+        Class(name=f'Class {i}', school=school, teacher=users['teacher'], subject='Maths')
+        for i in range(args.classes)
+    ])
+    enrollments = {(s.pk, c.pk): (s, c) for s in students for c in rng.sample(classes, 6)}
+    StudentEnrollment.objects.bulk_create([
+        StudentEnrollment(student=s, class_enrolled=c) for s, c in enrollments.values()
+    ])
+    by_student = {}
+    for student, class_obj in enrollments.values():
+        by_student.setdefault(student.pk, []).append(class_obj)
+    Grade.objects.bulk_create([
+        Grade(student=student, class_enrolled=rng.choice(by_student[student.pk]),
+              assignment_name=f'Assignment {i}', grade=rng.randint(40, 100))
+        for student in students for i in range(args.grades_per_student)
+    ], batch_size=5000)
+    rebuild_grade_statistics()
+    Announcement.objects.bulk_create([
+        Announcement(title=f'News {i}', content='-', created_by=users['teacher'],
+                     school=school if i % 2 else None, class_target=rng.choice(classes) if i % 3 else None)
+        for i in range(200)
+    ])
+    return school, users
+
+
+def use_async_dashboards(enabled):
+    """Rebuild the URLconf so the dashboard URLs point at the sync or async views"""
+    from django.conf import settings
+    from django.urls import clear_url_caches
+    import accounts.urls
+
+    settings.ASYNC_DASHBOARDS = enabled
+    importlib.reload(accounts.urls)
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+async def load(client, url, total, concurrency):
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(url)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (url, response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    return statistics.quantiles(values, n=100)[pct - 1]
+
+
+async def run(args, school, users):
+    from asgiref.sync import sync_to_async
+    from django.test import AsyncClient
+    from asgiref.sync import iscoroutinefunction
+    from django.urls import resolve, reverse
+
+    targets = [
+        ('superadmin', 'super_admin_dashboard', {}),
+        ('schooladmin', 'school_admin_dashboard', {'school_slug': school.slug}),
+        ('teacher', 'teacher_dashboard', {'school_slug': school.slug}),
+        ('student', 'student_dashboard', {'school_slug': school.slug}),
+    ]
+    for mode in ('sync', 'async'):
+        await sync_to_async(use_async_dashboards)(mode == 'async')
+        for role, name, kwargs in targets:
+            client = AsyncClient()
+            await client.aforce_login(users[role])
+            url = reverse(name, kwargs=kwargs)
+            assert iscoroutinefunction(resolve(url).func) == (mode == 'async'), url
+            await client.get(url)  # warm caches
+            latencies, elapsed = await load(client, url, args.requests, args.concurrency)
+            print(
+                f'{mode:5} {name:24} p50={percentile(latencies, 50):7.2f} ms '
+                f'p99={percentile(latencies, 99):7.2f} ms {len(latencies) / elapsed:7.1f} req/s'
+            )
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db)
+    school, users = seed(args)
+    asyncio.run(run(args, school, users))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Check that the gradebook CSV export streams in bounded memory.
+
+Seeds a throwaway SQLite database with --grades rows (500k by default),
+streams the school export through the test client, and reports peak
+Python heap and RSS against the baseline. Run from the project root:
+
+    python -m accounts.benchmarks.export_memory --grades 500000
+"""
+import argparse
+import resource
+import time
+import tracemalloc
+
+from accounts.benchmarks import setup_django
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.sqlite3')
+    parser.add_argument('--grades', type=int, default=500_000)
+    parser.add_argument('--max-peak-mb', type=float, default=50, help='Fail if the export heap peak exceeds this')
+    return parser.parse_args()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db)
+
+    from django.test import Client
+    from django.urls import reverse
+    from accounts.models import User, School, Class, Grade
+
+    school = School.objects.create(name='Export School', address='-', phone='-', email='e@example.com')
+    admin = User.objects.create_user(username='export-admin', password='x', role='schooladmin', school=school)
+    teacher = User.objects.create_user(username='export-teacher', password='x', role='teacher', school=school)
+    students = User.objects.bulk_create([
+        User(username=f'export-student-{i}', role='student', school=school) for i in range(1000)
+    ])
+    classes = Class.objects.bulk_create([
+        Class(name=f'Class {i}', school=school, teacher=teacher, subject='Maths') for i in range(50)
+    ])
+    for start in range(0, args.grades, 10_000):
+        Grade.objects.bulk_create([
+            Grade(student=students[i % len(students)], class_enrolled=classes[i % len(classes)],
+                  assignment_name=f'Assignment {i % 40}', grade=i % 100)
+            for i in range(start, min(start + 10_000, args.grades))
+        ])
+
+    client = Client()
+    client.force_login(admin)
+    rss_before = peak_rss_mb()
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    response = client.get(reverse('school_gradebook_export', kwargs={'school_slug': school.slug}))
+    rows = size = 0
+    for chunk in response.streaming_content:
+        rows += 1
+        size += len(chunk)
+
+    elapsed = time.perf_counter() - started
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    heap_peak_mb = heap_peak / 1024 / 1024
+
+    print(f'Exported {rows - 1} rows ({size / 1024 / 1024:.1f} MB) in {elapsed:.1f}s')
+    print(f'Python heap peak during export: {heap_peak_mb:.1f} MB')
+    print(f'Peak RSS: {rss_before:.1f} MB before export, {peak_rss_mb():.1f} MB after')
+    if heap_peak_mb > args.max_peak_mb:
+        raise SystemExit(f'Export heap peak {heap_peak_mb:.1f} MB exceeds {args.max_peak_mb} MB')
+
+
+if __name__ == '__main__':
+    main()
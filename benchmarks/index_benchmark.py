@@ -0,0 +1,178 @@
+"""
+Benchmark the dashboard queries with and without the composite indexes.
+
+Seeds a throwaway SQLite database, then prints EXPLAIN QUERY PLAN and the
+median run time of each dashboard query, first with the indexes from
+migration 0004 dropped and then with them in place. Run from the project
+root:
+
+    python -m accounts.benchmarks.index_benchmark --grades 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from accounts.benchmarks import setup_django
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.sqlite3', help='SQLite file to seed (reused with --keepdb)')
+    parser.add_argument('--keepdb', action='store_true', help='Reuse an already seeded database')
+    parser.add_argument('--schools', type=int, default=20)
+    parser.add_argument('--classes-per-school', type=int, default=100)
+    parser.add_argument('--students-per-school', type=int, default=1000)
+    parser.add_argument('--grades', type=int, default=1_000_000)
+    parser.add_argument('--announcements', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def seed(args):
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection
+    from django.utils import timezone
+    from accounts.models import User, School, Class, Grade, Announcement
+
+    if Grade.objects.exists():
+        print(f'Reusing {Grade.objects.count()} grades in {args.db}')
+        return
+
+    rng = random.Random(args.seed)
+    now = timezone.now()
+    password = make_password('benchmark')
+    started = time.perf_counter()
+
+    schools = School.objects.bulk_create([
+        School(name=f'School {i}', slug=f'school-{i}', address='-', phone='-', email=f's{i}@example.com')
+        for i in range(args.schools)
+    ])
+    teachers, students = [], []
+    for school in schools:
+        teachers += [
+            User(username=f'{school.slug}-t{i}', password=password, role='teacher', school=school)
+            for i in range(max(1, args.classes_per_school // 5))
+        ]
+        students += [
+            User(username=f'{school.slug}-s{i}', password=password, role='student', school=school)
+            for i in range(args.students_per_school)
+        ]
+    teachers = User.objects.bulk_create(teachers, batch_size=5000)
+    students = User.objects.bulk_create(students, batch_size=5000)
+
+    teachers_by_school = {}
+    for teacher in teachers:
+        teachers_by_school.setdefault(teacher.school_id, []).append(teacher)
+    classes = Class.objects.bulk_create([
+        Class(name=f'Class {i}', school=school, teacher=rng.choice(teachers_by_school[school.pk]), subject='Maths')
+        for school in schools for i in range(args.classes_per_school)
+    ], batch_size=5000)
+    classes_by_school = {}
+    for class_obj in classes:
+        classes_by_school.setdefault(class_obj.school_id, []).append(class_obj)
+
+    batch = []
+    for i in range(args.grades):
+        student = rng.choice(students)
+        batch.append(Grade(
+            student=student, class_enrolled=rng.choice(classes_by_school[student.school_id]),
+            assignment_name=f'Assignment {i % 40}', grade=rng.randint(30, 100),
+        ))
+        if len(batch) == 10_000:
+            Grade.objects.bulk_create(batch)
+            batch = []
+    Grade.objects.bulk_create(batch)
+    # auto_now_add stamps rows in insert order; scatter them so ordering has to be done by the query
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE accounts_grade SET created_at = datetime(%s, '-' || (id %% 100000) || ' minutes')",
+            [now.strftime('%Y-%m-%d %H:%M:%S')],
+        )
+
+    Announcement.objects.bulk_create([
+        Announcement(
+            title=f'Announcement {i}', content='-', created_by=teachers[0],
+            school=rng.choice(schools + [None]),
+            class_target=rng.choice(classes) if rng.random() < 0.5 else None,
+        )
+        for i in range(args.announcements)
+    ], batch_size=5000)
+
+    print(f'Seeded {args.grades} grades in {time.perf_counter() - started:.1f}s')
+
+
+def dashboard_queries():
+    """(label, queryset, how to evaluate it) for the hot dashboard queries"""
+    from django.db.models import Count, Q
+    from accounts.models import User, School, Class, Grade, Announcement
+
+    school = School.objects.order_by('pk')[School.objects.count() // 2]
+    student = User.objects.filter(school=school, role='student').order_by('pk').first()
+    teacher = User.objects.filter(school=school, role='teacher').order_by('pk').first()
+    teacher_classes = Class.objects.filter(teacher=teacher)
+    student_classes = list(Grade.objects.filter(student=student).values_list('class_enrolled', flat=True).distinct())
+
+    return [
+        ('student recent grades', Grade.objects.filter(student=student).order_by('-created_at')[:10], list),
+        ('teacher recent grades', Grade.objects.filter(class_enrolled__in=teacher_classes).order_by('-created_at')[:10], list),
+        ('class grades', Grade.objects.filter(class_enrolled=teacher_classes.first()).order_by('-created_at')[:50], list),
+        ('school teachers', User.objects.filter(school=school, role='teacher'), lambda qs: qs.count()),
+        ('school students', User.objects.filter(school=school, role='student')[:10], list),
+        ('role count', User.objects.filter(role='schooladmin'), lambda qs: qs.count()),
+        ('school announcements', Announcement.objects.filter(
+            Q(school=school) | Q(school__isnull=True)).order_by('-created_at')[:10], list),
+        ('class announcements', Announcement.objects.filter(
+            Q(class_target__in=student_classes) | Q(school=school)).order_by('-created_at')[:5], list),
+        ('global announcements', Announcement.objects.filter(school__isnull=True).order_by('-created_at')[:10], list),
+        ('recent announcements', Announcement.objects.order_by('-created_at')[:10], list),
+        ('top schools', School.objects.annotate(
+            student_count=Count('user', filter=Q(user__role='student'))).order_by('-student_count')[:5], list),
+    ]
+
+
+def run_queries(repeat):
+    results = {}
+    for label, queryset, evaluate in dashboard_queries():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            evaluate(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        results[label] = (queryset.explain(), statistics.median(timings))
+    return results
+
+
+def set_indexes(enabled):
+    from django.db import connection
+    from accounts.models import User, Grade, Announcement
+
+    with connection.schema_editor() as editor:
+        for model in (User, Grade, Announcement):
+            for index in model._meta.indexes:
+                editor.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+                if enabled:
+                    editor.add_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db, keepdb=args.keepdb)
+    seed(args)
+
+    set_indexes(False)
+    before = run_queries(args.repeat)
+    set_indexes(True)
+    after = run_queries(args.repeat)
+
+    for label, (plan_before, ms_before) in before.items():
+        plan_after, ms_after = after[label]
+        print(f'\n=== {label}: {ms_before:.2f} ms -> {ms_after:.2f} ms')
+        print(f'--- before\n{plan_before}\n--- after\n{plan_after}')
+
+
+if __name__ == '__main__':
+    main()
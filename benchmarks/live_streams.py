@@ -0,0 +1,76 @@
+"""
+Memory and fan-out cost of idle live announcement streams.
+
+Opens --streams server-sent event streams (the generator the view returns,
+driven the way the ASGI server drives it), all subscribed to one school,
+measures the Python heap per idle stream, then publishes one announcement
+and times how long until every stream has it. Run from the project root:
+
+    python -m accounts.benchmarks.live_streams --streams 10000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from accounts.benchmarks import setup_django
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.sqlite3')
+    parser.add_argument('--streams', type=int, default=10_000)
+    parser.add_argument('--classes', type=int, default=6, help='Class channels per stream, besides the school')
+    parser.add_argument('--max-kb-per-stream', type=float, default=8, help='Fail above this heap cost')
+    return parser.parse_args()
+
+
+async def run(args):
+    from accounts import live
+    from accounts.async_views import event_stream
+
+    received = 0
+    all_received = asyncio.Event()
+
+    async def client(index):
+        nonlocal received
+        channels = ['school:1'] + [live.channel(('class', index * args.classes + n)) for n in range(args.classes)]
+        stream = event_stream(channels, [])
+        await anext(stream)  # retry: line
+        frame = await anext(stream)
+        while frame.startswith(':'):
+            frame = await anext(stream)
+        received += 1
+        if received == args.streams:
+            all_received.set()
+        await stream.aclose()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.create_task(client(i)) for i in range(args.streams)]
+    while live.hub.subscriber_count() < args.streams:
+        await asyncio.sleep(0.01)
+    per_stream_kb = (tracemalloc.get_traced_memory()[0] - before) / args.streams / 1024
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    live.publish(['school:1'], 'event: announcement\ndata: {}\n\n')
+    await all_received.wait()
+    fan_out_ms = (time.perf_counter() - started) * 1000
+    await asyncio.gather(*tasks)
+    return per_stream_kb, fan_out_ms
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db)
+
+    per_stream_kb, fan_out_ms = asyncio.run(run(args))
+    print(f'{args.streams} idle streams: {per_stream_kb:.1f} KiB of Python heap each')
+    print(f'One announcement reached every stream in {fan_out_ms:.0f} ms')
+    if per_stream_kb > args.max_kb_per_stream:
+        raise SystemExit(f'Idle streams cost more than {args.max_kb_per_stream} KiB each')
+
+
+if __name__ == '__main__':
+    main()
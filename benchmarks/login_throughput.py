@@ -0,0 +1,90 @@
+"""
+Measure student logins/sec under concurrent load for each password hasher.
+
+Creates --users students per hasher policy and has --threads clients log
+in through the real login view at the same time. Prints throughput and
+p50/p99 latency. Run from the project root:
+
+    python -m accounts.benchmarks.login_throughput --users 200 --threads 8
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from accounts.benchmarks import setup_django
+
+POLICIES = {
+    'pbkdf2': ['django.contrib.auth.hashers.PBKDF2PasswordHasher'],
+    'scrypt': ['accounts.hashers.TunedScryptPasswordHasher'],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.sqlite3')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--policy', choices=sorted(POLICIES), action='append',
+                        help='Hasher policies to compare (default: all)')
+    return parser.parse_args()
+
+
+def run_policy(name, school, args):
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from accounts.models import User
+
+    with override_settings(PASSWORD_HASHERS=POLICIES[name]):
+        password = make_password('benchmark')
+        usernames = [f'{name}-student-{i}' for i in range(args.users)]
+        User.objects.bulk_create([
+            User(username=username, password=password, role='student', school=school) for username in usernames
+        ])
+        url = reverse('student_login', kwargs={'school_slug': school.slug})
+        latencies = []
+        failures = []
+
+        def client_thread(batch):
+            client = Client()
+            for username in batch:
+                started = time.perf_counter()
+                response = client.post(url, {'username': username, 'password': 'benchmark'})
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 302:
+                    failures.append(response.status_code)
+                client.logout()
+            connection.close()
+
+        threads = [
+            threading.Thread(target=client_thread, args=(usernames[i::args.threads],))
+            for i in range(args.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f'{name:7} {len(latencies) / elapsed:7.1f} logins/s  p50={quantiles[49]:7.1f} ms  '
+        f'p99={quantiles[98]:7.1f} ms  failures={len(failures)}'
+    )
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db)
+
+    from accounts.models import School
+    school = School.objects.create(name='Login School', address='-', phone='-', email='l@example.com')
+    for name in args.policy or sorted(POLICIES):
+        run_policy(name, school, args)
+
+
+if __name__ == '__main__':
+    main()
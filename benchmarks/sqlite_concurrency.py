@@ -0,0 +1,116 @@
+"""
+Mixed read/write throughput on SQLite, before and after the performance
+mode in settings.py (WAL, synchronous=NORMAL, BEGIN IMMEDIATE, persistent
+connections).
+
+--threads workers run for --seconds per profile. Each operation is a grade
+write (with its statistics update) with probability --write-ratio, otherwise
+a dashboard-style read. Connections are recycled after every operation the
+way Django does at the end of a request, so CONN_MAX_AGE applies. Run from
+the project root:
+
+    python -m accounts.benchmarks.sqlite_concurrency --threads 8 --seconds 10
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from accounts.benchmarks import setup_django
+
+BASELINE = {
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {'init_command': 'PRAGMA journal_mode=DELETE'},
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.sqlite3')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    return parser.parse_args()
+
+
+def use_profile(profile):
+    """Point new connections at a database profile (a subset of DATABASES['default'])"""
+    from django.db import connections
+
+    connections.close_all()
+    connections.settings['default'].update(profile)
+
+
+def worker(args, enrollments, seed, deadline, results):
+    from django.db import OperationalError, close_old_connections
+    from accounts.models import Grade, GradeStatistics
+
+    rng = random.Random(seed)
+    latencies = {'read': [], 'write': []}
+    errors = 0
+    while time.perf_counter() < deadline:
+        student_id, class_id = rng.choice(enrollments)
+        kind = 'write' if rng.random() < args.write_ratio else 'read'
+        started = time.perf_counter()
+        try:
+            if kind == 'write':
+                Grade.objects.create(
+                    student_id=student_id, class_enrolled_id=class_id,
+                    assignment_name='Benchmark', grade=rng.randint(40, 100),
+                )
+            else:
+                list(GradeStatistics.objects.filter(student_id=student_id))
+                list(Grade.objects.filter(class_enrolled_id=class_id).order_by('-created_at')[:20])
+            latencies[kind].append((time.perf_counter() - started) * 1000)
+        except OperationalError:
+            errors += 1
+        # End of "request": honours CONN_MAX_AGE like request_finished does
+        close_old_connections()
+    results.append((latencies, errors))
+
+
+def run_profile(name, args, enrollments):
+    results = []
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(args, enrollments, seed, deadline, results))
+        for seed in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for kind in ('read', 'write'):
+        latencies = [value for result in results for value in result[0][kind]]
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+        print(
+            f'{name:9} {kind:5} {len(latencies) / args.seconds:8.1f} ops/s  '
+            f'p50={quantiles[49]:7.2f} ms  p99={quantiles[98]:7.2f} ms'
+        )
+    print(f"{name:9} errors {sum(result[1] for result in results)} (database is locked)")
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db)
+
+    from django.core.management import call_command
+    from django.db import connections
+    from accounts.models import StudentEnrollment
+
+    call_command('seed_district', schools=1, students=400, verbosity=0)
+    enrollments = list(StudentEnrollment.objects.values_list('student_id', 'class_enrolled_id'))
+    tuned = {
+        key: connections.settings['default'][key] for key in ('CONN_MAX_AGE', 'OPTIONS')
+    }
+
+    use_profile(BASELINE)
+    run_profile('baseline', args, enrollments)
+    use_profile(tuned)
+    run_profile('tuned', args, enrollments)
+
+
+if __name__ == '__main__':
+    main()
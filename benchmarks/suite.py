@@ -0,0 +1,193 @@
+"""
+Repeatable benchmark suite: seeds a district with `seed_district` (once, the
+database is kept between runs), then requests every dashboard and login URL
+through the test client and records query counts and latency percentiles.
+
+Results are written as JSON so runs on different commits can be compared:
+
+    python -m accounts.benchmarks.suite --output before.json
+    git checkout my-branch
+    python -m accounts.benchmarks.suite --output after.json --compare before.json
+
+Use --reseed after changing the seed options.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from accounts.benchmarks import setup_django
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.sqlite3')
+    parser.add_argument('--reseed', action='store_true', help='Drop the benchmark database and seed again')
+    parser.add_argument('--schools', type=int, default=5)
+    parser.add_argument('--students', type=int, default=800, help='Mean students per school')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per URL')
+    parser.add_argument('--logins', type=int, default=10, help='Login POSTs per login URL')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='Earlier results file to diff against')
+    return parser.parse_args()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(args):
+    from django.core.management import call_command
+    from accounts.models import School
+
+    if not School.objects.exists():
+        call_command('seed_district', schools=args.schools, students=args.students, password='benchmark')
+
+
+def dataset_size():
+    from accounts.models import User, School, Class, Grade
+
+    return {
+        'schools': School.objects.count(),
+        'users': User.objects.count(),
+        'classes': Class.objects.count(),
+        'grades': Grade.objects.count(),
+    }
+
+
+def pick_users():
+    """The largest school, and a user of each role in it with the most data to show"""
+    from django.db.models import Count, Q
+    from accounts.models import User, School
+
+    school = School.objects.annotate(
+        students=Count('user', filter=Q(user__role='student'))
+    ).order_by('-students').first()
+    in_school = User.objects.filter(school=school)
+    return school, {
+        'superadmin': User.objects.filter(role='superadmin').first(),
+        'schooladmin': in_school.filter(role='schooladmin').first(),
+        'teacher': in_school.filter(role='teacher').annotate(n=Count('class')).order_by('-n').first(),
+        'student': in_school.filter(role='student').annotate(
+            n=Count('studentenrollment')
+        ).order_by('-n').first(),
+    }
+
+
+def measure(send, count):
+    """Call `send()` `count` times; return latency percentiles and query counts"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies = []
+    queries = []
+    for _ in range(count):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            send()
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(ctx.captured_queries))
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': count,
+        'p50_ms': round(quantiles[49], 3),
+        'p95_ms': round(quantiles[94], 3),
+        'p99_ms': round(quantiles[98], 3),
+        'queries_first': queries[0],
+        'queries_max': max(queries),
+    }
+
+
+def run(args, school, users):
+    from django.test import Client
+    from django.urls import reverse
+
+    slug = {'school_slug': school.slug}
+    dashboards = [
+        ('superadmin', 'super_admin_dashboard', {}),
+        ('schooladmin', 'school_admin_dashboard', slug),
+        ('teacher', 'teacher_dashboard', slug),
+        ('student', 'student_dashboard', slug),
+    ]
+    logins = [
+        ('superadmin', 'super_admin_login', {}),
+        ('schooladmin', 'school_admin_login', slug),
+        ('teacher', 'teacher_login', slug),
+        ('student', 'student_login', slug),
+    ]
+    results = {}
+
+    for role, name, kwargs in dashboards:
+        client = Client()
+        client.force_login(users[role])
+        url = reverse(name, kwargs=kwargs)
+
+        def get():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+
+        results[name] = measure(get, args.requests)
+
+    for role, name, kwargs in logins:
+        url = reverse(name, kwargs=kwargs)
+        credentials = {'username': users[role].username, 'password': 'benchmark'}
+
+        def post():
+            response = Client().post(url, credentials)
+            assert response.status_code == 302, (url, response.status_code)
+
+        results[name] = measure(post, args.logins)
+
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\nChange since {baseline.get('commit') or baseline_path}:")
+    for name, current in results.items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        change = (current['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        queries = current['queries_first'] - before['queries_first']
+        print(f'{name:24} p50 {change:+6.1f}%  queries {queries:+d}')
+
+
+def main():
+    args = parse_args()
+    setup_django(args.db, keepdb=not args.reseed)
+    seed(args)
+    school, users = pick_users()
+    results = run(args, school, users)
+
+    for name, result in results.items():
+        print(
+            f"{name:24} p50={result['p50_ms']:8.2f} ms  p99={result['p99_ms']:8.2f} ms  "
+            f"queries={result['queries_first']}/{result['queries_max']}"
+        )
+
+    with open(args.output, 'w') as output:
+        json.dump({
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'dataset': dataset_size(),
+            'results': results,
+        }, output, indent=2)
+    print(f'\nWrote {args.output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from . import grade_analytics
+from .models import User, School, Class, StudentEnrollment, Grade, GradeStatistics
+from .routers import primary_reads
+from .sharding import fan_out, shard_scoped
+
+# ==================== VERSIONED CACHE KEYS ====================
+
+def _version_key(namespace):
+    return f'arday:version:{namespace}'
+
+def get_version(namespace):
+    """Current data version for a namespace, used to build cache keys"""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+def get_versions(namespaces):
+    """Current versions for several namespaces in one cache round trip"""
+    keys = {namespace: _version_key(namespace) for namespace in namespaces}
+    found = cache.get_many(keys.values())
+    return {
+        namespace: found[key] if key in found else get_version(namespace)
+        for namespace, key in keys.items()
+    }
+
+def bump_version(namespace):
+    """Invalidate every cache entry built from the namespace's current version"""
+    key = _version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        return cache.get(key)
+
+# ==================== SUPER ADMIN KPIS ====================
+
+SUPER_ADMIN_KPIS = 'super_admin_kpis'
+
+def _compute_shard_kpis():
+    return {
+        'user_counts': User.objects.aggregate(
+            total_teachers=Count('pk', filter=Q(role='teacher')),
+            total_students=Count('pk', filter=Q(role='student')),
+            super_admin_count=Count('pk', filter=Q(role='superadmin')),
+            school_admin_count=Count('pk', filter=Q(role='schooladmin')),
+        ),
+        'total_classes': Class.objects.count(),
+        'schools_with_most_students': list(School.objects.annotate(
+            student_count=Count('user', filter=Q(user__role='student'))
+        ).order_by('-student_count')[:5]),
+    }
+
+def _compute_super_admin_kpis():
+    # Per-school data may live in several shards (see sharding.py); query them
+    # in parallel and merge. Schools themselves are listed in the directory.
+    shard_kpis = fan_out(_compute_shard_kpis)
+    user_counts = {
+        field: sum(kpis['user_counts'][field] for kpis in shard_kpis)
+        for field in shard_kpis[0]['user_counts']
+    }
+    # The directory has every school, with no students for the sharded ones
+    most_students = {}
+    for kpis in shard_kpis:
+        for school in kpis['schools_with_most_students']:
+            if school.pk not in most_students or school.student_count > most_students[school.pk].student_count:
+                most_students[school.pk] = school
+    return {
+        'total_schools': School.objects.count(),
+        'total_classes': sum(kpis['total_classes'] for kpis in shard_kpis),
+        **user_counts,
+        'recent_schools': list(School.objects.order_by('-created_at')[:5]),
+        'schools_with_most_students': sorted(
+            most_students.values(), key=lambda school: school.student_count, reverse=True
+        )[:5],
+    }
+
+def get_super_admin_kpis():
+    """School/user/class totals for the super admin dashboard, cached per data version"""
+    key = f'arday:{SUPER_ADMIN_KPIS}:{get_version(SUPER_ADMIN_KPIS)}'
+    timeout = getattr(settings, 'SUPER_ADMIN_KPI_CACHE_TIMEOUT', 60)
+    return cache.get_or_set(key, lambda: compute_on_primary(_compute_super_admin_kpis), timeout)
+
+# ==================== DASHBOARD FRAGMENTS ====================
+
+# Per-school and per-class data versions. Grade, StudentEnrollment and
+# Announcement writes bump the namespaces they touch (see signals.py), so a
+# fragment keyed on those versions is never served after its data changed.
+ANNOUNCEMENTS = 'announcements'
+
+def school_namespace(school_id):
+    return f'school:{school_id}'
+
+def class_namespace(class_id):
+    # Class ids are only unique within one shard
+    return shard_scoped(f'class:{class_id}')
+
+def audience_namespace(audience):
+    """Version namespace for an announcement timeline audience (see announcements.py)"""
+    kind, pk = audience
+    if kind == 'school':
+        return school_namespace(pk)
+    if kind == 'class':
+        return class_namespace(pk)
+    return ANNOUNCEMENTS
+
+def version_token(versions):
+    token = ';'.join(f'{namespace}={versions[namespace]}' for namespace in sorted(versions))
+    return hashlib.md5(token.encode(), usedforsecurity=False).hexdigest()
+
+def fragment_version(*namespaces):
+    """Token that changes whenever any of the namespaces is bumped.
+
+    Dashboard templates pass it to {% cache %} as a vary_on argument.
+    """
+    return version_token(get_versions(set(namespaces)))
+
+def fragment_key(name, namespaces, *vary_on):
+    return ':'.join(['arday:fragment', shard_scoped(name), *map(str, vary_on), fragment_version(*namespaces)])
+
+def fragment_timeout():
+    return getattr(settings, 'DASHBOARD_FRAGMENT_CACHE_TIMEOUT', 300)
+
+def compute_on_primary(compute):
+    """`compute()` for a cache fill, read from the primary (see routers.primary_reads)"""
+    with primary_reads():
+        return compute()
+
+def cached_fragment(name, namespaces, compute, *vary_on):
+    """`compute()`, cached until one of the namespaces is bumped"""
+    return cache.get_or_set(
+        fragment_key(name, namespaces, *vary_on), lambda: compute_on_primary(compute), fragment_timeout()
+    )
+
+def _compute_class_performance(class_ids):
+    class_stats = {
+        stats.class_enrolled_id: stats
+        for stats in GradeStatistics.objects.filter(class_enrolled__in=class_ids, student__isnull=True)
+    }
+    # Enrollment counts as a correlated subquery so it stays a single query
+    class_student_count = StudentEnrollment.objects.filter(
+        class_enrolled=OuterRef('pk')
+    ).values('class_enrolled').annotate(student_count=Count('pk')).values('student_count')
+
+    class_performance = []
+    for class_obj in Class.objects.filter(pk__in=class_ids).annotate(
+        student_count=Coalesce(Subquery(class_student_count), 0)
+    ).order_by('pk'):
+        stats = class_stats.get(class_obj.pk)
+        class_performance.append({
+            'class': class_obj,
+            'avg_grade': round(stats.average, 2) if stats else 0,
+            'student_count': class_obj.student_count,
+        })
+    return class_performance
+
+def get_class_performance(class_ids):
+    """Average grade and enrollment count for each class (teacher dashboard)"""
+    class_ids = sorted(class_ids)
+    return cached_fragment(
+        'class_performance', map(class_namespace, class_ids),
+        lambda: _compute_class_performance(class_ids),
+    )
+
+def _compute_grades_by_class(student_id, classes):
+    # Five most recent grades in each class, in one windowed query
+    recent_class_grades = Grade.objects.filter(
+        student_id=student_id, class_enrolled__in=[class_obj.pk for class_obj in classes]
+    ).annotate(
+        class_rank=Window(
+            RowNumber(),
+            partition_by=F('class_enrolled'),
+            order_by=[F('created_at').desc(), F('pk').desc()],
+        )
+    ).filter(class_rank__lte=5).order_by('-created_at', '-pk')
+    grades_by_class_id = {}
+    for grade in recent_class_grades:
+        grades_by_class_id.setdefault(grade.class_enrolled_id, []).append(grade)
+
+    student_stats = {
+        stats.class_enrolled_id: stats
+        for stats in GradeStatistics.objects.filter(student_id=student_id, class_enrolled__in=grades_by_class_id)
+    }
+
+    grades_by_class = {}
+    for class_obj in classes:
+        stats = student_stats.get(class_obj.pk)
+        if stats and stats.count:
+            grades_by_class[class_obj] = {
+                'grades': grades_by_class_id.get(class_obj.pk, []),
+                'average': round(stats.average, 2)
+            }
+    return grades_by_class
+
+def get_grades_by_class(student_id, classes):
+    """Recent grades and average per enrolled class (student dashboard)"""
+    return cached_fragment(
+        'grades_by_class', [class_namespace(class_obj.pk) for class_obj in classes],
+        lambda: _compute_grades_by_class(student_id, classes),
+        student_id,
+    )
+
+# ==================== STUDENT GRADE REPORTS ====================
+
+def get_student_report(student_id, class_ids):
+    """Normalized averages and GPA for a student (see grade_analytics.py).
+
+    `class_ids` are the classes the student has grades in, i.e. the keys of
+    their GradeStatistics rows; the report is cached until one of them changes.
+    """
+    return cached_fragment(
+        'student_report', map(class_namespace, class_ids),
+        lambda: grade_analytics.student_report(student_id),
+        student_id,
+    )
+
+def store_student_reports(reports):
+    """Cache freshly computed {student_id: report} where get_student_report() looks for them"""
+    class_ids = {student_id: [] for student_id in reports}
+    for student_id, class_id in GradeStatistics.objects.filter(
+        student__in=list(reports)
+    ).values_list('student_id', 'class_enrolled_id'):
+        class_ids[student_id].append(class_id)
+    cache.set_many({
+        fragment_key('student_report', map(class_namespace, class_ids[student_id]), student_id): report
+        for student_id, report in reports.items()
+    }, fragment_timeout())
+
+# ==================== SCHOOL DATA STAMPS ====================
+
+# One version per school covering everything its dashboards show. It is
+# bumped once a write to the school's users, classes, enrollments, grades or
+# announcements commits (see signals.py), so the JSON API (api.py) can answer
+# conditional requests from the cache without running any dashboard query.
+
+def school_data_namespace(school_id):
+    return f'school-data:{school_id}'
+
+def bump_school_data(school_ids):
+    for school_id in set(school_ids):
+        if school_id:
+            bump_version(school_data_namespace(school_id))
+
+def class_school_ids(class_ids):
+    """Schools that own the classes, for writes that only know a class id"""
+    return set(Class.objects.filter(pk__in=list(class_ids)).values_list('school_id', flat=True))
+
+def data_stamp(*namespaces):
+    """(version token, last modified datetime) for the namespaces' current versions.
+
+    A version's modification time is when it was first seen, which is never
+    earlier than the write that bumped it.
+    """
+    versions = get_versions(set(namespaces))
+    keys = [f'arday:modified:{namespace}:{version}' for namespace, version in versions.items()]
+    seen = cache.get_many(keys)
+    for key in set(keys) - set(seen):
+        cache.add(key, time.time(), timeout=86400)
+        seen[key] = cache.get(key) or time.time()
+    return version_token(versions), datetime.fromtimestamp(max(seen.values()), tz=timezone.utc)
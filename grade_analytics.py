@@ -0,0 +1,149 @@
+from django.conf import settings
+
+from .models import Grade, User
+
+try:
+    import numpy as np
+except ImportError:  # Optional; the pure-Python path gives the same results
+    np = None
+
+# ==================== SETTINGS ====================
+
+# Each grade counts as a percentage of its max_grade. A class score is the
+# weighted mean of the class's category averages (categories without grades
+# are left out), and the GPA is the mean of the class scores on GPA_SCALE.
+DEFAULT_CATEGORY_WEIGHTS = {'assignment': 1, 'homework': 1, 'quiz': 1, 'project': 2, 'exam': 3}
+DEFAULT_GPA_SCALE = [
+    (93, 4.0), (90, 3.7), (87, 3.3), (83, 3.0), (80, 2.7), (77, 2.3),
+    (73, 2.0), (70, 1.7), (67, 1.3), (63, 1.0), (60, 0.7), (0, 0.0),
+]
+
+def category_weights():
+    return getattr(settings, 'GRADE_CATEGORY_WEIGHTS', DEFAULT_CATEGORY_WEIGHTS)
+
+def gpa_scale():
+    """(minimum percent, grade points) pairs, highest first"""
+    return sorted(getattr(settings, 'GPA_SCALE', DEFAULT_GPA_SCALE), reverse=True)
+
+def grade_points(percent):
+    for minimum, points in gpa_scale():
+        if percent >= minimum:
+            return points
+    return 0.0
+
+def empty_report():
+    return {'percent': 0, 'gpa': 0, 'classes': {}}
+
+# ==================== LOADING ====================
+
+ROW_FIELDS = ('student_id', 'class_enrolled_id', 'category', 'grade', 'max_grade')
+
+def grade_rows(grades):
+    """(student id, class id, category, percent, weight) for every gradeable row of a Grade queryset"""
+    weights = category_weights()
+    rows = []
+    for student_id, class_id, category, grade, max_grade in grades.values_list(*ROW_FIELDS).iterator(
+        chunk_size=5000
+    ):
+        weight = weights.get(category, 1)
+        # Ungradeable (max 0) and unweighted rows can't move any average
+        if max_grade > 0 and weight > 0:
+            rows.append((student_id, class_id, category, float(grade) / float(max_grade) * 100, weight))
+    return rows
+
+# ==================== REPORTS ====================
+
+def compute_reports(rows):
+    """Per-student reports from grade_rows(): {student_id: {'percent', 'gpa', 'classes'}}.
+
+    'classes' maps class ids to {'percent', 'points', 'categories'}. Uses
+    NumPy when it's installed.
+    """
+    if not rows:
+        return {}
+    if np is not None:
+        return _compute_reports_numpy(rows)
+    return _compute_reports_python(rows)
+
+def _build_reports(category_averages, class_scores):
+    """Assemble reports from {(student, class, category): avg} and {(student, class): percent}"""
+    reports = {}
+    for (student_id, class_id), percent in class_scores.items():
+        report = reports.setdefault(student_id, empty_report())
+        report['classes'][class_id] = {
+            'percent': round(percent, 2), 'points': grade_points(percent), 'categories': {},
+        }
+    for (student_id, class_id, category), average in category_averages.items():
+        reports[student_id]['classes'][class_id]['categories'][category] = round(average, 2)
+    for report in reports.values():
+        classes = report['classes'].values()
+        report['percent'] = round(sum(c['percent'] for c in classes) / len(classes), 2)
+        report['gpa'] = round(sum(c['points'] for c in classes) / len(classes), 2)
+    return reports
+
+def _compute_reports_python(rows):
+    totals = {}
+    for student_id, class_id, category, percent, weight in rows:
+        entry = totals.setdefault((student_id, class_id, category), [0.0, 0, weight])
+        entry[0] += percent
+        entry[1] += 1
+
+    category_averages = {}
+    class_totals = {}
+    for key, (total, count, weight) in totals.items():
+        average = category_averages[key] = total / count
+        entry = class_totals.setdefault(key[:2], [0.0, 0.0])
+        entry[0] += average * weight
+        entry[1] += weight
+
+    class_scores = {key: weighted / weight for key, (weighted, weight) in class_totals.items()}
+    return _build_reports(category_averages, class_scores)
+
+def _compute_reports_numpy(rows):
+    student_ids, class_ids, categories, percents, weights = zip(*rows)
+    category_names, category_index = np.unique(np.asarray(categories), return_inverse=True)
+    percents = np.asarray(percents, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+
+    # Average per (student, class, category)
+    keys = np.column_stack([np.asarray(student_ids), np.asarray(class_ids), category_index.reshape(-1)])
+    groups, group_index = np.unique(keys, axis=0, return_inverse=True)
+    group_index = group_index.reshape(-1)
+    averages = np.bincount(group_index, weights=percents) / np.bincount(group_index)
+    # Every row in a group has the same category, so the same weight
+    group_weights = np.zeros(len(groups))
+    group_weights[group_index] = weights
+
+    # Weighted mean of the category averages per (student, class)
+    classes, class_index = np.unique(groups[:, :2], axis=0, return_inverse=True)
+    class_index = class_index.reshape(-1)
+    scores = (
+        np.bincount(class_index, weights=averages * group_weights)
+        / np.bincount(class_index, weights=group_weights)
+    )
+
+    category_averages = {
+        (int(student_id), int(class_id), str(category_names[category])): float(average)
+        for (student_id, class_id, category), average in zip(groups, averages)
+    }
+    class_scores = {
+        (int(student_id), int(class_id)): float(score) for (student_id, class_id), score in zip(classes, scores)
+    }
+    return _build_reports(category_averages, class_scores)
+
+# ==================== BATCHES ====================
+
+def student_report(student_id):
+    """Report for one student, from all of their grades"""
+    rows = grade_rows(Grade.objects.filter(student_id=student_id))
+    return compute_reports(rows).get(student_id, empty_report())
+
+def iter_school_reports(school, batch_size=500):
+    """Yield {student_id: report} for every student in a school, batch_size students at a time"""
+    student_ids = list(
+        User.objects.filter(school=school, role='student').order_by('pk').values_list('pk', flat=True)
+    )
+    for i in range(0, len(student_ids), batch_size):
+        batch = student_ids[i:i + batch_size]
+        reports = compute_reports(grade_rows(Grade.objects.filter(student_id__in=batch)))
+        yield {student_id: reports.get(student_id, empty_report()) for student_id in batch}
@@ -0,0 +1,159 @@
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import Count, Sum, Min, Max, F, DecimalField
+
+from .models import Grade, GradeStatistics
+
+# ==================== INCREMENTAL UPDATES ====================
+
+def _atomic():
+    # A transaction on the database the statistics are written to (a shard, with SCHOOL_SHARDS)
+    return transaction.atomic(using=router.db_for_write(GradeStatistics))
+
+def _to_decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+def _locked_rows(student_id, class_id, create):
+    """Lock the per-student and per-class statistics rows for one grade"""
+    rows = []
+    for row_student_id in (student_id, None):
+        queryset = GradeStatistics.objects.select_for_update()
+        if create:
+            stats, _ = queryset.get_or_create(student_id=row_student_id, class_enrolled_id=class_id)
+        else:
+            stats = queryset.filter(student_id=row_student_id, class_enrolled_id=class_id).first()
+        if stats is not None:
+            rows.append(stats)
+    return rows
+
+def add_grade(student_id, class_id, grade):
+    """Fold a new grade into the running statistics"""
+    grade = _to_decimal(grade)
+    with _atomic():
+        for stats in _locked_rows(student_id, class_id, create=True):
+            stats.count += 1
+            stats.total += grade
+            stats.total_squares += grade * grade
+            stats.min_grade = grade if stats.min_grade is None else min(stats.min_grade, grade)
+            stats.max_grade = grade if stats.max_grade is None else max(stats.max_grade, grade)
+            stats.save()
+
+def remove_grade(student_id, class_id, grade):
+    """Take a grade back out of the running statistics"""
+    grade = _to_decimal(grade)
+    with _atomic():
+        # Never create rows here: during a cascade delete the class may already be gone
+        for stats in _locked_rows(student_id, class_id, create=False):
+            stats.count -= 1
+            if stats.count <= 0:
+                stats.delete()
+                continue
+
+            stats.total -= grade
+            stats.total_squares -= grade * grade
+            # Min/max can't be un-applied, so re-read them only when the removed grade was an extreme
+            if grade in (stats.min_grade, stats.max_grade):
+                grades = Grade.objects.filter(class_enrolled_id=class_id)
+                if stats.student_id:
+                    grades = grades.filter(student_id=stats.student_id)
+                extremes = grades.aggregate(min_grade=Min('grade'), max_grade=Max('grade'))
+                stats.min_grade = extremes['min_grade']
+                stats.max_grade = extremes['max_grade']
+            stats.save()
+
+def record_grade_saved(grade, created):
+    """Update statistics after a Grade is saved"""
+    new_values = (grade.student_id, grade.class_enrolled_id, _to_decimal(grade.grade))
+    old = getattr(grade, '_loaded_values', None)
+
+    with _atomic():
+        if not created and old:
+            old_values = (old['student_id'], old['class_enrolled_id'], _to_decimal(old['grade']))
+            if old_values == new_values:
+                return
+            remove_grade(*old_values)
+        add_grade(*new_values)
+
+    grade._loaded_values = {
+        'student_id': new_values[0], 'class_enrolled_id': new_values[1], 'grade': new_values[2]
+    }
+
+def record_grade_deleted(grade):
+    """Update statistics after a Grade is deleted"""
+    old = getattr(grade, '_loaded_values', None) or {
+        'student_id': grade.student_id, 'class_enrolled_id': grade.class_enrolled_id, 'grade': grade.grade
+    }
+    remove_grade(old['student_id'], old['class_enrolled_id'], old['grade'])
+
+# ==================== REBUILD AND DRIFT CHECK ====================
+
+STAT_FIELDS = ('count', 'total', 'total_squares', 'min_grade', 'max_grade')
+
+def compute_grade_statistics(grades=None):
+    """Aggregate statistics straight from the Grade table.
+
+    Returns a dict keyed by (student_id, class_id), with student_id None for the
+    per-class rows.
+    """
+    if grades is None:
+        grades = Grade.objects.all()
+    aggregates = {
+        'count': Count('pk'),
+        'total': Sum('grade'),
+        'total_squares': Sum(
+            F('grade') * F('grade'), output_field=DecimalField(max_digits=20, decimal_places=4)
+        ),
+        'min_grade': Min('grade'),
+        'max_grade': Max('grade'),
+    }
+
+    computed = {}
+    per_student = grades.order_by().values('student_id', 'class_enrolled_id').annotate(**aggregates)
+    for row in per_student:
+        computed[(row['student_id'], row['class_enrolled_id'])] = {f: row[f] for f in STAT_FIELDS}
+    per_class = grades.order_by().values('class_enrolled_id').annotate(**aggregates)
+    for row in per_class:
+        computed[(None, row['class_enrolled_id'])] = {f: row[f] for f in STAT_FIELDS}
+    return computed
+
+def _normalize(stats):
+    """Quantize values so DB float rounding doesn't show up as drift"""
+    return {
+        'count': stats['count'],
+        'total': round(_to_decimal(stats['total']), 2),
+        'total_squares': round(_to_decimal(stats['total_squares']), 4),
+        'min_grade': round(_to_decimal(stats['min_grade']), 2),
+        'max_grade': round(_to_decimal(stats['max_grade']), 2),
+    }
+
+def find_drift():
+    """Return {(student_id, class_id): (stored, expected)} for every row that disagrees"""
+    expected = {key: _normalize(stats) for key, stats in compute_grade_statistics().items()}
+    stored = {
+        (row['student_id'], row['class_enrolled_id']): _normalize(row)
+        for row in GradeStatistics.objects.values('student_id', 'class_enrolled_id', *STAT_FIELDS)
+        if row['count']
+    }
+    return {
+        key: (stored.get(key), expected.get(key))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key) != expected.get(key)
+    }
+
+def rebuild_grade_statistics(class_ids=None, batch_size=1000):
+    """Recompute statistics from scratch, for everything or only the given classes"""
+    grades = Grade.objects.all()
+    existing = GradeStatistics.objects.all()
+    if class_ids is not None:
+        grades = grades.filter(class_enrolled_id__in=class_ids)
+        existing = existing.filter(class_enrolled_id__in=class_ids)
+
+    rows = [
+        GradeStatistics(student_id=student_id, class_enrolled_id=class_id, **stats)
+        for (student_id, class_id), stats in compute_grade_statistics(grades).items()
+    ]
+    with _atomic():
+        existing.delete()
+        GradeStatistics.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,42 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.hashers import ScryptPasswordHasher
+
+# ==================== PASSWORD HASHER POLICY ====================
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """Scrypt with its cost taken from settings.
+
+    Hashes stored with any other hasher or cost are upgraded by Django the
+    next time the user logs in successfully, so changing the PASSWORD_SCRYPT_*
+    settings (or moving off PBKDF2) needs no migration.
+    """
+    work_factor = getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14)
+    block_size = getattr(settings, 'PASSWORD_SCRYPT_BLOCK_SIZE', 8)
+    parallelism = getattr(settings, 'PASSWORD_SCRYPT_PARALLELISM', 1)
+
+# ==================== BOUNDED HASHING ====================
+
+class HashingBusy(Exception):
+    """Raised when no password hashing slot frees up in time"""
+
+_hashing_slots = threading.BoundedSemaphore(
+    getattr(settings, 'LOGIN_HASHING_CONCURRENCY', None) or os.cpu_count() or 4
+)
+
+@contextmanager
+def hashing_slot():
+    """Limit how many requests hash passwords at once.
+
+    A login burst then queues here instead of pinning every CPU and starving
+    the requests that don't hash at all.
+    """
+    if not _hashing_slots.acquire(timeout=getattr(settings, 'LOGIN_HASHING_TIMEOUT', 5)):
+        raise HashingBusy()
+    try:
+        yield
+    finally:
+        _hashing_slots.release()
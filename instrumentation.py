@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, JsonResponse
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.decorators import sync_and_async_middleware
+
+from .views import require_role
+
+logger = logging.getLogger(__name__)
+
+# ==================== PER-REQUEST METRICS ====================
+
+class RequestMetrics:
+    """Query count and DB/template time for one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        # Async views run queries from several threads at once
+        self._lock = threading.Lock()
+
+    def add_query(self, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+
+    def add_template(self, duration):
+        with self._lock:
+            self.template_time += duration
+
+# Context variables follow the request into sync_to_async threads
+_current = ContextVar('accounts_request_metrics', default=None)
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - started)
+
+def _install_query_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+connection_created.connect(_install_query_wrapper)
+
+# ==================== TEMPLATE TIMING ====================
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                metrics.add_template(time.perf_counter() - started)
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing every top-level render for RequestMetrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+# ==================== ROLLING HISTOGRAMS ====================
+
+# Upper bounds (ms) of the wall time histogram buckets
+WALL_TIME_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+class ViewMetrics:
+    """The last METRICS_WINDOW samples for one URL name"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+
+    def add(self, wall, db, template, queries):
+        self.samples.append((wall, db, template, queries))
+
+    def summary(self):
+        samples = list(self.samples)
+        summary = {'count': len(samples)}
+        for index, name in enumerate(('wall_ms', 'db_ms', 'template_ms', 'queries')):
+            values = sorted(sample[index] for sample in samples)
+            summary[name] = {
+                'p50': _percentile(values, 50),
+                'p95': _percentile(values, 95),
+                'p99': _percentile(values, 99),
+                'max': values[-1] if values else None,
+            }
+        buckets = {f'le_{bound}': 0 for bound in WALL_TIME_BUCKETS}
+        buckets['le_inf'] = 0
+        for sample in samples:
+            bound = next((bound for bound in WALL_TIME_BUCKETS if sample[0] <= bound), 'inf')
+            buckets[f'le_{bound}'] += 1
+        summary['wall_ms_histogram'] = buckets
+        return summary
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+_views = {}
+_views_lock = threading.Lock()
+
+def record(url_name, wall, db, template, queries):
+    with _views_lock:
+        view_metrics = _views.get(url_name)
+        if view_metrics is None:
+            view_metrics = _views[url_name] = ViewMetrics(getattr(settings, 'METRICS_WINDOW', 1000))
+        view_metrics.add(wall, db, template, queries)
+
+def snapshot():
+    """Summaries for every URL name seen by this process"""
+    with _views_lock:
+        return {url_name: view_metrics.summary() for url_name, view_metrics in sorted(_views.items())}
+
+def reset():
+    with _views_lock:
+        _views.clear()
+
+# ==================== QUERY BUDGETS ====================
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+def check_budget(url_name, queries):
+    """Warn (or fail, with QUERY_BUDGET_STRICT) when a view runs more queries than budgeted"""
+    budget = getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+    if budget is None or queries <= budget:
+        return
+    message = f"{url_name} ran {queries} queries, over its budget of {budget}."
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+# ==================== MIDDLEWARE AND ENDPOINT ====================
+
+def _server_timing(metrics, wall):
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'tpl;dur={metrics.template_time * 1000:.1f}',
+        f'total;dur={wall * 1000:.1f}',
+    ])
+
+def _finish(request, response, metrics, started):
+    wall = time.perf_counter() - started
+    match = getattr(request, 'resolver_match', None)
+    url_name = match.url_name if match and match.url_name else '<unresolved>'
+    record(url_name, wall * 1000, metrics.db_time * 1000, metrics.template_time * 1000, metrics.queries)
+    response['Server-Timing'] = _server_timing(metrics, wall)
+    check_budget(url_name, metrics.queries)
+    return response
+
+def _start():
+    # Connections opened before the signal was connected (or reused across requests)
+    for connection in connections.all(initialized_only=True):
+        _install_query_wrapper(connection)
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics), time.perf_counter()
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """Record query count, DB time, template time and wall time per URL name.
+
+    Keep it first in MIDDLEWARE so session and auth queries are counted too.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics, token, started = _start()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, metrics, started)
+        return middleware
+
+    def middleware(request):
+        metrics, token, started = _start()
+        try:
+            response = get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, metrics, started)
+    return middleware
+
+@require_role('superadmin')
+def metrics_view(request):
+    """Rolling per-view histograms, for super admins connecting from INTERNAL_IPS"""
+    # Behind a reverse proxy on the same host every client is 127.0.0.1, so
+    # the address check alone would make the metrics public
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'INTERNAL_IPS', []):
+        raise Http404
+    return JsonResponse({'window': getattr(settings, 'METRICS_WINDOW', 1000), 'views': snapshot()})
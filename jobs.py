@@ -0,0 +1,215 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .sharding import current_shard, use_shard
+
+logger = logging.getLogger(__name__)
+
+# ==================== TASK REGISTRY ====================
+
+# Background jobs live in the accounts_job table on the default database, so
+# they need no broker: enqueue() inserts a row (inside the caller's
+# transaction, if any) and `manage.py run_workers` claims and runs them.
+
+_tasks = {}
+
+class Task:
+    """A function registered with @task, run by the workers"""
+
+    def __init__(self, func, name, max_attempts, batch_size, priority):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.priority = priority
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, payload=None, **options):
+        return enqueue(self.name, payload, **options)
+
+    def run(self, jobs):
+        if self.batch_size:
+            return self.func([job.payload for job in jobs])
+        return self.func(**jobs[0].payload)
+
+def task(name=None, max_attempts=3, batch_size=None, priority=0):
+    """Register a function as a background task.
+
+    Jobs call it with their payload as keyword arguments. With batch_size,
+    up to that many pending jobs of the task are claimed together and the
+    function receives a list of their payloads instead.
+    """
+    def decorator(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}', max_attempts, batch_size, priority)
+        _tasks[registered.name] = registered
+        return registered
+    return decorator
+
+def get_task(name):
+    return _tasks.get(name)
+
+# ==================== ENQUEUEING ====================
+
+def enqueue(task_name, payload=None, dedupe_key=None, priority=None, delay=0):
+    """Queue a job for `task_name` and return it.
+
+    While a job with the same dedupe_key is still pending, that job is
+    returned instead of queueing another. The job runs on the shard that is
+    current now (see sharding.py).
+    """
+    registered = get_task(task_name)
+    if registered is None:
+        raise ValueError(f"Unknown task '{task_name}'.")
+    fields = {
+        'task': task_name,
+        'payload': payload or {},
+        'shard': current_shard(),
+        'priority': registered.priority if priority is None else priority,
+        'max_attempts': registered.max_attempts,
+        'run_after': timezone.now() + timedelta(seconds=delay),
+    }
+    if dedupe_key is None:
+        return Job.objects.create(**fields)
+
+    pending = Job.objects.filter(dedupe_key=dedupe_key, status=Job.PENDING)
+    existing = pending.first()
+    if existing is not None:
+        return existing
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            return Job.objects.create(dedupe_key=dedupe_key, **fields)
+    except IntegrityError:
+        # Another process queued it first
+        return pending.get()
+
+# ==================== WORKER ====================
+
+def retry_delay(attempts):
+    """Seconds before retrying a job that has failed `attempts` times"""
+    return getattr(settings, 'JOB_RETRY_DELAY', 30) * 2 ** (attempts - 1)
+
+class Worker:
+    """Claims and runs jobs until stopped (or, in burst mode, until the queue is empty)"""
+
+    def __init__(self, name=None, poll_interval=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval if poll_interval is not None else getattr(settings, 'JOB_POLL_INTERVAL', 1)
+        self.stopping = False
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self, burst=False):
+        processed = 0
+        while not self.stopping:
+            try:
+                count = self.run_once()
+            except Exception:
+                # A database error (say, a lock timeout) mustn't stop the worker;
+                # jobs it left running are released once their lock goes stale
+                logger.exception('Worker %s failed to claim or finish jobs', self.name)
+                count = 0
+            processed += count
+            if not count:
+                if burst:
+                    break
+                time.sleep(self.poll_interval)
+        return processed
+
+    def run_once(self):
+        """Claim and run one job (or one batch); return how many jobs ran"""
+        jobs = self.claim()
+        if jobs:
+            self.execute(jobs)
+        return len(jobs)
+
+    def release_stale(self, now):
+        """Requeue jobs whose worker died while running them"""
+        cutoff = now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+        stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff)
+        stale.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, locked_by='', finished_at=now, last_error='Worker stopped while running the job.'
+        )
+        # A newer pending job may hold the dedupe key, so those go back one at a time
+        for job in stale.exclude(dedupe_key=None):
+            job.status, job.locked_by, job.run_after = Job.PENDING, '', now
+            self.requeue(job, ['status', 'locked_by', 'run_after'])
+        stale.update(status=Job.PENDING, locked_by='', run_after=now)
+
+    def requeue(self, job, update_fields):
+        """Save a job back as pending, or drop it if a pending job with its dedupe key was queued meanwhile"""
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                job.save(update_fields=update_fields)
+        except IntegrityError:
+            # The newer job does the same work
+            logger.info('Dropped job %s: job with dedupe key %r already pending', job.pk, job.dedupe_key)
+            Job.objects.filter(pk=job.pk).delete()
+
+    def claim(self):
+        now = timezone.now()
+        # On SQLite the transaction starts with BEGIN IMMEDIATE, so only one
+        # worker claims at a time; elsewhere SKIP LOCKED keeps them apart
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            self.release_stale(now)
+            ready = Job.objects.filter(status=Job.PENDING, run_after__lte=now).order_by('-priority', 'run_after', 'pk')
+            if connections[DEFAULT_DB_ALIAS].features.has_select_for_update_skip_locked:
+                ready = ready.select_for_update(skip_locked=True)
+            first = ready.first()
+            if first is None:
+                return []
+
+            registered = get_task(first.task)
+            job_ids = [first.pk]
+            if registered is not None and registered.batch_size:
+                job_ids = list(
+                    ready.filter(task=first.task, shard=first.shard).values_list('pk', flat=True)[:registered.batch_size]
+                )
+            Job.objects.filter(pk__in=job_ids, status=Job.PENDING).update(
+                status=Job.RUNNING, locked_by=self.name, locked_at=now, attempts=F('attempts') + 1,
+            )
+            return list(Job.objects.filter(pk__in=job_ids, status=Job.RUNNING, locked_by=self.name).order_by('pk'))
+
+    def execute(self, jobs):
+        registered = get_task(jobs[0].task)
+        started = time.perf_counter()
+        try:
+            if registered is None:
+                raise LookupError(f"Unknown task '{jobs[0].task}'.")
+            with use_shard(jobs[0].shard):
+                registered.run(jobs)
+        except Exception:
+            logger.exception('%s failed (%d jobs)', jobs[0].task, len(jobs))
+            self.failed(jobs, traceback.format_exc())
+            return
+
+        # Finished jobs are deleted to keep the queue small; failures stay for the admin
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+        logger.info('%s ran %d jobs in %.0f ms', jobs[0].task, len(jobs), (time.perf_counter() - started) * 1000)
+
+    def failed(self, jobs, error):
+        now = timezone.now()
+        for job in jobs:
+            job.last_error = error
+            job.locked_by = ''
+            update_fields = ['status', 'run_after', 'finished_at', 'locked_by', 'last_error']
+            if job.attempts < job.max_attempts:
+                job.status = Job.PENDING
+                job.run_after = now + timedelta(seconds=retry_delay(job.attempts))
+                self.requeue(job, update_fields)
+            else:
+                job.status = Job.FAILED
+                job.finished_at = now
+                job.save(update_fields=update_fields)
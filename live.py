@@ -0,0 +1,240 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import closing
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .sharding import shard_scoped
+
+logger = logging.getLogger(__name__)
+
+# ==================== CHANNELS ====================
+
+# Live announcements: each open server-sent events stream subscribes to the
+# channels of the announcement audiences it shows (see announcements.py), and
+# saving an Announcement publishes one pre-formatted event to its channels.
+
+def channel(audience):
+    """Pub/sub channel name for an announcements.py audience"""
+    kind, pk = audience
+    name = kind if pk is None else f'{kind}:{pk}'
+    # Class ids are only unique within one shard
+    return shard_scoped(name) if kind == 'class' else name
+
+def announcement_event(announcement):
+    """The SSE frame for an announcement. It's built once and shared by every subscriber."""
+    data = json.dumps({
+        'id': announcement.pk,
+        'title': announcement.title,
+        'content': announcement.content,
+        'school': announcement.school_id,
+        'class': announcement.class_target_id,
+        'created_at': announcement.created_at.isoformat(),
+    })
+    # The event id lets a reconnecting client ask for what it missed (Last-Event-ID)
+    return f'id: {announcement.created_at.isoformat()}\nevent: announcement\ndata: {data}\n\n'
+
+# ==================== HUB ====================
+
+class Subscriber:
+    """One open stream: a small buffer of frames and an event to wake the stream.
+
+    Idle clients cost only this object (plus the response), so thousands fit
+    in one worker.
+    """
+    __slots__ = ('loop', 'event', 'frames', 'channels')
+
+    def __init__(self, channels, buffer):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.frames = deque(maxlen=buffer)
+        self.channels = channels
+
+    def push(self, frame):
+        # Always called on self.loop
+        self.frames.append(frame)
+        self.event.set()
+
+    async def get(self, timeout):
+        """The next frame, or None if nothing arrives within `timeout` seconds"""
+        if not self.frames:
+            self.event.clear()
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.frames.popleft()
+
+class Hub:
+    """In-process fan-out from channels to subscribers. Safe to publish to from any thread."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscriber = Subscriber(tuple(channels), getattr(settings, 'LIVE_BUFFER', 20))
+        with self._lock:
+            for name in subscriber.channels:
+                self._subscribers.setdefault(name, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for name in subscriber.channels:
+                subscribers = self._subscribers.get(name)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[name]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(set().union(*self._subscribers.values()))
+
+    def dispatch(self, channels, frame):
+        """Deliver a frame once to every subscriber of any of the channels"""
+        with self._lock:
+            targets = set().union(*(self._subscribers.get(name, ()) for name in channels))
+        for subscriber in targets:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, frame)
+            except RuntimeError:
+                # The stream's event loop has closed; it unsubscribes itself
+                pass
+        return len(targets)
+
+hub = Hub()
+
+# ==================== BACKENDS ====================
+
+class LocalBackend:
+    """Publish straight to this process's hub. Enough for a single ASGI worker."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, channels, frame):
+        self.hub.dispatch(channels, frame)
+
+class SQLiteBackend:
+    """Fan events out to every worker process through a shared SQLite file.
+
+    Each process polls the file from one background thread and hands new
+    events to its own hub. This is a local stand-in: with several servers,
+    point LIVE_BACKEND at a class with the same methods built on a real
+    broker (Redis pub/sub, PostgreSQL LISTEN/NOTIFY).
+    """
+
+    def __init__(self, hub, path=None, poll_interval=None, retention=60):
+        self.hub = hub
+        self.path = str(path or getattr(settings, 'LIVE_SQLITE_PATH', 'live-events.sqlite3'))
+        self.poll_interval = poll_interval if poll_interval is not None else getattr(
+            settings, 'LIVE_POLL_INTERVAL', 0.5
+        )
+        self.retention = retention
+        self.last_id = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        # Shared by every publishing thread, one at a time
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS live_event '
+            '(id INTEGER PRIMARY KEY AUTOINCREMENT, channels TEXT, frame TEXT, created REAL)'
+        )
+        return connection
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            # Start from now; older events were for streams that are gone
+            with closing(self.connect()) as connection:
+                self.last_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM live_event').fetchone()[0]
+            self._thread = threading.Thread(target=self.poll_forever, name='live-events', daemon=True)
+            self._thread.start()
+
+    def publish(self, channels, frame):
+        with self._publish_lock:
+            if self._publisher is None:
+                self._publisher = self.connect()
+            try:
+                self._publisher.execute(
+                    'INSERT INTO live_event (channels, frame, created) VALUES (?, ?, ?)',
+                    (json.dumps(list(channels)), frame, time.time()),
+                )
+            except sqlite3.Error:
+                # Reconnect next time, in case the file was replaced
+                self._publisher.close()
+                self._publisher = None
+                raise
+
+    def poll(self, connection):
+        """Dispatch events published since the last poll; return how many there were"""
+        rows = connection.execute(
+            'SELECT id, channels, frame FROM live_event WHERE id > ? ORDER BY id', (self.last_id,)
+        ).fetchall()
+        for event_id, channels, frame in rows:
+            self.hub.dispatch(json.loads(channels), frame)
+            self.last_id = event_id
+        return len(rows)
+
+    def poll_forever(self):
+        connection = None
+        last_purge = failures = 0
+        while True:
+            try:
+                if connection is None:
+                    connection = self.connect()
+                self.poll(connection)
+                if time.monotonic() - last_purge > self.retention:
+                    connection.execute('DELETE FROM live_event WHERE created < ?', (time.time() - self.retention,))
+                    last_purge = time.monotonic()
+                failures = 0
+            except Exception:
+                # One error ("database is locked", a full disk) mustn't end this
+                # process's cross-worker events: log it, back off and reconnect
+                failures += 1
+                logger.exception('Polling %s for live events failed', self.path)
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                time.sleep(min(self.poll_interval * 2 ** failures, 30))
+                continue
+            time.sleep(self.poll_interval)
+
+_backend = (None, None)
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """The LIVE_BACKEND instance for this process, started on first use"""
+    global _backend
+    path = getattr(settings, 'LIVE_BACKEND', 'accounts.live.LocalBackend')
+    with _backend_lock:
+        if _backend[0] != path:
+            backend = import_string(path)(hub)
+            backend.start()
+            _backend = (path, backend)
+        return _backend[1]
+
+def publish(channels, frame):
+    # Runs once the announcement has committed, so a broken backend is logged
+    # rather than turning a successful save into an error
+    try:
+        get_backend().publish(channels, frame)
+    except Exception:
+        logger.exception('Publishing a live event to %s failed', ', '.join(channels))
@@ -0,0 +1,206 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from accounts.dashboard_cache import bump_version, bump_school_data, class_namespace, class_school_ids
+from accounts.grade_stats import rebuild_grade_statistics
+from accounts.models import User, School, Class, Grade
+from accounts.sharding import sharding_enabled, shard_for_school, use_shard
+
+
+class RowError(Exception):
+    pass
+
+
+def row_text(row, key):
+    value = row.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def read_rows(source, file_format):
+    """Yield (line number, row dict, raw text) without loading the whole file"""
+    if file_format == 'csv':
+        reader = csv.DictReader(source)
+        for row in reader:
+            yield reader.line_num, row, json.dumps(row)
+        return
+
+    for line_number, line in enumerate(source, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else {}, line
+
+
+def find_class(classes, class_name, school_slug=''):
+    """The id of the named class, from build_lookups()' {name: [(id, school slug)]}"""
+    matches = classes.get(class_name, [])
+    if school_slug:
+        matches = [match for match in matches if match[1] == school_slug]
+    if not matches:
+        raise RowError(f"Unknown class '{class_name}'")
+    if len(matches) > 1:
+        raise RowError(f"Class '{class_name}' exists in several schools; add a school column")
+    return matches[0][0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import grades from a CSV or JSONL file with the columns '
+        'student, class, assignment, grade and optionally max_grade, category and school.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--school', help='Only match students and classes in this school (slug)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--rejects', help='Where to write rejected rows (default: <path>.rejects.csv)')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+        file_format = options['format'] or ('jsonl' if path.suffix in ('.jsonl', '.json') else 'csv')
+        batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        rejects_path = Path(options['rejects'] or f'{path}.rejects.csv')
+
+        school = None
+        if options['school']:
+            school = School.objects.filter(slug=options['school']).first()
+            if school is None:
+                raise CommandError(f"School '{options['school']}' does not exist.")
+        elif sharding_enabled():
+            raise CommandError('--school is required when SCHOOL_SHARDS is set.')
+
+        # Everything below reads and writes the school's shard
+        with use_shard(shard_for_school(school) if school else None):
+            self.import_file(path, file_format, school, batch_size, rejects_path)
+
+    def import_file(self, path, file_format, school, batch_size, rejects_path):
+        students, classes = self.build_lookups(school)
+
+        started = time.perf_counter()
+        imported = rejected = 0
+        class_ids = set()  # Classes with committed grades
+        batch = []
+
+        try:
+            with path.open(newline='', encoding='utf-8-sig') as source, \
+                    rejects_path.open('w', newline='', encoding='utf-8') as rejects_file:
+                rejects = csv.writer(rejects_file)
+                rejects.writerow(['line', 'error', 'row'])
+
+                for line_number, row, raw in read_rows(source, file_format):
+                    try:
+                        grade = self.build_grade(row, students, classes)
+                    except RowError as exc:
+                        rejects.writerow([line_number, str(exc), raw])
+                        rejected += 1
+                        continue
+
+                    batch.append(grade)
+                    if len(batch) >= batch_size:
+                        imported += self.save_batch(batch, class_ids)
+                        batch = []
+                        self.report_progress(imported, started)
+                imported += self.save_batch(batch, class_ids)
+        except Exception:
+            self.stderr.write(f'Import stopped after {imported} grades; those stay imported.')
+            raise
+        finally:
+            # Batches commit one by one, so even a failed import has statistics to refresh
+            self.refresh_classes(class_ids)
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else imported
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} grades in {elapsed:.1f}s ({rate:.0f} rows/sec); '
+            f'{rejected} rejected.'
+        ))
+        if rejected:
+            self.stdout.write(f'Rejected rows written to {rejects_path}')
+
+    def build_lookups(self, school):
+        """Map usernames and class names to ids once, up front"""
+        students = User.objects.filter(role='student')
+        class_rows = Class.objects.all()
+        if school is not None:
+            students = students.filter(school=school)
+            class_rows = class_rows.filter(school=school)
+
+        classes = {}
+        for class_id, name, school_slug in class_rows.values_list('pk', 'name', 'school__slug').iterator():
+            classes.setdefault(name, []).append((class_id, school_slug))
+        return dict(students.values_list('username', 'pk').iterator()), classes
+
+    def build_grade(self, row, students, classes):
+        username = row_text(row, 'student')
+        class_name = row_text(row, 'class')
+        assignment = row_text(row, 'assignment')
+
+        student_id = students.get(username)
+        if student_id is None:
+            raise RowError(f"Unknown student '{username}'")
+
+        class_id = find_class(classes, class_name, row_text(row, 'school'))
+
+        if not assignment:
+            raise RowError('Missing assignment')
+        if len(assignment) > Grade._meta.get_field('assignment_name').max_length:
+            raise RowError('Assignment name is too long')
+
+        category = row_text(row, 'category').lower() or Grade._meta.get_field('category').default
+        if category not in dict(Grade.CATEGORY_CHOICES):
+            raise RowError(f"Unknown category '{category}'")
+
+        return Grade(
+            student_id=student_id,
+            class_enrolled_id=class_id,
+            assignment_name=assignment,
+            category=category,
+            grade=self.parse_mark(row.get('grade'), 'grade'),
+            max_grade=self.parse_mark(row.get('max_grade') or 100, 'max_grade'),
+        )
+
+    def parse_mark(self, value, field):
+        try:
+            mark = Decimal(str(value).strip())
+        except (InvalidOperation, ValueError):
+            raise RowError(f"Invalid {field} '{value}'")
+        if not mark.is_finite() or mark < 0 or mark >= 1000:
+            raise RowError(f"Invalid {field} '{value}'")
+        return mark.quantize(Decimal('0.01'))
+
+    def save_batch(self, batch, class_ids):
+        if not batch:
+            return 0
+        with transaction.atomic(using=router.db_for_write(Grade)):
+            Grade.objects.bulk_create(batch)
+        class_ids.update(grade.class_enrolled_id for grade in batch)
+        return len(batch)
+
+    def refresh_classes(self, class_ids):
+        # Grade signals don't fire for bulk_create, so refresh statistics and
+        # cached dashboard fragments once per touched class
+        class_ids = sorted(class_ids)
+        for i in range(0, len(class_ids), 500):
+            rebuild_grade_statistics(class_ids=class_ids[i:i + 500])
+            bump_school_data(class_school_ids(class_ids[i:i + 500]))
+        for class_id in class_ids:
+            bump_version(class_namespace(class_id))
+
+    def report_progress(self, imported, started):
+        if self.verbosity > 1:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{imported} grades imported ({imported / elapsed:.0f} rows/sec)')
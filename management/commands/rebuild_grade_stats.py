@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.grade_stats import find_drift, rebuild_grade_statistics
+from accounts.sharding import shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the GradeStatistics table from the Grade table, or check it for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report rows that disagree with the Grade table; exit non-zero on drift.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # Statistics live next to their grades, so work through every shard
+        aliases = shard_aliases()
+        if options['check']:
+            drifted = 0
+            for alias in aliases:
+                with use_shard(alias):
+                    drift = find_drift()
+                prefix = f'{alias}: ' if len(aliases) > 1 else ''
+                for (student_id, class_id), (stored, expected) in sorted(
+                    drift.items(), key=lambda item: (item[0][1], item[0][0] or 0)
+                ):
+                    self.stdout.write(
+                        f'{prefix}student={student_id} class={class_id}: stored={stored} expected={expected}'
+                    )
+                drifted += len(drift)
+            if drifted:
+                raise CommandError(f'{drifted} grade statistics rows have drifted.')
+            self.stdout.write(self.style.SUCCESS('Grade statistics are up to date.'))
+            return
+
+        count = 0
+        for alias in aliases:
+            with use_shard(alias):
+                count += rebuild_grade_statistics(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} grade statistics rows.'))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.dashboard_cache import store_student_reports
+from accounts.grade_analytics import iter_school_reports
+from accounts.models import School
+from accounts.sharding import shard_for_school, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute every student\'s normalized averages and GPA for a school (or all schools) '
+        'and cache them for the student dashboard.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', help='Only this school (slug)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Students per batch')
+
+    def handle(self, *args, **options):
+        schools = School.objects.order_by('pk')
+        if options['school']:
+            schools = schools.filter(slug=options['school'])
+            if not schools.exists():
+                raise CommandError(f"School '{options['school']}' does not exist.")
+
+        started = time.perf_counter()
+        total = 0
+        for school in schools:
+            count = 0
+            with use_shard(shard_for_school(school)):
+                for reports in iter_school_reports(school, options['batch_size']):
+                    store_student_reports(reports)
+                    count += len(reports)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{school.slug}: {count} students')
+            total += count
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {total} student reports in {elapsed:.1f}s.'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.replication import replicate
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database over REPLICA_DATABASE, once or every --interval seconds. '
+        'A local stand-in for real replication.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Keep replicating with this delay (0 = once)')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        while True:
+            started = time.perf_counter()
+            try:
+                replicate()
+            except ImproperlyConfigured as exc:
+                raise CommandError(str(exc))
+            if self.verbosity > 1 or not options['interval']:
+                self.stdout.write(f'Replicated in {(time.perf_counter() - started) * 1000:.0f} ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
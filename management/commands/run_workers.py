@@ -0,0 +1,64 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+
+
+def run_worker(burst, poll_interval):
+    """Entry point of each worker process.
+
+    Processes are spawned rather than forked (so this works the same on
+    Windows), which means Django has to be set up again here.
+    """
+    import django
+    django.setup()
+    from accounts.jobs import Worker
+
+    worker = Worker(poll_interval=poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    return worker.run(burst=burst)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (see accounts/jobs.py) until stopped with Ctrl+C or SIGTERM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to run')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            from accounts.jobs import Worker
+
+            worker = Worker(poll_interval=options['poll_interval'])
+            try:
+                processed = worker.run(burst=options['burst'])
+            except KeyboardInterrupt:
+                return
+            if options['verbosity'] > 0:
+                self.stdout.write(self.style.SUCCESS(f'{worker.name} ran {processed} jobs.'))
+            return
+
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(target=run_worker, args=(options['burst'], options['poll_interval']), daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        if options['verbosity'] > 0:
+            self.stdout.write(f'Started {len(processes)} workers.')
+
+        def stop(*args):
+            for process in processes:
+                process.terminate()
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # The workers got the same Ctrl+C and finish their current job
+            for process in processes:
+                process.join()
@@ -0,0 +1,258 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from accounts.dashboard_cache import bump_version, bump_school_data, SUPER_ADMIN_KPIS, ANNOUNCEMENTS
+from accounts.grade_stats import rebuild_grade_statistics
+from accounts.models import User, School, Class, StudentEnrollment, Grade, Announcement
+from accounts.announcements import invalidate_timelines
+
+PLACE_NAMES = [
+    'Arday', 'Northview', 'Lakeside', 'Riverside', 'Hillcrest', 'Oakwood', 'Maple Grove',
+    'Cedar Park', 'Westfield', 'Eastgate', 'Southbank', 'Pinecrest', 'Brookside', 'Fairview',
+]
+SCHOOL_KINDS = ['High School', 'Academy', 'Secondary School', 'College']
+SUBJECTS = [
+    'Mathematics', 'English', 'Biology', 'Chemistry', 'Physics', 'History', 'Geography',
+    'Computer Science', 'Art', 'Music', 'Physical Education', 'Economics', 'French', 'Arabic',
+]
+ANNOUNCEMENT_TITLES = [
+    'Exam timetable published', 'Parent evening', 'Homework reminder', 'Trip consent forms due',
+    'Library hours changed', 'Sports day', 'Revision session', 'Term dates',
+]
+
+
+def assignment_category(index, count):
+    """A term of homework with a quiz every fourth assignment and a final exam"""
+    if index == count - 1:
+        return 'exam'
+    return 'quiz' if index % 4 == 3 else 'homework'
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic school district (schools, staff, students, classes, enrollments, '
+        'grades and announcements) with bulk inserts, for load testing and benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=10)
+        parser.add_argument('--students', type=int, default=800, help='Mean students per school')
+        parser.add_argument('--students-per-teacher', type=int, default=20)
+        parser.add_argument('--classes-per-teacher', type=int, default=4)
+        parser.add_argument('--classes-per-student', type=int, default=6)
+        parser.add_argument('--assignments', type=int, default=12, help='Graded assignments per class')
+        parser.add_argument('--announcements', type=int, default=40, help='Announcements per school')
+        parser.add_argument('--term-days', type=int, default=120, help='Spread timestamps over this many days')
+        parser.add_argument('--password', default='password', help='Password for every generated user')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, so runs are repeatable')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        self.term_start = timezone.now() - timedelta(days=options['term_days'])
+        # Hashing once keeps seeding fast; every generated user shares the password
+        self.password = make_password(options['password'])
+        self.max_grade = Decimal(Grade._meta.get_field('max_grade').default)
+        self.counts = dict.fromkeys(['schools', 'users', 'classes', 'enrollments', 'grades', 'announcements'], 0)
+        self.announcement_targets = set()
+
+        started = time.perf_counter()
+        if not User.objects.filter(role='superadmin').exists():
+            User.objects.create_superuser('district-admin', password=options['password'], role='superadmin')
+
+        first_number = School.objects.count() + 1
+        for number in range(first_number, first_number + options['schools']):
+            self.seed_school(number)
+            self.report_progress(started)
+
+        if self.verbosity:
+            self.stdout.write('Rebuilding grade statistics...')
+        rebuild_grade_statistics(batch_size=self.batch_size)
+        # bulk_create doesn't send signals, so invalidate what they would have
+        bump_version(SUPER_ADMIN_KPIS)
+        bump_version(ANNOUNCEMENTS)
+        bump_school_data(School.objects.values_list('pk', flat=True))
+        # Timelines aren't versioned, so drop the ones the new announcements belong in
+        for school_id, class_id in self.announcement_targets:
+            invalidate_timelines(school_id, class_id)
+
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{count} {name}' for name, count in self.counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary} in {elapsed:.1f}s.'))
+
+    def report_progress(self, started):
+        if self.verbosity > 1:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{self.counts['schools']} schools, {self.counts['grades']} grades "
+                f"({self.counts['grades'] / elapsed:.0f} grades/sec)"
+            )
+
+    def timestamp(self, day=None):
+        day = self.rng.uniform(0, self.options['term_days']) if day is None else day
+        return self.term_start + timedelta(days=day)
+
+    def bulk_create(self, model, objects):
+        """Insert `objects` (any iterable) in batches, each in its own transaction"""
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                self._insert(model, batch)
+                batch = []
+        self._insert(model, batch)
+
+    def _insert(self, model, batch):
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+
+    def insert_sql(self, model, field_names):
+        fields = [model._meta.get_field(name) for name in field_names]
+        return 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+
+    def insert_grades(self, rows):
+        """executemany() for grades: at this volume model instances and SQL compilation dominate bulk_create"""
+        sql = self.insert_sql(Grade, (
+            'student', 'class_enrolled', 'assignment_name', 'category', 'grade', 'max_grade', 'created_at'
+        ))
+        ops = connection.ops
+        batch = []
+        for student_id, class_id, assignment, category, mark, created_at in rows:
+            batch.append((
+                student_id, class_id, assignment, category,
+                ops.adapt_decimalfield_value(mark, 5, 2), ops.adapt_decimalfield_value(self.max_grade, 5, 2),
+                ops.adapt_datetimefield_value(created_at),
+            ))
+            if len(batch) >= self.batch_size:
+                self._execute_many(sql, batch)
+                batch = []
+        self._execute_many(sql, batch)
+
+    def insert_announcements(self, rows):
+        """executemany() for announcements, which keeps their created_at (bulk_create would use now())"""
+        sql = self.insert_sql(Announcement, (
+            'title', 'content', 'school', 'class_target', 'created_by', 'created_at'
+        ))
+        ops = connection.ops
+        batch = []
+        for title, content, school_id, class_id, author_id, created_at in rows:
+            batch.append((title, content, school_id, class_id, author_id, ops.adapt_datetimefield_value(created_at)))
+            if len(batch) >= self.batch_size:
+                self._execute_many(sql, batch)
+                batch = []
+        self._execute_many(sql, batch)
+
+    def _execute_many(self, sql, batch):
+        if batch:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+
+    def seed_school(self, number):
+        rng = self.rng
+        options = self.options
+        name = f'{rng.choice(PLACE_NAMES)} {rng.choice(SCHOOL_KINDS)} {number}'
+        slug = slugify(name)
+        school = School.objects.create(
+            name=name, slug=slug, address=f'{number} School Road', phone=f'555-{number:04d}',
+            email=f'office@{slug}.example.com',
+        )
+        self.counts['schools'] += 1
+
+        # School sizes are skewed: a few large schools, many small ones
+        students = max(options['classes_per_student'], int(rng.lognormvariate(0, 0.5) * options['students']))
+        teachers = max(1, students // options['students_per_teacher'])
+        self.bulk_create(User, self.users(school, 'schooladmin', 1))
+        self.bulk_create(User, self.users(school, 'teacher', teachers))
+        self.bulk_create(User, self.users(school, 'student', students))
+        self.counts['users'] += 1 + teachers + students
+
+        teacher_ids = list(User.objects.filter(school=school, role='teacher').values_list('pk', flat=True))
+        self.bulk_create(Class, (
+            Class(
+                name=f'{subject} {index + 1}', subject=subject, school=school, teacher_id=teacher_id,
+            )
+            for teacher_id in teacher_ids
+            for index, subject in enumerate(rng.sample(SUBJECTS, options['classes_per_teacher']))
+        ))
+        class_ids = list(Class.objects.filter(school=school).values_list('pk', flat=True))
+        self.counts['classes'] += len(class_ids)
+
+        # Each class gets a difficulty and a fixed set of assignment dates
+        class_offsets = {class_id: rng.gauss(0, 6) for class_id in class_ids}
+        assignment_days = {
+            class_id: sorted(rng.uniform(0, options['term_days']) for _ in range(options['assignments']))
+            for class_id in class_ids
+        }
+        student_ids = list(User.objects.filter(school=school, role='student').values_list('pk', flat=True))
+        enrollments = {
+            student_id: rng.sample(class_ids, min(len(class_ids), options['classes_per_student']))
+            for student_id in student_ids
+        }
+        self.bulk_create(StudentEnrollment, (
+            StudentEnrollment(student_id=student_id, class_enrolled_id=class_id)
+            for student_id, student_classes in enrollments.items()
+            for class_id in student_classes
+        ))
+        self.counts['enrollments'] += sum(len(classes) for classes in enrollments.values())
+
+        self.insert_grades(self.grades(enrollments, class_offsets, assignment_days))
+        self.insert_announcements(self.announcements(school, teacher_ids, class_ids))
+
+    def users(self, school, role, count):
+        for index in range(count):
+            yield User(
+                username=f'{school.slug}-{role}-{index + 1}', password=self.password,
+                role=role, school=school, email=f'{role}{index + 1}@{school.slug}.example.com',
+            )
+
+    def grades(self, enrollments, class_offsets, assignment_days):
+        rng = self.rng
+        for student_id, class_ids in enrollments.items():
+            ability = rng.gauss(72, 10)
+            for class_id in class_ids:
+                days = assignment_days[class_id]
+                for index, day in enumerate(days):
+                    # Roughly one submission in twenty is missing
+                    if rng.random() < 0.05:
+                        continue
+                    mark = min(100, max(0, rng.gauss(ability + class_offsets[class_id], 8)))
+                    self.counts['grades'] += 1
+                    yield (
+                        student_id, class_id, f'Assignment {index + 1}', assignment_category(index, len(days)),
+                        Decimal(f'{mark:.1f}'),
+                        self.timestamp(min(self.options['term_days'], day + rng.uniform(0, 3))),
+                    )
+
+    def announcements(self, school, teacher_ids, class_ids):
+        rng = self.rng
+        admin = User.objects.get(username=f'{school.slug}-schooladmin-1')
+        for _ in range(self.options['announcements']):
+            title = rng.choice(ANNOUNCEMENT_TITLES)
+            # Most announcements target one class; the rest go to the whole school
+            if class_ids and rng.random() < 0.7:
+                class_id = rng.choice(class_ids)
+                author_id = rng.choice(teacher_ids)
+            else:
+                class_id, author_id = None, admin.pk
+            self.counts['announcements'] += 1
+            self.announcement_targets.add((school.pk, class_id))
+            yield (
+                title, f'{title}. Please check the school calendar for details.',
+                school.pk, class_id, author_id, self.timestamp(),
+            )
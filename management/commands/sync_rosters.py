@@ -0,0 +1,143 @@
+import csv
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.management.commands.import_grades import RowError, find_class, read_rows, row_text
+from accounts.models import User, School, Class
+from accounts.rosters import sync_rosters
+from accounts.sharding import sharding_enabled, shard_for_school, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        'Replace class rosters with the ones in a CSV or JSONL file with the columns class, student '
+        'and optionally school. Every class in the file ends up with exactly the students listed for it '
+        '(a row with an empty student lists the class with nobody in it); other classes are left alone.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with the desired rosters')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--school', help='Only match students and classes in this school (slug)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without making them')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Also sync classes with rejected rows (the students those rows meant are dropped)',
+        )
+        parser.add_argument('--rejects', help='Where to write rejected rows (default: <path>.rejects.csv)')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist.')
+        file_format = options['format'] or ('jsonl' if path.suffix in ('.jsonl', '.json') else 'csv')
+        self.verbosity = options['verbosity']
+        rejects_path = Path(options['rejects'] or f'{path}.rejects.csv')
+
+        school = None
+        if options['school']:
+            school = School.objects.filter(slug=options['school']).first()
+            if school is None:
+                raise CommandError(f"School '{options['school']}' does not exist.")
+        elif sharding_enabled():
+            raise CommandError('--school is required when SCHOOL_SHARDS is set.')
+
+        # Everything below reads and writes the school's shard
+        with use_shard(shard_for_school(school) if school else None):
+            self.sync_file(path, file_format, school, options, rejects_path)
+
+    def sync_file(self, path, file_format, school, options, rejects_path):
+        started = time.perf_counter()
+        students, classes, class_names = self.build_lookups(school)
+        rosters, rejected, held = self.read_rosters(path, file_format, students, classes, rejects_path)
+        if held and not options['force']:
+            # A mistyped username would otherwise un-enroll the student it meant
+            for class_id in held:
+                del rosters[class_id]
+            names = ', '.join(sorted(class_names[class_id] for class_id in held))
+            self.stderr.write(f'Skipped {len(held)} classes with rejected rows ({names}); fix them or use --force.')
+
+        changes = sync_rosters(rosters, dry_run=options['dry_run'], batch_size=options['batch_size'])
+
+        added = removed = kept = 0
+        for class_id, change in sorted(changes.items()):
+            added += len(change['added'])
+            removed += len(change['removed'])
+            kept += change['kept']
+            if self.verbosity > 1 and (change['added'] or change['removed']):
+                self.stdout.write(
+                    f"{class_names[class_id]}: +{len(change['added'])} -{len(change['removed'])} "
+                    f"({change['kept']} unchanged)"
+                )
+
+        elapsed = time.perf_counter() - started
+        verb = 'Would sync' if options['dry_run'] else 'Synced'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(changes)} classes in {elapsed:.1f}s: {added} enrollments added, '
+            f'{removed} removed, {kept} unchanged; {rejected} rows rejected.'
+        ))
+        if rejected:
+            self.stdout.write(f'Rejected rows written to {rejects_path}')
+
+    def build_lookups(self, school):
+        """Map usernames to (id, school slug) and class names to ids once, up front"""
+        students = User.objects.filter(role='student')
+        class_rows = Class.objects.all()
+        if school is not None:
+            students = students.filter(school=school)
+            class_rows = class_rows.filter(school=school)
+
+        classes = {}
+        class_names = {}
+        for class_id, name, school_slug in class_rows.values_list('pk', 'name', 'school__slug').iterator():
+            classes.setdefault(name, []).append((class_id, school_slug))
+            class_names[class_id] = name
+        students = {
+            username: (student_id, school_slug)
+            for username, student_id, school_slug in students.values_list('username', 'pk', 'school__slug').iterator()
+        }
+        return students, classes, class_names
+
+    def read_rosters(self, path, file_format, students, classes, rejects_path):
+        """Desired {class_id: set of student ids}, the rejected row count and the classes with rejected rows"""
+        class_schools = {class_id: slug for matches in classes.values() for class_id, slug in matches}
+        rosters = {}
+        rejected = 0
+        held = set()
+
+        with path.open(newline='', encoding='utf-8-sig') as source, \
+                rejects_path.open('w', newline='', encoding='utf-8') as rejects_file:
+            rejects = csv.writer(rejects_file)
+            rejects.writerow(['line', 'error', 'row'])
+
+            for line_number, row, raw in read_rows(source, file_format):
+                class_id = None
+                try:
+                    class_id = find_class(classes, row_text(row, 'class'), row_text(row, 'school'))
+                    student_id = self.find_student(row, students, class_schools[class_id])
+                except RowError as exc:
+                    rejects.writerow([line_number, str(exc), raw])
+                    rejected += 1
+                    if class_id is not None:
+                        rosters.setdefault(class_id, set())
+                        held.add(class_id)
+                    continue
+
+                roster = rosters.setdefault(class_id, set())
+                if student_id is not None:
+                    roster.add(student_id)
+        return rosters, rejected, held
+
+    def find_student(self, row, students, school_slug):
+        username = row_text(row, 'student')
+        if not username:
+            return None
+        student_id, student_school = students.get(username, (None, None))
+        if student_id is None:
+            raise RowError(f"Unknown student '{username}'")
+        if student_school != school_slug:
+            raise RowError(f"Student '{username}' is not in the class's school")
+        return student_id
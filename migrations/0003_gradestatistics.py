@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum, Min, Max, F
+
+
+def populate_grade_statistics(apps, schema_editor):
+    Grade = apps.get_model('accounts', 'Grade')
+    GradeStatistics = apps.get_model('accounts', 'GradeStatistics')
+    aggregates = {
+        'count': Count('pk'),
+        'total': Sum('grade'),
+        'total_squares': Sum(F('grade') * F('grade'), output_field=models.DecimalField(max_digits=20, decimal_places=4)),
+        'min_grade': Min('grade'),
+        'max_grade': Max('grade'),
+    }
+    rows = [
+        GradeStatistics(student_id=row.pop('student'), class_enrolled_id=row.pop('class_enrolled'), **row)
+        for row in Grade.objects.order_by().values('student', 'class_enrolled').annotate(**aggregates)
+    ] + [
+        GradeStatistics(class_enrolled_id=row.pop('class_enrolled'), **row)
+        for row in Grade.objects.order_by().values('class_enrolled').annotate(**aggregates)
+    ]
+    GradeStatistics.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_school_class_grade_announcement_user_school_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_squares', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('min_grade', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('max_grade', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('class_enrolled', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.class')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'grade statistics',
+                'constraints': [models.UniqueConstraint(fields=('student', 'class_enrolled'), name='unique_student_class_grade_statistics'), models.UniqueConstraint(condition=models.Q(('student__isnull', True)), fields=('class_enrolled',), name='unique_class_grade_statistics')],
+            },
+        ),
+        migrations.RunPython(populate_grade_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['-created_at'], name='grade_created_idx'),
+        ),
+    ]
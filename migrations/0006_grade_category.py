@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_grade_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='category',
+            field=models.CharField(choices=[('assignment', 'Assignment'), ('homework', 'Homework'), ('quiz', 'Quiz'), ('project', 'Project'), ('exam', 'Exam')], default='assignment', max_length=20),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 # Create your models here.
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -14,6 +15,12 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
     school = models.ForeignKey('School', on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['school', 'role'], name='user_school_role_idx'),
+            models.Index(fields=['role'], name='user_role_idx'),
+        ]
+
     def is_superadmin(self):
         return self.role == 'superadmin'
 
@@ -71,16 +78,43 @@ class StudentEnrollment(models.Model):
         return f"{self.student.username} in {self.class_enrolled.name}"
 
 class Grade(models.Model):
+    # Weighted by settings.GRADE_CATEGORY_WEIGHTS in class scores and GPA (grade_analytics.py)
+    CATEGORY_CHOICES = [
+        ('assignment', 'Assignment'),
+        ('homework', 'Homework'),
+        ('quiz', 'Quiz'),
+        ('project', 'Project'),
+        ('exam', 'Exam'),
+    ]
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
     class_enrolled = models.ForeignKey(Class, on_delete=models.CASCADE)
     assignment_name = models.CharField(max_length=200)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='assignment')
     grade = models.DecimalField(max_digits=5, decimal_places=2)
     max_grade = models.DecimalField(max_digits=5, decimal_places=2, default=100)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-created_at'], name='grade_student_created_idx'),
+            models.Index(fields=['class_enrolled', '-created_at'], name='grade_class_created_idx'),
+            # Admin changelist ordering and date hierarchy
+            models.Index(fields=['-created_at'], name='grade_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.username} - {self.assignment_name}: {self.grade}/{self.max_grade}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so GradeStatistics can be adjusted on save. With
+        # only()/defer() the signals in signals.py fetch the stored values instead
+        loaded = dict(zip(field_names, values))
+        if {'student_id', 'class_enrolled_id', 'grade'} <= loaded.keys():
+            instance._loaded_values = loaded
+        return instance
+
 class Announcement(models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
@@ -89,5 +123,99 @@ class Announcement(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['school', '-created_at'], name='announcement_school_idx'),
+            models.Index(fields=['class_target', '-created_at'], name='announcement_class_idx'),
+            models.Index(fields=['-created_at'], name='announcement_created_idx'),
+            # Global announcements (no school) are read on every school admin dashboard
+            models.Index(
+                fields=['-created_at'], condition=models.Q(school__isnull=True),
+                name='announcement_global_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.title
+
+class GradeStatistics(models.Model):
+    """Running grade totals per (student, class), or per class when student is empty.
+
+    Kept up to date by the signals in signals.py; rebuild with
+    ``manage.py rebuild_grade_stats``.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    class_enrolled = models.ForeignKey(Class, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_squares = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+    min_grade = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    max_grade = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'grade statistics'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'class_enrolled'], name='unique_student_class_grade_statistics'
+            ),
+            models.UniqueConstraint(
+                fields=['class_enrolled'], condition=models.Q(student__isnull=True),
+                name='unique_class_grade_statistics'
+            ),
+        ]
+
+    def __str__(self):
+        who = self.student.username if self.student_id else 'All students'
+        return f"{who} in {self.class_enrolled.name}: {self.average}"
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0
+
+    @property
+    def variance(self):
+        if not self.count:
+            return 0
+        return self.total_squares / self.count - self.average ** 2
+
+class Job(models.Model):
+    """A queued background task (see jobs.py); run by ``manage.py run_workers``.
+
+    Always stored on the default database, whatever shard the task works on.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    shard = models.CharField(max_length=100, default='default', help_text='Database the task runs against')
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True)
+    priority = models.SmallIntegerField(default=0, help_text='Higher runs first')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=200, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after'], name='job_queue_idx'),
+        ]
+        constraints = [
+            # One pending job per key; a running job doesn't block queueing a fresh one
+            models.UniqueConstraint(
+                fields=['dedupe_key'], condition=models.Q(status='pending'), name='unique_pending_job_dedupe_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
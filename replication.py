@@ -0,0 +1,29 @@
+import sqlite3
+from contextlib import closing
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# ==================== STAND-IN SQLITE REPLICATOR ====================
+
+# Real deployments replicate with the database server (or a tool such as
+# Litestream for SQLite). This copies the primary file over the replica so the
+# replica routing in routers.py can be exercised locally with two SQLite files.
+
+def copy_sqlite_database(source_path, target_path):
+    """Copy a consistent snapshot of one SQLite database over another"""
+    with closing(sqlite3.connect(source_path)) as source, closing(sqlite3.connect(target_path)) as target:
+        source.backup(target)
+
+def _sqlite_path(alias):
+    database = settings.DATABASES.get(alias)
+    if not database or database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise ImproperlyConfigured(f"DATABASES['{alias}'] must be a SQLite database to replicate it.")
+    return str(database['NAME'])
+
+def replicate(primary='default', replica=None):
+    """Bring the replica database up to date with the primary"""
+    replica = replica or getattr(settings, 'REPLICA_DATABASE', None)
+    if not replica:
+        raise ImproperlyConfigured('REPLICA_DATABASE is not set.')
+    copy_sqlite_database(_sqlite_path(primary), _sqlite_path(replica))
@@ -0,0 +1,79 @@
+from django.db import router, transaction
+
+from .dashboard_cache import bump_version, bump_school_data, class_namespace, class_school_ids
+from .models import StudentEnrollment
+
+# ==================== ROSTER SYNC ====================
+
+# Start-of-term rosters replace whole classes at once. Rather than saving
+# enrollments one by one (a query and a round of signals each), the desired
+# rosters are diffed against the current enrollments as sets of ids, the
+# additions are written in bulk and the removals with one DELETE per class.
+# The per-row enrollment signals are replaced by a single invalidation.
+
+def _chunks(ids, size=500):
+    # Keeps IN lists under the database's parameter limit
+    ids = sorted(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+def diff_rosters(rosters):
+    """{class_id: {'added': ids, 'removed': ids, 'kept': count}} for desired {class_id: student ids}"""
+    current = {class_id: set() for class_id in rosters}
+    for class_ids in _chunks(rosters):
+        enrollments = StudentEnrollment.objects.filter(class_enrolled__in=class_ids).values_list(
+            'class_enrolled_id', 'student_id'
+        )
+        for class_id, student_id in enrollments.iterator(chunk_size=5000):
+            current[class_id].add(student_id)
+
+    return {
+        class_id: {
+            'added': desired - current[class_id],
+            'removed': current[class_id] - desired,
+            'kept': len(desired & current[class_id]),
+        }
+        for class_id, desired in rosters.items()
+    }
+
+def sync_rosters(rosters, dry_run=False, batch_size=5000):
+    """Make each class's enrollments exactly the given student ids and return the diff.
+
+    Classes missing from `rosters` are left alone; an empty roster drops every
+    student. Everything is applied in one transaction.
+    """
+    rosters = {class_id: set(student_ids) for class_id, student_ids in rosters.items()}
+    using = router.db_for_write(StudentEnrollment)
+    with transaction.atomic(using=using):
+        changes = diff_rosters(rosters)
+        if dry_run:
+            return changes
+
+        # Anyone enrolled since the diff was read is skipped, not an IntegrityError
+        StudentEnrollment.objects.bulk_create(
+            [
+                StudentEnrollment(class_enrolled_id=class_id, student_id=student_id)
+                for class_id, change in changes.items()
+                for student_id in change['added']
+            ],
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+        for class_id, change in changes.items():
+            # One DELETE per class (per chunk of ids). Nothing cascades from enrollments,
+            # and the per-row delete signals are replaced by the invalidation below
+            for student_ids in _chunks(change['removed']):
+                StudentEnrollment.objects.filter(
+                    class_enrolled_id=class_id, student_id__in=student_ids
+                )._raw_delete(using)
+
+        # What the enrollment signals would have invalidated, once the sync commits
+        changed = [class_id for class_id, change in changes.items() if change['added'] or change['removed']]
+        namespaces = [class_namespace(class_id) for class_id in changed]
+        school_ids = set().union(*map(class_school_ids, _chunks(changed)))
+        transaction.on_commit(lambda: invalidate_rosters(namespaces, school_ids), using=using)
+    return changes
+
+def invalidate_rosters(namespaces, school_ids):
+    for namespace in namespaces:
+        bump_version(namespace)
+    bump_school_data(school_ids)
@@ -0,0 +1,166 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+
+# ==================== REQUEST STATE ====================
+
+# Session key holding the time until which this session reads from the primary
+PIN_SESSION_KEY = 'replica_pin_until'
+
+class RoutingState:
+    """Whether replica reads are allowed right now, and whether the request has written"""
+
+    def __init__(self, pinned=False):
+        self.replica_reads = False
+        self.pinned = pinned
+        self.wrote = False
+
+_state = ContextVar('accounts_routing_state', default=None)
+
+def replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+@contextmanager
+def use_replica():
+    """Send reads inside the block to the replica, unless this request or session is pinned"""
+    state = _state.get()
+    token = None
+    if state is None:
+        state = RoutingState()
+        token = _state.set(state)
+    previous = state.replica_reads
+    state.replica_reads = True
+    try:
+        yield
+    finally:
+        state.replica_reads = previous
+        if token is not None:
+            _state.reset(token)
+
+@contextmanager
+def primary_reads():
+    """Send reads inside the block to the primary, even within use_replica().
+
+    For data that gets cached: the replica may still be behind a write whose
+    commit just bumped the cache version, and must not fill the new key.
+    """
+    state = _state.get()
+    if state is None or not state.replica_reads:
+        yield
+        return
+    # A copy, so concurrent tasks sharing the request's state keep their replica reads
+    primary = RoutingState(pinned=state.pinned)
+    token = _state.set(primary)
+    try:
+        yield
+    finally:
+        _state.reset(token)
+        if primary.wrote:
+            state.pinned = state.wrote = True
+
+def replica_reads(view):
+    """Serve a read-only view's GET/HEAD queries from the replica"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            with use_replica():
+                return await view(request, *args, **kwargs)
+        return wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+# ==================== ROUTER ====================
+
+# Only application data goes to the replica. The database cache (which holds
+# the version counters) and sessions must be read fresh, and their writes
+# must not pin the session to the primary.
+ROUTED_APP_LABELS = {'accounts', 'auth'}
+
+class ReplicaRouter:
+    """Route reads inside use_replica() to settings.REPLICA_DATABASE, everything else to default.
+
+    Any write pins the rest of the request to the primary, and
+    replica_pinning_middleware extends that to the session for
+    REPLICA_PIN_SECONDS so users read their own writes despite replication lag.
+    Models outside ROUTED_APP_LABELS are left to the default routing.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = replica_alias()
+        if not replica or model._meta.app_label not in ROUTED_APP_LABELS:
+            return None
+        state = _state.get()
+        if state is not None and state.replica_reads and not state.pinned:
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APP_LABELS:
+            return None
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        # Explicit, so instances read from the replica are still saved to the primary
+        return DEFAULT_DB_ALIAS if replica_alias() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if replica_alias():
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        if db == replica_alias():
+            return False
+        return None
+
+# ==================== MIDDLEWARE ====================
+
+def _start(request):
+    pinned = False
+    if replica_alias() and hasattr(request, 'session'):
+        pinned = request.session.get(PIN_SESSION_KEY, 0) > time.time()
+    return _state.set(RoutingState(pinned=pinned))
+
+def _finish(request, token):
+    state = _state.get()
+    _state.reset(token)
+    if state.wrote and replica_alias() and hasattr(request, 'session'):
+        request.session[PIN_SESSION_KEY] = time.time() + getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+@sync_and_async_middleware
+def replica_pinning_middleware(get_response):
+    """Track writes per request and pin the session to the primary after one.
+
+    Goes after SessionMiddleware.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _start(request)
+            try:
+                return await get_response(request)
+            finally:
+                _finish(request, token)
+        return middleware
+
+    def middleware(request):
+        token = _start(request)
+        try:
+            return get_response(request)
+        finally:
+            _finish(request, token)
+    return middleware
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.http import Http404
+
+from .models import School
+from .sharding import use_shard, shard_for_school
+
+# ==================== PROCESS-LOCAL SCHOOL CACHE ====================
+
+# slug -> (School, expires_at). Cleared by the School signals in this process;
+# the timeout bounds how long other worker processes can serve a stale copy.
+_schools_by_slug = {}
+
+def get_school(slug):
+    """Return the School for a slug, or raise Http404"""
+    cached = _schools_by_slug.get(slug)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
+    school = School.objects.filter(slug=slug).first() if slug else None
+    if school is None:
+        raise Http404("No School matches the given query.")
+
+    timeout = getattr(settings, 'SCHOOL_CACHE_TIMEOUT', 300)
+    _schools_by_slug[slug] = (school, time.monotonic() + timeout)
+    return school
+
+def clear_school_cache(slug=None):
+    if slug is None:
+        _schools_by_slug.clear()
+    else:
+        _schools_by_slug.pop(slug, None)
+
+# ==================== DECORATORS ====================
+
+def resolve_school(school_slug_param='school_slug'):
+    """Decorator that attaches the School named in the URL to request.school
+    and routes the view's queries to the school's shard"""
+    def decorator(view_func):
+        def wrapper(request, *args, **kwargs):
+            request.school = get_school(kwargs.get(school_slug_param))
+            with use_shard(shard_for_school(request.school)):
+                return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.views import redirect_to_login
+from django.core import signing
+
+from .dashboard_cache import get_version
+
+# ==================== SESSION SNAPSHOTS ====================
+
+# At login the session gets a signed snapshot of the user's id, role and
+# school, and the role decorators (login_required below, require_role and
+# require_school_access in views.py) authorize from it, so a request with a
+# cached session runs no query to find out who is asking. The snapshot holds
+# the user's auth version, which signals.py bumps whenever the user is saved
+# (role, school, password or is_active changes) or deleted; a stale snapshot
+# is ignored, the User is loaded and checked by Django once, and the snapshot
+# is rewritten. The signature keeps it safe with signed-cookie sessions too.
+#
+# Version counters only reach every worker through a shared cache, and
+# QuerySet.update() sends no signals, so a snapshot is also only trusted for
+# AUTH_SNAPSHOT_TTL seconds. After that the same reload re-verifies is_active
+# and the session's password hash, as Django does on every request.
+
+AUTH_SNAPSHOT_SESSION_KEY = '_auth_snapshot'
+AUTH_SNAPSHOT_SALT = 'accounts.session_auth'
+
+class AuthSnapshot:
+    """The logged-in user, as far as authorization needs to know.
+
+    school_slug is as of login and only meant for building URLs; access checks use school_id.
+    """
+    __slots__ = ('pk', 'role', 'school_id', 'school_slug', 'db')
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, pk, role, school_id, school_slug, db):
+        self.pk = pk
+        self.role = role
+        self.school_id = school_id
+        self.school_slug = school_slug
+        self.db = db
+
+def auth_namespace(db, user_id):
+    # User ids are only unique within one database (see sharding.py)
+    return f'auth:{db}:{user_id}'
+
+def remember_auth(request, user):
+    """Store a snapshot of `user` in the session and return it"""
+    school = getattr(request, 'school', None)
+    if user.school_id and (school is None or school.pk != user.school_id):
+        # Login pages and school URLs have already looked the school up
+        school = user.school
+    snapshot = AuthSnapshot(
+        user.pk, user.role, user.school_id, school.slug if user.school_id else None, user._state.db
+    )
+    version = get_version(auth_namespace(snapshot.db, snapshot.pk))
+    request.session[AUTH_SNAPSHOT_SESSION_KEY] = signing.dumps(
+        [snapshot.pk, snapshot.role, snapshot.school_id, snapshot.school_slug, snapshot.db, version, time.time()],
+        salt=AUTH_SNAPSHOT_SALT,
+    )
+    return snapshot
+
+def load_auth(request):
+    """The session's snapshot, AnonymousUser, or None when there's no usable snapshot"""
+    session = getattr(request, 'session', None)
+    if session is None or SESSION_KEY not in session:
+        return AnonymousUser()
+    try:
+        pk, role, school_id, school_slug, db, version, verified_at = signing.loads(
+            session[AUTH_SNAPSHOT_SESSION_KEY], salt=AUTH_SNAPSHOT_SALT
+        )
+    except (KeyError, ValueError, signing.BadSignature):
+        return None
+    if str(pk) != str(session[SESSION_KEY]) or time.time() - verified_at > getattr(settings, 'AUTH_SNAPSHOT_TTL', 60):
+        return None
+    if get_version(auth_namespace(db, pk)) != version:
+        return None
+    return AuthSnapshot(pk, role, school_id, school_slug, db)
+
+def get_auth(request):
+    """Who is making the request: an AuthSnapshot or AnonymousUser, also set as request.auth"""
+    if not hasattr(request, 'auth'):
+        auth = load_auth(request)
+        if auth is None:
+            # No snapshot yet, or a stale one: load the user the usual way
+            user = request.user
+            auth = remember_auth(request, user) if user.is_authenticated else user
+        request.auth = auth
+    return request.auth
+
+async def aget_auth(request):
+    if hasattr(request, 'auth'):
+        return request.auth
+    # Sessions and the fallback may need the database
+    return await sync_to_async(get_auth)(request)
+
+# ==================== DECORATORS ====================
+
+def login_required(view_func):
+    """django.contrib.auth's login_required, checked against the snapshot (sync or async views)"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if not (await aget_auth(request)).is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not get_auth(request).is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return view_func(request, *args, **kwargs)
+    return wrapper
@@ -41,8 +41,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.instrumentation.request_metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'accounts.sharding.school_shard_middleware',
+    'accounts.routers.replica_pinning_middleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -54,7 +57,7 @@ ROOT_URLCONF = 'arday_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'accounts.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'accounts' / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,13 +76,159 @@ WSGI_APPLICATION = 'arday_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite performance mode. WAL lets dashboard reads run while a grade write
+# is in progress; synchronous=NORMAL is durable across application crashes
+# (only an OS crash or power loss can drop the last commits). Write
+# transactions start with BEGIN IMMEDIATE so two transactions can't both
+# read and then deadlock upgrading to a write lock; `timeout` is SQLite's
+# busy_timeout in seconds. Each worker thread keeps its connection open.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative = KiB, so 64 MiB per connection
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+    }
+}
+
+
+# Read replica (accounts/routers.py). Dashboard, roster and admin changelist
+# GETs read from REPLICA_DATABASE; writes go to default, and a session that
+# wrote reads from default for REPLICA_PIN_SECONDS afterwards. To try it
+# locally with two SQLite files, add
+#
+#   DATABASES['replica'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'db-replica.sqlite3',
+#                           'TEST': {'MIRROR': 'default'}}
+#   REPLICA_DATABASE = 'replica'
+#
+# and run `manage.py replicate_sqlite --interval 1` next to the server.
+REPLICA_DATABASE = None
+REPLICA_PIN_SECONDS = 5
+
+# Per-school sharding (accounts/sharding.py). SCHOOL_SHARDS maps school slugs
+# to database aliases; those schools' users, classes, grades and announcements
+# live in that database, and everything else stays on default, which also
+# holds every School row. Cross-school pages query each shard in parallel with
+# up to SHARD_FANOUT_WORKERS threads. Create each shard's schema with
+# `manage.py migrate --database=<alias>`, e.g.
+#
+#   DATABASES['shard1'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'db-shard1.sqlite3'}
+#   SCHOOL_SHARDS = {'arday-high-school': 'shard1'}
+#
+# Queries routed to a shard don't use the read replica above.
+SCHOOL_SHARDS = {}
+SHARD_FANOUT_WORKERS = 8
+
+DATABASE_ROUTERS = ['accounts.sharding.SchoolShardRouter', 'accounts.routers.ReplicaRouter']
+AUTHENTICATION_BACKENDS = ['accounts.sharding.ShardAwareModelBackend']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per-process; use FileBasedCache or DatabaseCache in production
+# so every worker sees the same version counters.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Sessions are read from the cache and written through to the database. The
+# role decorators authorize from a signed snapshot in the session (see
+# accounts/session_auth.py), so a request with a cached session runs no
+# queries to find out who is asking.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# Seconds a snapshot is trusted before the user is reloaded and is_active and
+# the password hash are checked again (changes made in another worker or with
+# QuerySet.update() are seen within this time)
+AUTH_SNAPSHOT_TTL = 60
+
+# Seconds the super admin KPI panel may be served from cache
+SUPER_ADMIN_KPI_CACHE_TIMEOUT = 60
+
+# Seconds a cached dashboard fragment (class performance, grades by class) may
+# be reused; writes bump per-school/per-class versions, so this only bounds memory
+DASHBOARD_FRAGMENT_CACHE_TIMEOUT = 300
+
+# Seconds each worker may reuse a School looked up by slug
+SCHOOL_CACHE_TIMEOUT = 300
+
+# Rows per page on the roster, class list and gradebook pages
+ROSTER_PAGE_SIZE = 50
+
+# Announcements kept per cached audience timeline, and how long they are cached
+ANNOUNCEMENT_TIMELINE_LENGTH = 20
+ANNOUNCEMENT_TIMELINE_TIMEOUT = 3600
+
+# Grade analytics (accounts/grade_analytics.py). Grades count as a percentage
+# of max_grade; a class score is the weighted mean of its category averages,
+# and the GPA is the mean of the class scores mapped through GPA_SCALE
+# (minimum percent, grade points). Installing NumPy speeds up bulk recomputes.
+GRADE_CATEGORY_WEIGHTS = {'assignment': 1, 'homework': 1, 'quiz': 1, 'project': 2, 'exam': 3}
+GPA_SCALE = [
+    (93, 4.0), (90, 3.7), (87, 3.3), (83, 3.0), (80, 2.7), (77, 2.3),
+    (73, 2.0), (70, 1.7), (67, 1.3), (63, 1.0), (60, 0.7), (0, 0.0),
+]
+
+# Serve the role dashboards with the ASGI-native views in async_views.py
+ASYNC_DASHBOARDS = False
+
+# Live announcements (accounts/live.py): a server-sent events stream per user
+# at /<school>/announcements/stream/, served under ASGI. LIVE_BACKEND carries
+# events between worker processes: LocalBackend is enough for one process,
+# SQLiteBackend shares them through LIVE_SQLITE_PATH between processes on one
+# machine. LIVE_KEEPALIVE is seconds between keepalive comments on an idle stream.
+LIVE_BACKEND = 'accounts.live.LocalBackend'
+LIVE_SQLITE_PATH = BASE_DIR / 'live-events.sqlite3'
+LIVE_KEEPALIVE = 15
+
+# Background jobs (accounts/jobs.py, tasks in accounts/tasks.py). Jobs are rows
+# in the default database, run by `manage.py run_workers --processes N`. A
+# failed job is retried after JOB_RETRY_DELAY seconds, doubling each attempt;
+# one left running for JOB_LOCK_TIMEOUT seconds (its worker died) is requeued.
+JOB_RETRY_DELAY = 30
+JOB_LOCK_TIMEOUT = 600
+JOB_POLL_INTERVAL = 1
+
+
+# Request metrics (accounts/instrumentation.py): samples kept per URL name for
+# the /super-admin/metrics/ histograms, which only super admins connecting
+# from INTERNAL_IPS can read
+METRICS_WINDOW = 1000
+INTERNAL_IPS = ['127.0.0.1']
+
+# Maximum SQL queries per request, by URL name. Overruns are logged as
+# warnings; QUERY_BUDGET_STRICT = True raises instead, which the dashboard
+# tests (DashboardTestCase in tests.py) turn on to enforce the budgets.
+QUERY_BUDGETS = {
+    'student_dashboard': 10,
+    'teacher_dashboard': 12,
+    'school_admin_dashboard': 12,
+    'super_admin_dashboard': 10,
+    'school_roster': 6,
+    'school_class_list': 6,
+    'class_gradebook': 6,
+    'api_student_dashboard': 10,
+    'api_teacher_dashboard': 10,
+    'api_school_admin_dashboard': 10,
+    'api_super_admin_dashboard': 10,
+}
+QUERY_BUDGET_STRICT = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -100,6 +249,29 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+# New passwords use scrypt with the cost below. Older PBKDF2 hashes still verify
+# and are rehashed transparently on the user's next login. Argon2
+# ('django.contrib.auth.hashers.Argon2PasswordHasher', needs argon2-cffi) can be
+# put first instead.
+
+PASSWORD_HASHERS = [
+    'accounts.hashers.TunedScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 14
+PASSWORD_SCRYPT_BLOCK_SIZE = 8
+PASSWORD_SCRYPT_PARALLELISM = 1
+
+# At most this many requests per worker hash passwords at once (default: CPU count);
+# logins wait up to LOGIN_HASHING_TIMEOUT seconds for a slot, then get a 503.
+LOGIN_HASHING_CONCURRENCY = None
+LOGIN_HASHING_TIMEOUT = 5
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -0,0 +1,171 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+# Optional per-school sharding. settings.SCHOOL_SHARDS maps school slugs to
+# database aliases; schools not listed stay on default. default is also the
+# directory: every School row, super admins, global announcements, sessions
+# and the other Django apps live there. Each shard holds a copy of its
+# schools' rows (kept in sync by signals.py) plus all of their users,
+# classes, enrollments, grades, statistics and announcements.
+#
+# Primary keys are only unique within one database, so anything keyed on ids
+# across shards (cache keys, merged results) must include the alias.
+
+# Session key recording which database the logged-in user lives in
+SHARD_SESSION_KEY = 'school_shard'
+
+# accounts models that only exist in the directory, whatever shard is current
+DIRECTORY_MODELS = {'job'}
+
+# ==================== SHARD MAP ====================
+
+def sharding_enabled():
+    return bool(getattr(settings, 'SCHOOL_SHARDS', None))
+
+def shard_for_school(school):
+    return getattr(settings, 'SCHOOL_SHARDS', {}).get(school.slug, DEFAULT_DB_ALIAS)
+
+def shard_aliases():
+    """Every database holding school data, directory first"""
+    shards = set(getattr(settings, 'SCHOOL_SHARDS', {}).values()) - {DEFAULT_DB_ALIAS}
+    return [DEFAULT_DB_ALIAS, *sorted(shards)]
+
+_shard = ContextVar('accounts_school_shard', default=None)
+_auth_shard = ContextVar('accounts_auth_shard', default=None)
+
+def current_shard():
+    return _shard.get() or DEFAULT_DB_ALIAS
+
+@contextmanager
+def use_shard(alias):
+    """Route accounts queries inside the block to `alias` (no-op for None)"""
+    if alias is None:
+        yield
+        return
+    token = _shard.set(alias)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+def shard_scoped(key):
+    """Prefix a cache key or namespace with the current shard when sharding is on"""
+    return f'{current_shard()}:{key}' if sharding_enabled() else key
+
+def on_shard(receiver):
+    """Run a model signal receiver in the shard the write went to"""
+    @wraps(receiver)
+    def wrapper(sender, *args, **kwargs):
+        with use_shard(kwargs.get('using') if sharding_enabled() else None):
+            return receiver(sender, *args, **kwargs)
+    return wrapper
+
+# ==================== FAN-OUT ====================
+
+def fan_out(func):
+    """Call func() once per shard, in parallel, and return the results in shard_aliases() order"""
+    aliases = shard_aliases()
+    workers = min(len(aliases), getattr(settings, 'SHARD_FANOUT_WORKERS', 8))
+    if workers <= 1:
+        return [_run_on_shard(func, alias) for alias in aliases]
+
+    def run_in_worker(alias):
+        try:
+            return _run_on_shard(func, alias)
+        finally:
+            # Worker threads open their own connections; don't leak them
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(copy_context().run, run_in_worker, alias) for alias in aliases]
+        return [future.result() for future in futures]
+
+def _run_on_shard(func, alias):
+    with use_shard(alias):
+        return func()
+
+# ==================== ROUTER ====================
+
+class SchoolShardRouter:
+    """Send accounts queries to the shard selected with use_shard().
+
+    Outside a shard block, objects stay on the database they were loaded from
+    (or, for new objects, the database of the objects they were given), and
+    everything else falls through to the next router.
+    """
+
+    def _route(self, model, hints):
+        if not sharding_enabled() or model._meta.app_label != 'accounts':
+            return None
+        if model._meta.model_name in DIRECTORY_MODELS:
+            return DEFAULT_DB_ALIAS
+        shard = _shard.get()
+        if shard is not None:
+            return shard
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not sharding_enabled():
+            return None
+        # Directory rows (e.g. the School from get_school()) may be related to shard rows
+        return obj1._state.db == obj2._state.db or DEFAULT_DB_ALIAS in (obj1._state.db, obj2._state.db)
+
+# ==================== AUTHENTICATION ====================
+
+class ShardAwareModelBackend(ModelBackend):
+    """ModelBackend that loads the session's user from the database they logged in to"""
+
+    def get_user(self, user_id):
+        alias = _auth_shard.get()
+        if alias is None:
+            return super().get_user(user_id)
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.db_manager(alias).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+def _start(request):
+    alias = None
+    if sharding_enabled() and hasattr(request, 'session'):
+        alias = request.session.get(SHARD_SESSION_KEY)
+    return _auth_shard.set(alias)
+
+@sync_and_async_middleware
+def school_shard_middleware(get_response):
+    """Remember which shard the session's user lives in. Goes after SessionMiddleware."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _start(request)
+            try:
+                return await get_response(request)
+            finally:
+                _auth_shard.reset(token)
+        return middleware
+
+    def middleware(request):
+        token = _start(request)
+        try:
+            return get_response(request)
+        finally:
+            _auth_shard.reset(token)
+    return middleware
@@ -0,0 +1,260 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import User, School, Class, StudentEnrollment, Grade, Announcement
+from . import announcements, grade_stats, live, session_auth
+from .dashboard_cache import (
+    bump_version, SUPER_ADMIN_KPIS, ANNOUNCEMENTS, school_namespace, class_namespace,
+    bump_school_data, class_school_ids,
+)
+from .schools import clear_school_cache
+from .sharding import SHARD_SESSION_KEY, on_shard, sharding_enabled, shard_for_school
+
+# ==================== GRADE STATISTICS ====================
+
+@receiver(pre_save, sender=Grade)
+@receiver(pre_delete, sender=Grade)
+@on_shard
+def load_previous_grade(sender, instance, raw=False, **kwargs):
+    """Fetch the stored values for grades that weren't (fully) loaded from the database"""
+    if raw or not instance.pk or hasattr(instance, '_loaded_values'):
+        return
+    instance._loaded_values = Grade.objects.filter(pk=instance.pk).values(
+        'student_id', 'class_enrolled_id', 'grade'
+    ).first()
+    # Fill in deferred fields too: after a delete they can't be loaded any more
+    deferred = instance.get_deferred_fields()
+    for attname, value in (instance._loaded_values or {}).items():
+        if attname in deferred:
+            setattr(instance, attname, value)
+
+@receiver(post_save, sender=Grade)
+@on_shard
+def grade_saved(sender, instance, created, raw, using, **kwargs):
+    if not raw:
+        previous = getattr(instance, '_loaded_values', None) or {}
+        grade_stats.record_grade_saved(instance, created)
+        invalidate_grade_fragments(instance, using, previous.get('class_enrolled_id'))
+
+@receiver(post_delete, sender=Grade)
+@on_shard
+def grade_deleted(sender, instance, using, **kwargs):
+    grade_stats.record_grade_deleted(instance)
+    invalidate_grade_fragments(instance, using)
+
+# ==================== SUPER ADMIN KPI CACHE ====================
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=School)
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=School)
+@receiver(post_delete, sender=Class)
+def invalidate_super_admin_kpis(sender, using, update_fields=None, **kwargs):
+    # Logins only touch last_login (and password when rehashing), which no KPI depends on
+    if update_fields is not None and set(update_fields) <= {'last_login', 'password'}:
+        return
+    # After commit, or a concurrent request could cache pre-commit KPIs under the new version
+    transaction.on_commit(lambda: bump_version(SUPER_ADMIN_KPIS), using=using)
+
+# ==================== SCHOOL SLUG CACHE ====================
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def invalidate_school_cache(sender, **kwargs):
+    # Clear every slug, since a rename leaves the old slug pointing at this school
+    clear_school_cache()
+
+# ==================== ANNOUNCEMENT TIMELINES ====================
+
+@receiver(pre_save, sender=Announcement)
+@on_shard
+def load_previous_announcement_targets(sender, instance, raw, **kwargs):
+    instance._previous_targets = None
+    if not raw and instance.pk:
+        instance._previous_targets = Announcement.objects.filter(pk=instance.pk).values_list(
+            'school_id', 'class_target_id'
+        ).first()
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+@on_shard
+def invalidate_announcement_timelines(sender, instance, using, **kwargs):
+    targets = [(instance.school_id, instance.class_target_id)]
+    previous = getattr(instance, '_previous_targets', None)
+    if previous:
+        targets.append(tuple(previous))
+
+    def invalidate():
+        for school_id, class_id in targets:
+            announcements.invalidate_timelines(school_id, class_id)
+
+    # After commit, or a concurrent cache miss could reload and keep the old timeline
+    transaction.on_commit(invalidate, using=using)
+
+@receiver(post_save, sender=Announcement)
+@on_shard
+def publish_new_announcement(sender, instance, created, raw, using, **kwargs):
+    """Push new announcements to open live streams once they're committed"""
+    if not created or raw:
+        return
+    channels = [live.channel(audience) for audience in announcements.audiences_for(
+        instance.school_id, instance.class_target_id
+    )]
+    frame = live.announcement_event(instance)
+    transaction.on_commit(lambda: live.publish(channels, frame), using=using, robust=True)
+
+# ==================== DASHBOARD FRAGMENTS ====================
+
+def bump_fragment_versions(namespaces, using):
+    """Bump the fragment versions once the write commits"""
+    namespaces = set(namespaces)
+
+    def bump():
+        for namespace in namespaces:
+            bump_version(namespace)
+
+    # Bumping earlier would let a request cache pre-commit data under the new version
+    transaction.on_commit(bump, using=using)
+
+def invalidate_grade_fragments(grade, using, previous_class_id=None):
+    # Called from the Grade receivers above, after statistics are updated
+    namespaces = [class_namespace(grade.class_enrolled_id)]
+    if previous_class_id and previous_class_id != grade.class_enrolled_id:
+        namespaces.append(class_namespace(previous_class_id))
+    bump_fragment_versions(namespaces, using)
+
+@receiver(post_save, sender=StudentEnrollment)
+@receiver(post_delete, sender=StudentEnrollment)
+@on_shard
+def invalidate_enrollment_fragments(sender, instance, using, **kwargs):
+    bump_fragment_versions([class_namespace(instance.class_enrolled_id)], using)
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+@on_shard
+def invalidate_class_fragments(sender, instance, using, **kwargs):
+    bump_fragment_versions([class_namespace(instance.pk)], using)
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+@on_shard
+def invalidate_announcement_fragments(sender, instance, using, **kwargs):
+    targets = {(instance.school_id, instance.class_target_id)}
+    previous = getattr(instance, '_previous_targets', None)
+    if previous:
+        targets.add(tuple(previous))
+    namespaces = [ANNOUNCEMENTS]
+    for school_id, class_id in targets:
+        if school_id:
+            namespaces.append(school_namespace(school_id))
+        if class_id:
+            namespaces.append(class_namespace(class_id))
+    bump_fragment_versions(namespaces, using)
+
+# ==================== SCHOOL DATA STAMPS ====================
+
+def touch_school_data(school_ids, using):
+    """Bump the schools' data stamps once the write commits (see api.py)"""
+    school_ids = {school_id for school_id in school_ids if school_id}
+    if school_ids:
+        # Bumping earlier would let a request pair the new stamp with the old data
+        transaction.on_commit(lambda: bump_school_data(school_ids), using=using)
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Class)
+@on_shard
+def load_previous_school(sender, instance, raw, update_fields=None, **kwargs):
+    """Remember the stored school, so moving a user or class changes both schools' stamps"""
+    instance._previous_school_id = None
+    if raw or not instance.pk or (update_fields is not None and 'school' not in update_fields):
+        return
+    instance._previous_school_id = sender.objects.filter(pk=instance.pk).values_list('school_id', flat=True).first()
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Class)
+def touch_member_school_data(sender, instance, using, update_fields=None, **kwargs):
+    # Logins only touch last_login (and password when rehashing), which no dashboard shows
+    if update_fields is not None and set(update_fields) <= {'last_login', 'password'}:
+        return
+    touch_school_data([instance.school_id, getattr(instance, '_previous_school_id', None)], using)
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def touch_school(sender, instance, using, **kwargs):
+    touch_school_data([instance.pk], using)
+
+@receiver(post_save, sender=Grade)
+@receiver(post_save, sender=StudentEnrollment)
+@receiver(post_delete, sender=Grade)
+@receiver(post_delete, sender=StudentEnrollment)
+@on_shard
+def touch_class_school_data(sender, instance, using, **kwargs):
+    class_ids = {instance.class_enrolled_id}
+    # Grades moved to another class change both
+    previous = getattr(instance, '_loaded_values', None) or {}
+    if previous.get('class_enrolled_id'):
+        class_ids.add(previous['class_enrolled_id'])
+    touch_school_data(class_school_ids(class_ids), using)
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+@on_shard
+def touch_announcement_school_data(sender, instance, using, **kwargs):
+    targets = {(instance.school_id, instance.class_target_id)}
+    previous = getattr(instance, '_previous_targets', None)
+    if previous:
+        targets.add(tuple(previous))
+    school_ids = {school_id for school_id, _ in targets}
+    class_ids = {class_id for _, class_id in targets if class_id}
+    if class_ids:
+        school_ids |= class_school_ids(class_ids)
+    touch_school_data(school_ids, using)
+
+# ==================== SESSION AUTH SNAPSHOTS ====================
+
+@receiver(user_logged_in)
+def remember_auth_snapshot(sender, request, user, **kwargs):
+    if hasattr(request, 'session'):
+        session_auth.remember_auth(request, user)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_snapshots(sender, instance, using, update_fields=None, **kwargs):
+    """Make every session's snapshot of the user stale (see session_auth.py)"""
+    # Logins only touch last_login; a password rehash still counts, the hash changed
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_version(session_auth.auth_namespace(using, instance.pk))
+
+# ==================== SCHOOL SHARDS ====================
+
+@receiver(user_logged_in)
+def remember_user_shard(sender, request, user, **kwargs):
+    # ShardAwareModelBackend reloads the user from this database on later requests
+    if sharding_enabled() and hasattr(request, 'session'):
+        request.session[SHARD_SESSION_KEY] = user._state.db
+
+@receiver(post_save, sender=School)
+def copy_school_to_shard(sender, instance, raw, using, **kwargs):
+    """Keep the shard's copy of a school in step with the directory row"""
+    if raw or using != DEFAULT_DB_ALIAS or not sharding_enabled():
+        return
+    alias = shard_for_school(instance)
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    values = {f.attname: getattr(instance, f.attname) for f in School._meta.concrete_fields}
+    # raw: store the values as they are (created_at included) and skip the receivers above
+    School(**values).save_base(using=alias, raw=True)
+
+@receiver(post_delete, sender=School)
+def delete_school_from_shard(sender, instance, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding_enabled():
+        return
+    alias = shard_for_school(instance)
+    if alias != DEFAULT_DB_ALIAS:
+        School.objects.using(alias).filter(pk=instance.pk).delete()
@@ -0,0 +1,45 @@
+from .dashboard_cache import bump_version, bump_school_data, class_namespace, class_school_ids, store_student_reports
+from .grade_analytics import iter_school_reports
+from .grade_stats import rebuild_grade_statistics
+from .jobs import task
+from .models import School
+from .sharding import shard_for_school, shard_scoped, use_shard
+
+# ==================== BACKGROUND TASKS ====================
+
+# Run by `manage.py run_workers`; queue them with the schedule_* helpers below
+# rather than doing the work inside a request.
+
+@task(name='recompute_school_reports')
+def recompute_school_reports(school_id):
+    """Recompute and cache every student's grade report in a school"""
+    school = School.objects.filter(pk=school_id).first()
+    if school is None:
+        return
+    for reports in iter_school_reports(school):
+        store_student_reports(reports)
+
+@task(name='rebuild_class_statistics', batch_size=200)
+def rebuild_class_statistics(payloads):
+    """Rebuild GradeStatistics for a batch of classes in one pass"""
+    class_ids = sorted({payload['class_id'] for payload in payloads})
+    rebuild_grade_statistics(class_ids=class_ids)
+    for class_id in class_ids:
+        bump_version(class_namespace(class_id))
+    bump_school_data(class_school_ids(class_ids))
+
+# ==================== SCHEDULING ====================
+
+def schedule_school_reports(school):
+    # Several requests for the same school collapse into one job
+    with use_shard(shard_for_school(school)):
+        return recompute_school_reports.enqueue(
+            {'school_id': school.pk}, dedupe_key=f'recompute_school_reports:{school.pk}'
+        )
+
+def schedule_class_statistics(class_obj):
+    # Class ids repeat across shards, so the key includes the shard
+    with use_shard(class_obj._state.db):
+        return rebuild_class_statistics.enqueue(
+            {'class_id': class_obj.pk}, dedupe_key=shard_scoped(f'rebuild_class_statistics:{class_obj.pk}')
+        )
@@ -1,3 +1,1615 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from contextlib import closing
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from types import ModuleType
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.cache.backends.db import DatabaseCache
+from django.core.paginator import EmptyPage
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import OperationalError, connection
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .models import User, School, Class, StudentEnrollment, Grade, Announcement, GradeStatistics, Job
+from . import announcements, api, async_views, grade_analytics, instrumentation, jobs, live
+from .dashboard_cache import cached_fragment
+from .grade_stats import find_drift, rebuild_grade_statistics
+from .hashers import HashingBusy
+from .instrumentation import QueryBudgetExceeded
+from .management.commands import import_grades
+from .pagination import EstimatedCountPaginator
+from .replication import copy_sqlite_database
+from .rosters import sync_rosters
+from .routers import ReplicaRouter, PIN_SESSION_KEY, primary_reads, use_replica
+from .schools import get_school, clear_school_cache
+from .session_auth import AUTH_SNAPSHOT_SALT, AUTH_SNAPSHOT_SESSION_KEY, get_auth
+from .sharding import SchoolShardRouter, SHARD_SESSION_KEY, use_shard
+from .tasks import schedule_class_statistics
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class DashboardTestCase(TestCase):
+    """Shared fixtures for the role dashboards"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = School.objects.create(
+            name='Arday High School', address='1 Main St', phone='123', email='info@arday.test'
+        )
+        cls.teacher = User.objects.create_user(
+            username='teacher', password='pass', role='teacher', school=cls.school
+        )
+        cls.student = User.objects.create_user(
+            username='student', password='pass', role='student', school=cls.school
+        )
+
+    def setUp(self):
+        # Cached dashboards and timelines must not leak between tests
+        cache.clear()
+
+    def add_class(self, name, grades=(70, 80)):
+        """Create a class taught by self.teacher with self.student enrolled and graded"""
+        class_obj = Class.objects.create(
+            name=name, school=self.school, teacher=self.teacher, subject='Maths'
+        )
+        StudentEnrollment.objects.create(student=self.student, class_enrolled=class_obj)
+        for i, grade in enumerate(grades):
+            Grade.objects.create(
+                student=self.student, class_enrolled=class_obj,
+                assignment_name=f'Assignment {i}', grade=grade,
+            )
+        Announcement.objects.create(
+            title=f'{name} news', content='...', class_target=class_obj, created_by=self.teacher
+        )
+        return class_obj
+
+    def make_tmp_dir(self):
+        """A temporary directory, removed after the test"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return Path(tmp.name)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+
+class TeacherDashboardTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.teacher)
+        self.url = reverse('teacher_dashboard', kwargs={'school_slug': self.school.slug})
+
+    def test_class_performance(self):
+        self.add_class('Class A', grades=(60, 90))
+        self.add_class('Class B', grades=())
+
+        response = self.client.get(self.url)
+
+        performance = {row['class'].name: row for row in response.context['class_performance']}
+        self.assertEqual(performance['Class A']['avg_grade'], 75)
+        self.assertEqual(performance['Class A']['student_count'], 1)
+        self.assertEqual(performance['Class B']['avg_grade'], 0)
+        self.assertEqual(performance['Class B']['student_count'], 1)
+
+    def test_query_count_independent_of_class_count(self):
+        self.add_class('Class 0')
+        baseline = self.count_queries(self.url)
+
+        for i in range(1, 10):
+            self.add_class(f'Class {i}')
+
+        cache.clear()
+        # The cached session went too; log in again so only the dashboard is cold
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.count_queries(self.url), baseline)
+
+
+class StudentDashboardTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+        self.url = reverse('student_dashboard', kwargs={'school_slug': self.school.slug})
+
+    def test_grade_rollup(self):
+        class_a = self.add_class('Class A', grades=(60, 90))
+        class_b = self.add_class('Class B', grades=(50,))
+        self.add_class('Class C', grades=())
+
+        response = self.client.get(self.url)
+
+        # Class A: 75% (2.0 points), Class B: 50% (0.0)
+        self.assertEqual(response.context['gpa'], 1.0)
+        self.assertEqual(response.context['average_percent'], 62.5)
+        self.assertEqual(response.context['total_classes'], 3)
+        self.assertEqual(len(response.context['recent_grades']), 3)
+        grades_by_class = response.context['grades_by_class']
+        self.assertEqual(set(grades_by_class), {class_a, class_b})
+        self.assertEqual(grades_by_class[class_a]['average'], 75)
+        self.assertEqual(grades_by_class[class_b]['average'], 50)
+
+    def test_grades_by_class_keeps_five_most_recent(self):
+        class_obj = self.add_class('Class A', grades=range(50, 58))
+
+        response = self.client.get(self.url)
+
+        grades = response.context['grades_by_class'][class_obj]['grades']
+        self.assertEqual([g.assignment_name for g in grades], [f'Assignment {i}' for i in range(7, 2, -1)])
+
+    def test_query_count_independent_of_enrollment_count(self):
+        self.add_class('Class 0')
+        baseline = self.count_queries(self.url)
+
+        for i in range(1, 10):
+            self.add_class(f'Class {i}')
+
+        cache.clear()
+        # The cached session went too; log in again so only the dashboard is cold
+        self.client.force_login(self.student)
+        self.assertEqual(self.count_queries(self.url), baseline)
+
+
+class GradeAnalyticsTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=())
+        self.url = reverse('student_dashboard', kwargs={'school_slug': self.school.slug})
+
+    def grade(self, mark, max_grade=100, category='assignment', class_obj=None):
+        return Grade.objects.create(
+            student=self.student, class_enrolled=class_obj or self.class_obj,
+            assignment_name=f'{category} {mark}/{max_grade}', category=category, grade=mark, max_grade=max_grade,
+        )
+
+    def report(self):
+        return grade_analytics.student_report(self.student.pk)
+
+    def test_grades_are_normalized_by_max_grade(self):
+        self.grade(45, max_grade=50)
+        self.grade(45, max_grade=100)
+
+        self.assertEqual(self.report()['classes'][self.class_obj.pk]['percent'], 67.5)
+
+    @override_settings(GRADE_CATEGORY_WEIGHTS={'homework': 1, 'exam': 3})
+    def test_category_weights(self):
+        self.grade(100, category='homework')
+        self.grade(80, category='homework')
+        self.grade(50, category='exam')
+
+        report = self.report()
+
+        self.assertEqual(report['classes'][self.class_obj.pk]['categories'], {'homework': 90, 'exam': 50})
+        self.assertEqual(report['percent'], 60)
+        self.assertEqual(report['gpa'], 0.7)
+
+    @skipUnless(grade_analytics.np, 'NumPy is not installed')
+    def test_numpy_matches_pure_python(self):
+        other = self.add_class('Class B', grades=(55, 92))
+        for mark, max_grade, category in ((45, 50, 'quiz'), (30, 40, 'exam'), (88, 100, 'homework')):
+            self.grade(mark, max_grade, category)
+            self.grade(mark - 10, max_grade, category, class_obj=other)
+        rows = grade_analytics.grade_rows(Grade.objects.all())
+
+        self.assertEqual(
+            grade_analytics._compute_reports_numpy(rows), grade_analytics._compute_reports_python(rows)
+        )
+
+    def test_dashboard_report_is_cached_until_grades_change(self):
+        self.grade(95)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(self.url).context['gpa'], 4.0)
+
+        with mock.patch.object(grade_analytics, 'student_report', wraps=grade_analytics.student_report) as compute:
+            self.client.get(self.url)
+            compute.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.grade(65)
+            self.assertEqual(self.client.get(self.url).context['gpa'], 2.7)
+            compute.assert_called_once()
+
+    def test_recompute_command_fills_the_cache(self):
+        self.grade(80)
+        call_command('recompute_grade_reports', school=self.school.slug, stdout=StringIO())
+        self.client.force_login(self.student)
+
+        with mock.patch.object(grade_analytics, 'student_report') as compute:
+            response = self.client.get(self.url)
+
+        compute.assert_not_called()
+        self.assertEqual(response.context['gpa'], 2.7)
+
+
+class GradeStatisticsTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=(60, 90))
+
+    def stats(self, student=None):
+        return GradeStatistics.objects.get(student=student, class_enrolled=self.class_obj)
+
+    def test_grade_create_updates_statistics(self):
+        stats = self.stats(self.student)
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.total, 150)
+        self.assertEqual(stats.total_squares, 60 ** 2 + 90 ** 2)
+        self.assertEqual((stats.min_grade, stats.max_grade), (60, 90))
+        self.assertEqual(stats.average, 75)
+        self.assertEqual(stats.variance, 225)
+        self.assertEqual(self.stats().count, 2)
+
+    def test_grade_update_and_delete_update_statistics(self):
+        grade = Grade.objects.get(grade=90)
+        grade.grade = 80
+        grade.save()
+        self.assertEqual(self.stats().total, 140)
+        self.assertEqual(self.stats().max_grade, 80)
+
+        Grade.objects.get(grade=60).delete()
+        stats = self.stats(self.student)
+        self.assertEqual((stats.count, stats.total, stats.min_grade), (1, 80, 80))
+
+        Grade.objects.get(grade=80).delete()
+        self.assertFalse(GradeStatistics.objects.exists())
+        self.assertEqual(find_drift(), {})
+
+    def test_deferred_grades_update_statistics(self):
+        grade = Grade.objects.only('grade').get(grade=90)
+        grade.grade = 80
+        grade.save()
+        self.assertEqual(self.stats().total, 140)
+
+        Grade.objects.only('assignment_name').get(grade=60).delete()
+        self.assertEqual((self.stats().count, self.stats().total), (1, 80))
+        self.assertEqual(find_drift(), {})
+
+    def test_class_delete_cascades(self):
+        self.class_obj.delete()
+        self.assertFalse(GradeStatistics.objects.exists())
+
+    def test_rebuild_command_fixes_drift(self):
+        Grade.objects.filter(grade=60).update(grade=70)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_grade_stats', '--check', stdout=StringIO())
+
+        call_command('rebuild_grade_stats', stdout=StringIO())
+
+        self.assertEqual(self.stats().total, 160)
+        call_command('rebuild_grade_stats', '--check', stdout=StringIO())
+
+
+class SuperAdminDashboardTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='superadmin')
+        self.client.force_login(self.admin)
+        self.url = reverse('super_admin_dashboard')
+
+    def test_kpis(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.context['total_schools'], 1)
+        self.assertEqual(response.context['total_teachers'], 1)
+        self.assertEqual(response.context['total_students'], 1)
+        self.assertEqual(response.context['super_admin_count'], 1)
+        self.assertEqual(response.context['school_admin_count'], 0)
+        self.assertEqual(response.context['schools_with_most_students'][0].student_count, 1)
+
+    def test_kpis_are_cached_until_data_changes(self):
+        first = self.count_queries(self.url)
+        self.assertLess(self.count_queries(self.url), first)
+
+        # The version is bumped once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='student2', password='pass', role='student', school=self.school)
+            self.assertEqual(self.client.get(self.url).context['total_students'], 1)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['total_students'], 2)
+
+    def test_login_does_not_invalidate_kpis(self):
+        self.client.get(self.url)
+        cached = self.count_queries(self.url)
+
+        self.client.login(username='student', password='pass')
+        self.client.force_login(self.admin)
+
+        self.assertEqual(self.count_queries(self.url), cached)
+
+
+class SchoolResolutionTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        clear_school_cache()
+
+    def test_school_is_looked_up_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_school(self.school.slug), self.school)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_school(self.school.slug), self.school)
+
+    def test_school_save_invalidates_cache(self):
+        get_school(self.school.slug)
+        self.school.name = 'Arday Academy'
+        self.school.save()
+
+        self.assertEqual(get_school(self.school.slug).name, 'Arday Academy')
+
+    def test_unknown_slug(self):
+        with self.assertRaises(Http404):
+            get_school('no-such-school')
+        self.assertEqual(self.client.get('/no-such-school/').status_code, 404)
+
+    def test_dashboard_resolves_school_without_queries(self):
+        self.client.force_login(self.student)
+        url = reverse('student_dashboard', kwargs={'school_slug': self.school.slug})
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+
+        self.assertEqual(response.wsgi_request.school, self.school)
+        self.assertFalse([q for q in ctx.captured_queries if 'accounts_school' in q['sql']])
+
+    def test_login_checks_school(self):
+        other = School.objects.create(name='Other', address='-', phone='-', email='o@x.test')
+        response = self.client.post(
+            reverse('student_login', kwargs={'school_slug': other.slug}),
+            {'username': 'student', 'password': 'pass'},
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(
+            reverse('student_login', kwargs={'school_slug': self.school.slug}),
+            {'username': 'student', 'password': 'pass'},
+        )
+        self.assertRedirects(
+            response, reverse('student_dashboard', kwargs={'school_slug': self.school.slug}),
+            fetch_redirect_response=False,
+        )
+
+
+class ImportGradesTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=())
+        self.tmp = self.make_tmp_dir()
+
+    def test_import_csv(self):
+        path = self.tmp / 'grades.csv'
+        with path.open('w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['student', 'class', 'assignment', 'grade', 'max_grade'])
+            writer.writerow(['student', 'Class A', 'Quiz 1', '40', '50'])
+            writer.writerow(['student', 'Class A', 'Quiz 2', '80', ''])
+            writer.writerow(['nobody', 'Class A', 'Quiz 3', '80', ''])
+            writer.writerow(['student', 'Class Z', 'Quiz 4', '80', ''])
+            writer.writerow(['student', 'Class A', 'Quiz 5', 'abc', ''])
+
+        out = StringIO()
+        call_command('import_grades', str(path), '--batch-size', '1', stdout=out)
+
+        self.assertIn('Imported 2 grades', out.getvalue())
+        self.assertEqual(Grade.objects.get(assignment_name='Quiz 1').max_grade, 50)
+        with open(f'{path}.rejects.csv', newline='') as f:
+            rejects = list(csv.DictReader(f))
+        self.assertEqual([r['line'] for r in rejects], ['4', '5', '6'])
+        stats = GradeStatistics.objects.get(student__isnull=True, class_enrolled=self.class_obj)
+        self.assertEqual((stats.count, stats.total), (2, 120))
+        self.assertEqual(find_drift(), {})
+
+    def test_failed_import_refreshes_committed_batches(self):
+        path = self.tmp / 'grades.csv'
+        path.write_text('student,class,assignment,grade\nstudent,Class A,Quiz 1,40\nstudent,Class A,Quiz 2,80\n')
+        save_batch = import_grades.Command.save_batch
+
+        def fail_second_batch(command, batch, class_ids):
+            if class_ids:
+                raise sqlite3.OperationalError('database is locked')
+            return save_batch(command, batch, class_ids)
+
+        with mock.patch.object(import_grades.Command, 'save_batch', fail_second_batch):
+            with self.assertRaises(sqlite3.OperationalError):
+                call_command('import_grades', str(path), '--batch-size', '1', stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(GradeStatistics.objects.get(student__isnull=True, class_enrolled=self.class_obj).count, 1)
+        self.assertEqual(find_drift(), {})
+
+    def test_import_jsonl(self):
+        path = self.tmp / 'grades.jsonl'
+        path.write_text('\n'.join([
+            json.dumps({'student': 'student', 'class': 'Class A', 'assignment': 'Test', 'grade': 72.5}),
+            'not json',
+        ]))
+
+        call_command('import_grades', str(path), '--school', self.school.slug, stdout=StringIO())
+
+        self.assertEqual(Grade.objects.get().grade, Decimal('72.5'))
+
+
+class RosterSyncTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=())
+        self.others = [
+            User.objects.create_user(username=f'pupil{i}', password='pass', role='student', school=self.school)
+            for i in range(3)
+        ]
+
+    def enrolled(self, class_obj=None):
+        return set(StudentEnrollment.objects.filter(
+            class_enrolled=class_obj or self.class_obj
+        ).values_list('student__username', flat=True))
+
+    def test_sync_adds_and_drops(self):
+        other_class = self.add_class('Class B', grades=())
+
+        changes = sync_rosters({self.class_obj.pk: [self.others[0].pk, self.others[1].pk]})
+
+        self.assertEqual(changes[self.class_obj.pk], {
+            'added': {self.others[0].pk, self.others[1].pk}, 'removed': {self.student.pk}, 'kept': 0,
+        })
+        self.assertEqual(self.enrolled(), {'pupil0', 'pupil1'})
+        self.assertEqual(self.enrolled(other_class), {'student'})
+        # Syncing the same roster again changes nothing
+        changes = sync_rosters({self.class_obj.pk: [self.others[0].pk, self.others[1].pk]})
+        self.assertEqual(changes[self.class_obj.pk], {'added': set(), 'removed': set(), 'kept': 2})
+
+    def test_queries_do_not_grow_with_roster_size(self):
+        with CaptureQueriesContext(connection) as small:
+            sync_rosters({self.class_obj.pk: []})
+
+        students = self.others + User.objects.bulk_create([
+            User(username=f'extra{i}', role='student', school=self.school) for i in range(100)
+        ])
+        StudentEnrollment.objects.bulk_create(
+            [StudentEnrollment(class_enrolled=self.class_obj, student=student) for student in students]
+        )
+        with CaptureQueriesContext(connection) as large:
+            changes = sync_rosters({self.class_obj.pk: []})
+
+        self.assertEqual(len(changes[self.class_obj.pk]['removed']), 103)
+        self.assertFalse(self.enrolled())
+        self.assertEqual(len(large), len(small))
+
+    def test_dry_run_changes_nothing(self):
+        changes = sync_rosters({self.class_obj.pk: []}, dry_run=True)
+
+        self.assertEqual(changes[self.class_obj.pk]['removed'], {self.student.pk})
+        self.assertEqual(self.enrolled(), {'student'})
+
+    def test_cached_dashboards_see_the_new_roster(self):
+        self.client.force_login(self.teacher)
+        url = reverse('teacher_dashboard', kwargs={'school_slug': self.school.slug})
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_rosters({self.class_obj.pk: [other.pk for other in self.others]})
+
+        self.assertEqual(self.client.get(url).context['class_performance'][0]['student_count'], 3)
+
+    def test_command(self):
+        other_school = School.objects.create(name='Other', address='2 Main St', phone='456', email='o@o.test')
+        User.objects.create_user(username='outsider', password='pass', role='student', school=other_school)
+        empty_class = self.add_class('Class B', grades=())
+        path = self.make_tmp_dir() / 'rosters.csv'
+        with path.open('w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['class', 'student'])
+            writer.writerow(['Class A', 'pupil0'])
+            writer.writerow(['Class A', 'pupil1'])
+            writer.writerow(['Class A', 'nobody'])
+            writer.writerow(['Class A', 'outsider'])
+            writer.writerow(['Class B', ''])
+
+        out, err = StringIO(), StringIO()
+        call_command('sync_rosters', str(path), stdout=out, stderr=err)
+
+        # Class A had rejected rows, so it's left alone
+        self.assertIn('Skipped 1 classes with rejected rows (Class A)', err.getvalue())
+        self.assertIn('Synced 1 classes', out.getvalue())
+        self.assertIn('0 enrollments added, 1 removed, 0 unchanged; 2 rows rejected', out.getvalue())
+        self.assertEqual(self.enrolled(), {'student'})
+        self.assertEqual(self.enrolled(empty_class), set())
+        with open(f'{path}.rejects.csv', newline='') as f:
+            self.assertEqual([r['line'] for r in csv.DictReader(f)], ['4', '5'])
+
+        out = StringIO()
+        call_command('sync_rosters', str(path), '--force', stdout=out)
+        self.assertIn('2 enrollments added, 1 removed, 0 unchanged; 2 rows rejected', out.getvalue())
+        self.assertEqual(self.enrolled(), {'pupil0', 'pupil1'})
+
+
+class SeedDistrictTests(TestCase):
+
+    def test_seed_district(self):
+        cache.clear()
+        self.assertEqual(announcements.get_feed([announcements.ALL], 5), [])
+        out = StringIO()
+        call_command(
+            'seed_district', schools=2, students=30, students_per_teacher=10,
+            classes_per_teacher=2, classes_per_student=2, assignments=3, announcements=4,
+            batch_size=7, stdout=out,
+        )
+
+        self.assertEqual(School.objects.count(), 2)
+        self.assertTrue(User.objects.filter(role='superadmin').exists())
+        self.assertEqual(User.objects.filter(role='schooladmin').count(), 2)
+        enrollments = StudentEnrollment.objects.count()
+        self.assertEqual(enrollments, User.objects.filter(role='student').count() * 2)
+        self.assertLessEqual(Grade.objects.count(), enrollments * 3)
+        self.assertEqual(Announcement.objects.count(), 8)
+        self.assertEqual(find_drift(), {})
+        # Timestamps are spread over the term rather than all set to now
+        self.assertGreater(Grade.objects.dates('created_at', 'day').count(), 1)
+        self.assertGreater(Announcement.objects.dates('created_at', 'day').count(), 1)
+        self.assertTrue(Announcement._meta.get_field('created_at').auto_now_add)
+        # The cached feed from before seeding was dropped
+        self.assertEqual(len(announcements.get_feed([announcements.ALL], 5)), 5)
+        self.assertIn('Seeded 2 schools', out.getvalue())
+
+
+class SQLiteTuningTests(TestCase):
+
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            def pragma(name):
+                cursor.execute(f'PRAGMA {name}')
+                return cursor.fetchone()[0]
+
+            self.assertEqual(pragma('synchronous'), 1)  # NORMAL
+            self.assertEqual(pragma('busy_timeout'), 5000)
+            self.assertEqual(pragma('cache_size'), -64 * 1024)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+class GradebookExportTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=(60, 90))
+        self.school_admin = User.objects.create_user(
+            username='schooladmin', password='pass', role='schooladmin', school=self.school
+        )
+
+    def read_csv(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.DictReader(StringIO(content)))
+
+    def test_school_export(self):
+        self.client.force_login(self.school_admin)
+        response = self.client.get(reverse('school_gradebook_export', kwargs={'school_slug': self.school.slug}))
+
+        rows = self.read_csv(response)
+        self.assertEqual([(r['student'], r['class'], r['grade']) for r in rows],
+                         [('student', 'Class A', '60.00'), ('student', 'Class A', '90.00')])
+
+    def test_class_export_requires_own_class(self):
+        url = reverse('class_gradebook_export', kwargs={
+            'school_slug': self.school.slug, 'class_id': self.class_obj.pk
+        })
+        self.client.force_login(self.teacher)
+        self.assertEqual(len(self.read_csv(self.client.get(url))), 2)
+
+        other_teacher = User.objects.create_user(
+            username='teacher2', password='pass', role='teacher', school=self.school
+        )
+        self.client.force_login(other_teacher)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(ROSTER_PAGE_SIZE=3)
+class KeysetPaginationTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.school_admin = User.objects.create_user(
+            username='schooladmin', password='pass', role='schooladmin', school=self.school
+        )
+        self.client.force_login(self.school_admin)
+
+    def walk(self, url, **params):
+        """Follow next cursors to the end, returning every page's items"""
+        pages = []
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page']
+            pages.append(list(page))
+            if not page.has_next:
+                return pages
+            params['cursor'] = page.next_cursor
+
+    def test_roster_pages_by_username(self):
+        User.objects.bulk_create([
+            User(username=f'pupil{i:02}', role='student', school=self.school) for i in range(7)
+        ])
+        pages = self.walk(reverse('school_roster', kwargs={'school_slug': self.school.slug}), role='student')
+
+        self.assertEqual([len(p) for p in pages], [3, 3, 2])
+        usernames = [u.username for page in pages for u in page]
+        self.assertEqual(usernames, sorted(usernames))
+        self.assertEqual(len(set(usernames)), 8)
+
+    def test_gradebook_pages_newest_first(self):
+        class_obj = self.add_class('Class A', grades=range(50, 57))
+        pages = self.walk(reverse('class_gradebook', kwargs={
+            'school_slug': self.school.slug, 'class_id': class_obj.pk
+        }))
+
+        names = [g.assignment_name for page in pages for g in page]
+        self.assertEqual(names, [f'Assignment {i}' for i in range(6, -1, -1)])
+
+    def test_class_list(self):
+        for i in range(4):
+            self.add_class(f'Class {i}')
+        pages = self.walk(reverse('school_class_list', kwargs={'school_slug': self.school.slug}))
+
+        self.assertEqual([c.name for page in pages for c in page], [f'Class {i}' for i in range(4)])
+        self.assertEqual(pages[0][0].enrollment_count, 1)
+
+    def test_tampered_cursor_is_rejected(self):
+        url = reverse('school_roster', kwargs={'school_slug': self.school.slug})
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 400)
+
+
+class AnnouncementFeedTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_a = self.add_class('Class A', grades=())
+        self.class_b = self.add_class('Class B', grades=())
+        self.other_school = School.objects.create(name='Other', address='-', phone='-', email='o@x.test')
+
+    def announce(self, title, **targets):
+        return Announcement.objects.create(title=title, content='...', created_by=self.teacher, **targets)
+
+    def test_feed_merges_audiences_newest_first(self):
+        self.announce('global')
+        self.announce('school', school=self.school)
+        self.announce('both', school=self.school, class_target=self.class_b)
+        self.announce('other school', school=self.other_school)
+
+        feed = announcements.get_feed([
+            announcements.school_audience(self.school.pk),
+            announcements.class_audience(self.class_a.pk),
+            announcements.class_audience(self.class_b.pk),
+        ], 10)
+
+        self.assertEqual([a.title for a in feed], ['both', 'school', 'Class B news', 'Class A news'])
+
+    @override_settings(ANNOUNCEMENT_TIMELINE_LENGTH=2)
+    def test_feed_is_limited_to_the_timeline_length(self):
+        self.assertEqual(len(announcements.get_feed([announcements.ALL], 10)), 2)
+
+    def test_feed_is_cached_and_invalidated(self):
+        audiences = [announcements.school_audience(self.school.pk), announcements.GLOBAL]
+        announcements.get_feed(audiences, 5)
+        with self.assertNumQueries(0):
+            announcements.get_feed(audiences, 5)
+
+        # Timelines are invalidated once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            announcement = self.announce('global news')
+            self.assertNotIn(announcement, announcements.get_feed(audiences, 5))
+        self.assertEqual(announcements.get_feed(audiences, 5)[0], announcement)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            announcement.school = self.other_school
+            announcement.save()
+        self.assertNotIn(announcement, announcements.get_feed(audiences, 5))
+
+        self.assertEqual(announcements.get_feed([announcements.ALL], 1), [announcement])
+        with self.captureOnCommitCallbacks(execute=True):
+            announcement.delete()
+        self.assertNotIn(announcement, announcements.get_feed([announcements.ALL], 5))
+
+    def test_student_dashboard_announcements(self):
+        self.announce('school', school=self.school)
+        self.announce('global')
+        self.client.force_login(self.student)
+
+        response = self.client.get(reverse('student_dashboard', kwargs={'school_slug': self.school.slug}))
+
+        self.assertEqual(
+            [a.title for a in response.context['recent_announcements']],
+            ['school', 'Class B news', 'Class A news'],
+        )
+
+
+
+class DashboardFragmentTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=(60, 90))
+        self.teacher_url = reverse('teacher_dashboard', kwargs={'school_slug': self.school.slug})
+        self.student_url = reverse('student_dashboard', kwargs={'school_slug': self.school.slug})
+
+    def get_context(self, user, url):
+        self.client.force_login(user)
+        return self.client.get(url).context
+
+    def test_class_performance_is_cached_until_a_grade_changes(self):
+        self.client.force_login(self.teacher)
+        first = self.count_queries(self.teacher_url)
+        self.assertLess(self.count_queries(self.teacher_url), first)
+
+        # The versions are bumped once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.student, class_enrolled=self.class_obj, assignment_name='Quiz', grade=30)
+            context = self.get_context(self.teacher, self.teacher_url)
+            self.assertEqual(context['class_performance'][0]['avg_grade'], 75)
+
+        context = self.get_context(self.teacher, self.teacher_url)
+        self.assertEqual(context['class_performance'][0]['avg_grade'], 60)
+
+    def test_enrollment_invalidates_class_fragments(self):
+        versions = self.get_context(self.teacher, self.teacher_url)['fragment_versions']
+        other = User.objects.create_user(username='other', password='pass', role='student', school=self.school)
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentEnrollment.objects.create(student=other, class_enrolled=self.class_obj)
+
+        context = self.get_context(self.teacher, self.teacher_url)
+        self.assertNotEqual(context['fragment_versions']['class_performance'], versions['class_performance'])
+        self.assertEqual(context['class_performance'][0]['student_count'], 2)
+
+    def test_grades_by_class_follows_grade_moves(self):
+        other_class = self.add_class('Class B', grades=(50,))
+        grade = Grade.objects.filter(class_enrolled=self.class_obj).first()
+        self.get_context(self.student, self.student_url)
+
+        grade.class_enrolled = other_class
+        with self.captureOnCommitCallbacks(execute=True):
+            grade.save()
+
+        grades_by_class = self.get_context(self.student, self.student_url)['grades_by_class']
+        self.assertEqual(len(grades_by_class[self.class_obj]['grades']), 1)
+        self.assertEqual(len(grades_by_class[other_class]['grades']), 2)
+
+    def test_announcement_invalidates_announcement_fragments(self):
+        versions = self.get_context(self.student, self.student_url)['fragment_versions']
+        with self.captureOnCommitCallbacks(execute=True):
+            Announcement.objects.create(title='News', content='...', school=self.school, created_by=self.teacher)
+
+        context = self.get_context(self.student, self.student_url)
+        self.assertNotEqual(context['fragment_versions']['announcements'], versions['announcements'])
+        self.assertEqual(context['fragment_versions']['grades_by_class'], versions['grades_by_class'])
+
+
+class InstrumentationTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset()
+        self.client.force_login(self.student)
+        self.url = reverse('student_dashboard', kwargs={'school_slug': self.school.slug})
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+
+        self.assertRegex(
+            response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$'
+        )
+        self.assertIn(f'"{len(ctx.captured_queries)} queries"', response['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+
+        self.client.force_login(User.objects.create_user(username='admin', password='pass', role='superadmin'))
+        metrics = self.client.get(reverse('request_metrics')).json()['views']['student_dashboard']
+
+        self.assertEqual(metrics['count'], 2)
+        self.assertGreater(metrics['queries']['max'], 0)
+        self.assertGreater(metrics['template_ms']['max'], 0)
+        self.assertEqual(sum(metrics['wall_ms_histogram'].values()), 2)
+
+    def test_metrics_endpoint_is_local_only(self):
+        self.client.force_login(User.objects.create_user(username='admin', password='pass', role='superadmin'))
+        response = self.client.get(reverse('request_metrics'), REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_endpoint_is_for_super_admins(self):
+        # From 127.0.0.1, like every client behind a reverse proxy on the same host
+        self.assertEqual(self.client.get(reverse('request_metrics')).status_code, 403)
+        self.client.logout()
+        self.assertRedirects(
+            self.client.get(reverse('request_metrics')), reverse('super_admin_login'), fetch_redirect_response=False
+        )
+
+    @override_settings(QUERY_BUDGETS={'student_dashboard': 1})
+    def test_budget_overrun_fails_when_strict(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(self.url)
+
+    @override_settings(QUERY_BUDGETS={'student_dashboard': 1}, QUERY_BUDGET_STRICT=False)
+    def test_budget_overrun_warns(self):
+        with self.assertLogs('accounts.instrumentation', 'WARNING') as logs:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('student_dashboard ran', logs.output[0])
+
+
+class AdminChangelistTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser(username='root', password='pass'))
+        self.url = reverse('admin:accounts_grade_changelist')
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_class('Class A', grades=(70,))
+        few = self.count_queries(self.url)
+
+        other = User.objects.create_user(username='student2', password='pass', role='student', school=self.school)
+        for name in ('Class B', 'Class C'):
+            class_obj = self.add_class(name, grades=(60, 70, 80))
+            Grade.objects.create(student=other, class_enrolled=class_obj, assignment_name='Quiz', grade=50)
+
+        self.assertEqual(self.count_queries(self.url), few)
+
+    def test_estimated_count_for_unfiltered_list(self):
+        self.add_class('Class A', grades=(60, 70, 80))
+        Grade.objects.filter(assignment_name='Assignment 1').delete()
+        ids = Grade.objects.order_by('pk').values_list('pk', flat=True)
+
+        with mock.patch('accounts.pagination.ESTIMATE_THRESHOLD', 0):
+            # The span of ids, not a COUNT(*)
+            estimate = EstimatedCountPaginator(Grade.objects.order_by('pk'), 10).count
+            self.assertEqual(estimate, ids.last() - ids.first() + 1)
+            self.assertEqual(EstimatedCountPaginator(Grade.objects.filter(grade__gt=65).order_by('pk'), 10).count, 1)
+
+    def test_estimated_count_is_clamped_by_a_short_page(self):
+        self.add_class('Class A', grades=range(50, 80))
+        Grade.objects.filter(grade__gte=60, grade__lt=79).delete()
+
+        with mock.patch('accounts.pagination.ESTIMATE_THRESHOLD', 0):
+            paginator = EstimatedCountPaginator(Grade.objects.order_by('pk'), 5)
+            self.assertEqual((paginator.count, paginator.num_pages), (30, 6))
+
+            self.assertEqual(len(paginator.page(3)), 1)
+            self.assertEqual((paginator.count, paginator.num_pages), (11, 3))
+            with self.assertRaises(EmptyPage):
+                EstimatedCountPaginator(Grade.objects.order_by('pk'), 5).page(4)
+
+    def test_foreign_keys_use_autocomplete(self):
+        self.add_class('Class A', grades=(70,))
+        grade = Grade.objects.get()
+
+        response = self.client.get(reverse('admin:accounts_grade_change', args=[grade.pk]))
+
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, f'<option value="{self.teacher.pk}">teacher</option>')
+
+@jobs.task(name='tests.record', max_attempts=2)
+def record_job(label, fail=False):
+    JobQueueTests.ran.append(label)
+    if fail:
+        raise RuntimeError(label)
+
+
+class JobQueueTests(DashboardTestCase):
+    ran = []
+
+    def setUp(self):
+        super().setUp()
+        JobQueueTests.ran = []
+        self.worker = jobs.Worker(name='test-worker', poll_interval=0)
+
+    def test_dedupe_key_collapses_pending_jobs(self):
+        first = record_job.enqueue({'label': 'a'}, dedupe_key='a')
+        self.assertEqual(record_job.enqueue({'label': 'a'}, dedupe_key='a'), first)
+
+        # Once it's running, changes need a fresh job
+        self.assertEqual(self.worker.claim(), [first])
+        self.assertNotEqual(record_job.enqueue({'label': 'a'}, dedupe_key='a'), first)
+
+    def test_priority_then_age(self):
+        record_job.enqueue({'label': 'low'})
+        record_job.enqueue({'label': 'high'}, priority=5)
+        record_job.enqueue({'label': 'later'}, delay=60)
+        record_job.enqueue({'label': 'low 2'})
+
+        self.assertEqual(self.worker.run(burst=True), 3)
+        self.assertEqual(self.ran, ['high', 'low', 'low 2'])
+        self.assertEqual(Job.objects.get().payload, {'label': 'later'})
+
+    def test_failed_jobs_are_retried_then_kept(self):
+        job = record_job.enqueue({'label': 'boom', 'fail': True})
+
+        with self.assertLogs('accounts.jobs', 'ERROR'):
+            self.worker.run_once()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('RuntimeError: boom', job.last_error)
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs('accounts.jobs', 'ERROR'):
+            self.worker.run_once()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(self.worker.run_once(), 0)
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = record_job.enqueue({'label': 'orphan'})
+        self.worker.claim()
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(jobs.Worker(name='other').claim(), [job])
+
+    def test_requeue_drops_job_when_a_newer_one_holds_the_dedupe_key(self):
+        failing = record_job.enqueue({'label': 'boom', 'fail': True}, dedupe_key='a')
+        self.worker.claim()
+        newer = record_job.enqueue({'label': 'a'}, dedupe_key='a')
+
+        with self.assertLogs('accounts.jobs', 'ERROR'):
+            self.worker.execute([failing])
+        self.assertEqual(list(Job.objects.all()), [newer])
+
+        # Likewise for a job whose worker died
+        self.assertEqual(self.worker.claim(), [newer])
+        record_job.enqueue({'label': 'a'}, dedupe_key='a')
+        Job.objects.filter(pk=newer.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.worker.run(burst=True), 1)
+        self.assertFalse(Job.objects.exists())
+
+    def test_worker_survives_database_errors(self):
+        record_job.enqueue({'label': 'a'})
+        with mock.patch.object(self.worker, 'claim', side_effect=OperationalError('database is locked')):
+            with self.assertLogs('accounts.jobs', 'ERROR'):
+                self.worker.run(burst=True)
+        self.assertEqual(self.worker.run(burst=True), 1)
+
+    def test_small_jobs_run_as_one_batch(self):
+        classes = [self.add_class(name) for name in ('Class A', 'Class B', 'Class C')]
+        GradeStatistics.objects.all().delete()
+        for class_obj in classes:
+            schedule_class_statistics(class_obj)
+
+        with mock.patch('accounts.tasks.rebuild_grade_statistics', wraps=rebuild_grade_statistics) as rebuild:
+            self.assertEqual(self.worker.run_once(), 3)
+
+        rebuild.assert_called_once_with(class_ids=sorted(class_obj.pk for class_obj in classes))
+        self.assertEqual(find_drift(), {})
+        self.assertFalse(Job.objects.exists())
+
+    def test_school_admin_queues_report_recompute(self):
+        self.add_class('Class A', grades=(80,))
+        school_admin = User.objects.create_user(
+            username='schooladmin', password='pass', role='schooladmin', school=self.school
+        )
+        self.client.force_login(school_admin)
+        url = reverse('school_recompute_reports', kwargs={'school_slug': self.school.slug})
+
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.client.post(url)
+        self.client.post(url)
+        self.assertEqual(Job.objects.filter(task='recompute_school_reports').count(), 1)
+
+        call_command('run_workers', burst=True, stdout=StringIO())
+
+        self.assertFalse(Job.objects.exists())
+        self.client.force_login(self.student)
+        with mock.patch.object(grade_analytics, 'student_report') as compute:
+            self.client.get(reverse('student_dashboard', kwargs={'school_slug': self.school.slug}))
+        compute.assert_not_called()
+
+    def test_admin_action_queues_jobs(self):
+        self.client.force_login(User.objects.create_superuser(username='root', password='pass'))
+
+        self.client.post(reverse('admin:accounts_school_changelist'), {
+            'action': 'recompute_grade_reports', '_selected_action': [self.school.pk],
+        })
+
+        self.assertEqual(Job.objects.get().payload, {'school_id': self.school.pk})
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('student_dashboard', kwargs={'school_slug': self.school.slug})
+
+    def read_aliases(self, url):
+        """The aliases the router picks for each read, while actually running them on default"""
+        decisions = []
+        route = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            decisions.append(route(router, model, **hints))
+            return 'default'
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', record):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return decisions
+
+    def test_reads_go_to_replica_until_a_write(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Grade), 'default')
+        with use_replica():
+            self.assertEqual(router.db_for_read(Grade), 'replica')
+            self.assertEqual(router.db_for_write(Grade), 'default')
+            self.assertEqual(router.db_for_read(Grade), 'default')
+
+    def test_primary_reads_inside_replica_reads(self):
+        router = ReplicaRouter()
+        with use_replica():
+            with primary_reads():
+                self.assertEqual(router.db_for_read(Grade), 'default')
+            self.assertEqual(router.db_for_read(Grade), 'replica')
+            with primary_reads():
+                router.db_for_write(Grade)
+            # A write made for the cache fill still pins the request
+            self.assertEqual(router.db_for_read(Grade), 'default')
+
+    def test_cache_fills_read_from_primary(self):
+        router = ReplicaRouter()
+        fills = []
+
+        def load_timelines(audiences):
+            fills.append(router.db_for_read(Announcement))
+            return {audience: [] for audience in audiences}
+
+        with use_replica(), mock.patch('accounts.announcements._load_timelines', load_timelines):
+            cached_fragment('fill_test', [], lambda: fills.append(router.db_for_read(Grade)))
+            announcements.get_timelines([announcements.ALL])
+            self.assertEqual(router.db_for_read(Grade), 'replica')
+
+        self.assertEqual(fills, ['default', 'default'])
+
+    def test_cache_and_sessions_stay_on_default_routing(self):
+        router = ReplicaRouter()
+        with use_replica():
+            for model in (Session, DatabaseCache('accounts_cache', {}).cache_model_class):
+                self.assertIsNone(router.db_for_read(model))
+                self.assertIsNone(router.db_for_write(model))
+            # Cache and session writes don't pin the request to the primary
+            self.assertEqual(router.db_for_read(Grade), 'replica')
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_no_replica_configured(self):
+        with use_replica():
+            self.assertIsNone(ReplicaRouter().db_for_read(Grade))
+
+    def test_dashboard_reads_from_replica(self):
+        self.client.force_login(self.student)
+        self.assertIn('replica', self.read_aliases(self.url))
+
+    def test_login_pins_session_to_primary(self):
+        response = self.client.post(
+            reverse('student_login', kwargs={'school_slug': self.school.slug}),
+            {'username': 'student', 'password': 'pass'},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertGreater(self.client.session[PIN_SESSION_KEY], time.time())
+        self.assertNotIn('replica', self.read_aliases(self.url))
+
+    def test_stand_in_replicator(self):
+        tmp = self.make_tmp_dir()
+        with sqlite3.connect(tmp / 'primary.sqlite3') as primary:
+            primary.execute('CREATE TABLE grade (mark INTEGER)')
+            primary.execute('INSERT INTO grade VALUES (90)')
+
+        copy_sqlite_database(tmp / 'primary.sqlite3', tmp / 'replica.sqlite3')
+
+        with sqlite3.connect(tmp / 'replica.sqlite3') as replica:
+            self.assertEqual(replica.execute('SELECT mark FROM grade').fetchall(), [(90,)])
+
+class ShardingTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A')
+        # Not for setUpTestData: the test database has no shard1 to copy schools to
+        self.enterContext(override_settings(SCHOOL_SHARDS={'arday-high-school': 'shard1'}, SHARD_FANOUT_WORKERS=1))
+
+    def read_aliases(self, url):
+        """The shards the router picks for each read, while actually running them on default"""
+        decisions = []
+        route = SchoolShardRouter.db_for_read
+
+        def record(router, model, **hints):
+            decisions.append(route(router, model, **hints))
+            return 'default'
+
+        with mock.patch.object(SchoolShardRouter, 'db_for_read', record):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return decisions
+
+    def test_router_follows_current_shard(self):
+        router = SchoolShardRouter()
+        self.assertIsNone(router.db_for_read(Grade))
+        with use_shard('shard1'):
+            self.assertEqual(router.db_for_read(Grade), 'shard1')
+            self.assertEqual(router.db_for_write(Grade), 'shard1')
+            self.assertIsNone(router.db_for_read(Session))
+
+        grade = Grade(student=self.student, class_enrolled=self.class_obj)
+        grade._state.db = 'shard1'
+        self.assertEqual(router.db_for_write(Grade, instance=grade), 'shard1')
+
+    @override_settings(SCHOOL_SHARDS={})
+    def test_no_shards_configured(self):
+        with use_shard('shard1'):
+            self.assertIsNone(SchoolShardRouter().db_for_read(Grade))
+
+    def test_school_pages_read_from_their_shard(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.session[SHARD_SESSION_KEY], 'default')
+
+        decisions = self.read_aliases(reverse('student_dashboard', kwargs={'school_slug': self.school.slug}))
+
+        self.assertIn('shard1', decisions)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_super_admin_kpis_merge_shards(self):
+        self.client.force_login(User.objects.create_user(username='admin', password='pass', role='superadmin'))
+
+        # Two "shards" holding the same data: per-school counts add up, schools don't repeat.
+        # The query budget is written for one database, so this may go over it.
+        with mock.patch('accounts.sharding.shard_aliases', return_value=['default', 'default']):
+            response = self.client.get(reverse('super_admin_dashboard'))
+
+        self.assertEqual(response.context['total_schools'], 1)
+        self.assertEqual(response.context['total_students'], 2)
+        self.assertEqual(response.context['total_classes'], 2)
+        self.assertEqual(len(response.context['schools_with_most_students']), 1)
+
+    def test_feed_merges_shards_without_repeats(self):
+        with mock.patch('accounts.sharding.shard_aliases', return_value=['default', 'default']):
+            feed = announcements.get_feed([announcements.ALL], 10)
+
+        self.assertEqual([a.title for a in feed], ['Class A news'])
+
+    def test_import_needs_school_when_sharded(self):
+        with self.assertRaisesMessage(CommandError, '--school is required'):
+            call_command('import_grades', __file__, stdout=StringIO())
+
+class LiveAnnouncementTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=())
+        self.url = reverse('announcement_stream', kwargs={'school_slug': self.school.slug})
+
+    def announce(self, title, **targets):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Announcement.objects.create(title=title, content='...', created_by=self.teacher, **targets)
+
+    async def disconnect(self, stream):
+        # What the ASGI handler does when the client goes away
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+
+    async def test_hub_delivers_once_per_subscriber(self):
+        subscriber = live.hub.subscribe(['school:1', 'class:2'])
+        try:
+            self.assertEqual(live.hub.dispatch(['school:1', 'class:2'], 'frame'), 1)
+            self.assertEqual(await subscriber.get(1), 'frame')
+            self.assertIsNone(await subscriber.get(0.01))
+        finally:
+            live.hub.unsubscribe(subscriber)
+        self.assertEqual(live.hub.dispatch(['school:1'], 'frame'), 0)
+
+    async def test_new_announcements_are_published(self):
+        subscriber = live.hub.subscribe([live.channel(announcements.class_audience(self.class_obj.pk))])
+        try:
+            await sync_to_async(self.announce)('Trip', class_target=self.class_obj)
+            frame = await subscriber.get(1)
+        finally:
+            live.hub.unsubscribe(subscriber)
+
+        self.assertIn('event: announcement', frame)
+        self.assertEqual(json.loads(frame.split('data: ')[1])['title'], 'Trip')
+
+    async def test_stream_pushes_to_the_users_classes(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        await sync_to_async(self.announce)('Other school', school=await School.objects.acreate(
+            name='Other', address='-', phone='-', email='o@x.test'
+        ))
+        await sync_to_async(self.announce)('Homework', class_target=self.class_obj)
+
+        frame = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b'"title": "Homework"', frame)
+        await self.disconnect(stream)
+        self.assertEqual(live.hub.subscriber_count(), 0)
+
+    async def test_reconnect_catches_up_from_last_event_id(self):
+        first = await sync_to_async(self.announce)('First', school=self.school)
+        await sync_to_async(self.announce)('Second', school=self.school)
+        await self.async_client.aforce_login(self.student)
+
+        response = await self.async_client.get(self.url, headers={'Last-Event-ID': first.created_at.isoformat()})
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+
+        self.assertIn(b'"title": "Second"', await anext(stream))
+        await self.disconnect(stream)
+
+    async def test_sqlite_backend_fans_out_between_processes(self):
+        path = self.make_tmp_dir() / 'live.sqlite3'
+        # Two "processes", each with its own hub
+        publisher = live.SQLiteBackend(live.Hub(), path=path)
+        listener_hub = live.Hub()
+        listener = live.SQLiteBackend(listener_hub, path=path)
+        subscriber = listener_hub.subscribe(['school:1'])
+
+        await sync_to_async(publisher.publish)(['school:1'], 'frame')
+        with closing(listener.connect()) as connection:
+            self.assertEqual(listener.poll(connection), 1)
+            self.assertEqual(listener.poll(connection), 0)
+
+        self.assertEqual(await subscriber.get(1), 'frame')
+
+    def test_sqlite_backend_reuses_its_publishing_connection(self):
+        backend = live.SQLiteBackend(live.Hub(), path=self.make_tmp_dir() / 'live.sqlite3')
+        with mock.patch.object(backend, 'connect', wraps=backend.connect) as connect:
+            backend.publish(['school:1'], 'one')
+            backend.publish(['school:1'], 'two')
+        connect.assert_called_once()
+
+    def test_sqlite_backend_keeps_polling_after_errors(self):
+        class Stop(BaseException):
+            pass
+
+        backend = live.SQLiteBackend(live.Hub(), path=self.make_tmp_dir() / 'live.sqlite3')
+        errors = [sqlite3.OperationalError('database is locked'), 0, Stop()]
+        with mock.patch.object(backend, 'poll', side_effect=errors) as poll, mock.patch('accounts.live.time.sleep'):
+            with self.assertLogs('accounts.live', 'ERROR'), self.assertRaises(Stop):
+                backend.poll_forever()
+        self.assertEqual(poll.call_count, 3)
+
+    @override_settings(LIVE_BACKEND='accounts.live.SQLiteBackend', LIVE_SQLITE_PATH='/nonexistent/live.sqlite3')
+    def test_publish_failures_dont_fail_the_save(self):
+        self.addCleanup(setattr, live, '_backend', (None, None))
+        with self.assertLogs('accounts.live', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            announcement = self.announce('Trip', class_target=self.class_obj)
+        self.assertTrue(Announcement.objects.filter(pk=announcement.pk).exists())
+
+# The real dashboard URLs, but served by the ASGI-native views
+async_urls = ModuleType('async_urls')
+async_urls.urlpatterns = [
+    path('super-admin/dashboard/', async_views.super_admin_dashboard, name='super_admin_dashboard'),
+    path('<slug:school_slug>/dashboard/', async_views.student_dashboard, name='student_dashboard'),
+    path('<slug:school_slug>/teachers/dashboard/', async_views.teacher_dashboard, name='teacher_dashboard'),
+    path('<slug:school_slug>/admin/dashboard/', async_views.school_admin_dashboard, name='school_admin_dashboard'),
+    path('', include('accounts.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF=async_urls)
+class AsyncDashboardTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=(60, 90))
+        self.school_admin = User.objects.create_user(
+            username='schooladmin', password='pass', role='schooladmin', school=self.school
+        )
+        self.super_admin = User.objects.create_user(username='admin', password='pass', role='superadmin')
+
+    async def get_context(self, user, name, **kwargs):
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.get(reverse(name, kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    async def test_student_dashboard(self):
+        context = await self.get_context(self.student, 'student_dashboard', school_slug=self.school.slug)
+
+        self.assertEqual(context['gpa'], 2.0)
+        self.assertEqual(context['average_percent'], 75)
+        self.assertEqual(context['grades_by_class'][self.class_obj]['average'], 75)
+        self.assertEqual([a.title for a in context['recent_announcements']], ['Class A news'])
+
+    async def test_teacher_dashboard(self):
+        context = await self.get_context(self.teacher, 'teacher_dashboard', school_slug=self.school.slug)
+
+        self.assertEqual(context['class_performance'][0]['avg_grade'], 75)
+        self.assertEqual(context['total_students'], 1)
+        self.assertEqual(len(context['recent_grades']), 2)
+
+    async def test_queries_from_worker_threads_are_counted(self):
+        await self.async_client.aforce_login(self.teacher)
+        response = await self.async_client.get(
+            reverse('teacher_dashboard', kwargs={'school_slug': self.school.slug})
+        )
+
+        self.assertRegex(response['Server-Timing'], r'desc="([5-9]|\d\d) queries"')
+
+    async def test_school_admin_dashboard(self):
+        context = await self.get_context(
+            self.school_admin, 'school_admin_dashboard', school_slug=self.school.slug
+        )
+
+        self.assertEqual((context['total_teachers'], context['total_students']), (1, 1))
+        self.assertEqual(context['classes_with_enrollment'][0].enrollment_count, 1)
+
+    async def test_super_admin_dashboard(self):
+        context = await self.get_context(self.super_admin, 'super_admin_dashboard')
+
+        self.assertEqual(context['total_schools'], 1)
+        self.assertEqual(context['super_admin_count'], 1)
+
+    async def test_decorators_guard_async_views(self):
+        url = reverse('teacher_dashboard', kwargs={'school_slug': self.school.slug})
+        response = await self.async_client.get(url)
+        self.assertRedirects(response, f'/login/?next={url}', fetch_redirect_response=False)
+
+        await self.async_client.aforce_login(self.student)
+        self.assertEqual((await self.async_client.get(url)).status_code, 403)
+        response = await self.async_client.get(reverse('super_admin_dashboard'))
+        self.assertEqual(response.status_code, 403)
+
+
+class ApiDashboardTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.class_obj = self.add_class('Class A', grades=(60, 90))
+        self.url = reverse('api_student_dashboard', kwargs={'school_slug': self.school.slug})
+        self.client.force_login(self.student)
+
+    def test_student_dashboard(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = response.json()
+        self.assertEqual((data['gpa'], data['average_percent']), (2.0, 75))
+        self.assertEqual(data['classes'][0]['average'], 75)
+        self.assertEqual(data['grade_report']['classes'][str(self.class_obj.pk)]['percent'], 75)
+        self.assertEqual([grade['grade'] for grade in data['recent_grades']], [90, 60])
+        self.assertEqual([a['title'] for a in data['recent_announcements']], ['Class A news'])
+
+    def test_unchanged_data_is_not_modified_without_dashboard_queries(self):
+        first = self.client.get(self.url)
+        self.assertTrue(first['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', first)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, headers={'If-None-Match': first['ETag']})
+
+        self.assertEqual(response.status_code, 304)
+        tables = ('accounts_grade', 'accounts_studentenrollment', 'accounts_announcement')
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if any(t in q['sql'] for t in tables)])
+        response = self.client.get(self.url, headers={'If-Modified-Since': first['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag_once_committed(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Grade.objects.create(student=self.student, class_enrolled=self.class_obj, assignment_name='Quiz', grade=30)
+            self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        for callback in callbacks:
+            callback()
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['recent_grades']), 3)
+
+    def test_etags_are_per_user_and_per_school(self):
+        other_school = School.objects.create(name='Other', address='2 Main St', phone='456', email='o@o.test')
+        other = User.objects.create_user(username='other', password='pass', role='student', school=self.school)
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Class.objects.create(name='Elsewhere', school=other_school, teacher=self.teacher, subject='Art')
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+        self.client.force_login(other)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_teacher_dashboard(self):
+        self.client.force_login(self.teacher)
+        data = self.client.get(reverse('api_teacher_dashboard', kwargs={'school_slug': self.school.slug})).json()
+
+        self.assertEqual(data['classes'], [{
+            'id': self.class_obj.pk, 'name': 'Class A', 'subject': 'Maths', 'student_count': 1, 'avg_grade': 75,
+        }])
+        self.assertEqual(data['total_students'], 1)
+        self.assertEqual(data['recent_grades'][0]['username'], 'student')
+
+    def test_admin_dashboards(self):
+        User.objects.create_user(username='schooladmin', password='pass', role='schooladmin', school=self.school)
+        User.objects.create_user(username='admin', password='pass', role='superadmin')
+
+        self.client.login(username='schooladmin', password='pass')
+        data = self.client.get(reverse('api_school_admin_dashboard', kwargs={'school_slug': self.school.slug})).json()
+        self.assertEqual((data['total_teachers'], data['total_students'], data['total_classes']), (1, 1, 1))
+        self.assertEqual(data['classes_with_enrollment'][0]['enrollment_count'], 1)
+
+        self.client.login(username='admin', password='pass')
+        data = self.client.get(reverse('api_super_admin_dashboard')).json()
+        self.assertEqual(data['total_schools'], 1)
+        self.assertEqual(data['schools_with_most_students'][0]['student_count'], 1)
+
+    def test_access(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(reverse('api_super_admin_dashboard')).status_code, 403)
+
+    def test_standard_library_json_matches_orjson(self):
+        data = {'grade': Decimal('92.50'), 'at': timezone.now(), 'classes': {1: 'Ünïcode'}}
+        with mock.patch.object(api, 'orjson', None):
+            fallback = api.dumps(data)
+
+        self.assertEqual(json.loads(fallback), json.loads(api.dumps(data)))
+
+
+class SessionAuthTests(DashboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.teacher)
+
+    def auth(self, lazy_user=True):
+        """get_auth() for a request carrying the test client's session"""
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.user = SimpleLazyObject(lambda: self.fail('request.user was loaded')) if lazy_user else self.teacher
+        return get_auth(request), request
+
+    def test_snapshot_authorizes_without_queries(self):
+        with self.assertNumQueries(0):
+            auth, _ = self.auth()
+
+        self.assertEqual((auth.pk, auth.role, auth.school_id, auth.school_slug), (
+            self.teacher.pk, 'teacher', self.school.pk, self.school.slug,
+        ))
+
+    def test_api_revalidation_runs_no_queries(self):
+        url = reverse('api_teacher_dashboard', kwargs={'school_slug': self.school.slug})
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_role_change_makes_the_snapshot_stale(self):
+        self.teacher.role = 'schooladmin'
+        self.teacher.save()
+
+        url = reverse('teacher_dashboard', kwargs={'school_slug': self.school.slug})
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.auth()[0].role, 'schooladmin')
+
+    def test_password_change_logs_other_sessions_out(self):
+        self.teacher.set_password('new password')
+        self.teacher.save()
+
+        url = reverse('teacher_dashboard', kwargs={'school_slug': self.school.slug})
+        self.assertRedirects(self.client.get(url), f'/login/?next={url}', fetch_redirect_response=False)
+
+    def test_last_login_updates_keep_the_snapshot(self):
+        self.teacher.last_login = timezone.now()
+        self.teacher.save(update_fields=['last_login'])
+
+        with self.assertNumQueries(0):
+            self.auth()
+
+    def test_expired_snapshot_rechecks_the_user(self):
+        # No signals, so the version counter doesn't change
+        User.objects.filter(pk=self.teacher.pk).update(is_active=False)
+        url = reverse('teacher_dashboard', kwargs={'school_slug': self.school.slug})
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        later = time.time() + settings.AUTH_SNAPSHOT_TTL + 1
+        with mock.patch('accounts.session_auth.time.time', return_value=later):
+            self.assertRedirects(self.client.get(url), f'/login/?next={url}', fetch_redirect_response=False)
+
+    def test_tampered_snapshot_is_ignored(self):
+        session = self.client.session
+        _, _, _, slug, db, version, verified_at = signing.loads(
+            session[AUTH_SNAPSHOT_SESSION_KEY], salt=AUTH_SNAPSHOT_SALT
+        )
+        forged = [self.teacher.pk, 'superadmin', None, slug, db, version, verified_at]
+        session[AUTH_SNAPSHOT_SESSION_KEY] = signing.dumps(forged, key='not the secret key', salt=AUTH_SNAPSHOT_SALT)
+        session.save()
+
+        auth, request = self.auth(lazy_user=False)
+        self.assertEqual(auth.role, 'teacher')
+        self.assertEqual(
+            signing.loads(request.session[AUTH_SNAPSHOT_SESSION_KEY], salt=AUTH_SNAPSHOT_SALT)[1], 'teacher'
+        )
+
+
+class LoginTests(DashboardTestCase):
+
+    def post_login(self, name, username, **kwargs):
+        return self.client.post(reverse(name, kwargs=kwargs), {'username': username, 'password': 'pass'})
+
+    def test_each_role_logs_in_through_its_own_page(self):
+        User.objects.create_user(username='admin', password='pass', role='superadmin')
+        User.objects.create_user(username='schooladmin', password='pass', role='schooladmin', school=self.school)
+        slug = {'school_slug': self.school.slug}
+
+        for name, username, dashboard, kwargs in [
+            ('student_login', 'student', 'student_dashboard', slug),
+            ('teacher_login', 'teacher', 'teacher_dashboard', slug),
+            ('school_admin_login', 'schooladmin', 'school_admin_dashboard', slug),
+            ('super_admin_login', 'admin', 'super_admin_dashboard', {}),
+        ]:
+            response = self.post_login(name, username, **kwargs)
+            self.assertRedirects(response, reverse(dashboard, kwargs=kwargs), fetch_redirect_response=False)
+
+    def test_wrong_role_is_rejected(self):
+        response = self.post_login('teacher_login', 'student', school_slug=self.school.slug)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+        response = self.post_login('super_admin_login', 'teacher')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'accounts.hashers.TunedScryptPasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_old_hashes_are_upgraded_on_login(self):
+        self.student.password = make_password('pass', hasher='md5')
+        self.student.save()
+
+        self.post_login('student_login', 'student', school_slug=self.school.slug)
+
+        self.student.refresh_from_db()
+        self.assertTrue(self.student.password.startswith('scrypt$'))
+
+    def test_busy_hashing_returns_503(self):
+        with mock.patch('accounts.views.hashing_slot', side_effect=HashingBusy):
+            response = self.post_login('student_login', 'student', school_slug=self.school.slug)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn('_auth_user_id', self.client.session)
@@ -1,34 +1,52 @@
+from django.conf import settings
 from django.urls import path, include
-from . import views
+from . import views, async_views, api, instrumentation
+
+# Dashboards served by the ASGI-native views when ASYNC_DASHBOARDS is on
+dashboards = async_views if getattr(settings, 'ASYNC_DASHBOARDS', False) else views
 
 # School-based URL patterns
 school_patterns = [
     # Student login and dashboard
     path('', views.student_login, name='student_login'),
-    path('dashboard/', views.student_dashboard, name='student_dashboard'),
+    path('dashboard/', dashboards.student_dashboard, name='student_dashboard'),
+    path('announcements/stream/', async_views.announcement_stream, name='announcement_stream'),
     
     # Teacher login and dashboard
     path('teachers/', views.teacher_login, name='teacher_login'),
-    path('teachers/dashboard/', views.teacher_dashboard, name='teacher_dashboard'),
+    path('teachers/dashboard/', dashboards.teacher_dashboard, name='teacher_dashboard'),
+    path('teachers/classes/<int:class_id>/grades/', views.class_gradebook, name='class_gradebook'),
+    path('teachers/classes/<int:class_id>/gradebook.csv', views.class_gradebook_export, name='class_gradebook_export'),
     
     # School admin login and dashboard
     path('admin/', views.school_admin_login, name='school_admin_login'),
-    path('admin/dashboard/', views.school_admin_dashboard, name='school_admin_dashboard'),
+    path('admin/dashboard/', dashboards.school_admin_dashboard, name='school_admin_dashboard'),
+    path('admin/gradebook.csv', views.school_gradebook_export, name='school_gradebook_export'),
+    path('admin/roster/', views.school_roster, name='school_roster'),
+    path('admin/classes/', views.school_class_list, name='school_class_list'),
+    path('admin/recompute-reports/', views.school_recompute_reports, name='school_recompute_reports'),
+    
+    # Read-only JSON dashboards for mobile and kiosk clients
+    path('api/dashboard/', api.student_dashboard, name='api_student_dashboard'),
+    path('api/teachers/dashboard/', api.teacher_dashboard, name='api_teacher_dashboard'),
+    path('api/admin/dashboard/', api.school_admin_dashboard, name='api_school_admin_dashboard'),
 ]
 
 # Main URL patterns
 urlpatterns = [
     # Super Admin (global access)
     path('super-admin/', views.super_admin_login, name='super_admin_login'),
-    path('super-admin/dashboard/', views.super_admin_dashboard, name='super_admin_dashboard'),
+    path('super-admin/dashboard/', dashboards.super_admin_dashboard, name='super_admin_dashboard'),
+    path('super-admin/metrics/', instrumentation.metrics_view, name='request_metrics'),
+    path('super-admin/api/dashboard/', api.super_admin_dashboard, name='api_super_admin_dashboard'),
     
     # School-based URLs (will be included in main project URLs)
     path('<slug:school_slug>/', include(school_patterns)),
     
     # Legacy redirects (for backward compatibility)
     path('', views.dashboard_redirect, name='dashboard_redirect'),
-    path('legacy/super-admin/', views.super_admin_dashboard, name='legacy_super_admin_dashboard'),
-    path('legacy/school-admin/', views.school_admin_dashboard, name='legacy_school_admin_dashboard'),
-    path('legacy/teacher/', views.teacher_dashboard, name='legacy_teacher_dashboard'),
-    path('legacy/student/', views.student_dashboard, name='legacy_student_dashboard'),
+    path('legacy/super-admin/', dashboards.super_admin_dashboard, name='legacy_super_admin_dashboard'),
+    path('legacy/school-admin/', dashboards.school_admin_dashboard, name='legacy_school_admin_dashboard'),
+    path('legacy/teacher/', dashboards.teacher_dashboard, name='legacy_teacher_dashboard'),
+    path('legacy/student/', dashboards.student_dashboard, name='legacy_student_dashboard'),
 ]
\ No newline at end of file
@@ -1,172 +1,197 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.db.models import Count, Avg, Q
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
+import csv
 from datetime import timedelta
-from .models import User, School, Class, StudentEnrollment, Grade, Announcement
+from .models import User, Class, StudentEnrollment, Grade, GradeStatistics
+from .dashboard_cache import (
+    get_super_admin_kpis, get_class_performance, get_grades_by_class, get_student_report,
+    fragment_version, class_namespace, audience_namespace, SUPER_ADMIN_KPIS, ANNOUNCEMENTS,
+)
+from .schools import get_school, resolve_school
+from .sharding import use_shard, shard_for_school
+from .pagination import paginate_keyset
+from .routers import replica_reads
+from .session_auth import login_required, get_auth, aget_auth
+from .hashers import hashing_slot, HashingBusy
+from .tasks import schedule_school_reports
+from . import announcements
 
 # Create your views here.
 
 # ==================== SCHOOL-BASED LOGIN VIEWS ====================
 
-def student_login(request, school_slug):
-    """Student login for specific school"""
-    school = get_object_or_404(School, slug=school_slug)
+LOGIN_ROLES = {
+    'student': {
+        'label': 'Student',
+        'login_url': 'student_login',
+        'dashboard_url': 'student_dashboard',
+        'template': 'accounts/login/student_login.html',
+    },
+    'teacher': {
+        'label': 'Teacher',
+        'login_url': 'teacher_login',
+        'dashboard_url': 'teacher_dashboard',
+        'template': 'accounts/login/teacher_login.html',
+    },
+    'schooladmin': {
+        'label': 'School Administrator',
+        'login_url': 'school_admin_login',
+        'dashboard_url': 'school_admin_dashboard',
+        'template': 'accounts/login/school_admin_login.html',
+    },
+    'superadmin': {
+        'label': 'Super Administrator',
+        'login_url': 'super_admin_login',
+        'dashboard_url': 'super_admin_dashboard',
+        'template': 'accounts/login/super_admin_login.html',
+    },
+}
+
+def role_login(request, role, school=None):
+    """Shared login pipeline for every role; school is None for super admins"""
+    config = LOGIN_ROLES[role]
+    status = 200
     
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
         
         if username and password:
-            user = authenticate(request, username=username, password=password)
+            try:
+                with hashing_slot():
+                    user = authenticate(request, username=username, password=password)
+            except HashingBusy:
+                user = None
+                status = 503
+                messages.error(request, 'Too many people are signing in right now. Please try again.')
+            
             if user:
-                # Verify user is a student of this school
-                if user.role == 'student' and user.school == school:
+                # Verify the role (and school) from the row authenticate() already loaded
+                if user.role == role and (school is None or user.school_id == school.pk):
                     login(request, user)
                     messages.success(request, f'Welcome back, {user.get_full_name() or user.username}!')
-                    return redirect('student_dashboard', school_slug=school_slug)
+                    if school is None:
+                        return redirect(config['dashboard_url'])
+                    return redirect(config['dashboard_url'], school_slug=school.slug)
+                elif school is None:
+                    messages.error(request, 'Access denied. Super Admin access required.')
                 else:
                     messages.error(request, 'Access denied. You are not authorized for this school.')
-            else:
+            elif status == 200:
                 messages.error(request, 'Invalid username or password.')
         else:
             messages.error(request, 'Please fill in all fields.')
     
     context = {
-        'school': school,
-        'role': 'Student',
-        'login_url': 'student_login',
-        'dashboard_url': 'student_dashboard'
+        'role': config['label'],
+        'login_url': config['login_url'],
+        'dashboard_url': config['dashboard_url'],
     }
-    return render(request, 'accounts/login/student_login.html', context)
+    if school is not None:
+        context['school'] = school
+    return render(request, config['template'], context, status=status)
+
+@resolve_school()
+def student_login(request, school_slug):
+    """Student login for specific school"""
+    return role_login(request, 'student', request.school)
 
+@resolve_school()
 def teacher_login(request, school_slug):
     """Teacher login for specific school"""
-    school = get_object_or_404(School, slug=school_slug)
-    
-    if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
-        
-        if username and password:
-            user = authenticate(request, username=username, password=password)
-            if user:
-                # Verify user is a teacher of this school
-                if user.role == 'teacher' and user.school == school:
-                    login(request, user)
-                    messages.success(request, f'Welcome back, {user.get_full_name() or user.username}!')
-                    return redirect('teacher_dashboard', school_slug=school_slug)
-                else:
-                    messages.error(request, 'Access denied. You are not authorized for this school.')
-            else:
-                messages.error(request, 'Invalid username or password.')
-        else:
-            messages.error(request, 'Please fill in all fields.')
-    
-    context = {
-        'school': school,
-        'role': 'Teacher',
-        'login_url': 'teacher_login',
-        'dashboard_url': 'teacher_dashboard'
-    }
-    return render(request, 'accounts/login/teacher_login.html', context)
+    return role_login(request, 'teacher', request.school)
 
+@resolve_school()
 def school_admin_login(request, school_slug):
     """School admin login for specific school"""
-    school = get_object_or_404(School, slug=school_slug)
-    
-    if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
-        
-        if username and password:
-            user = authenticate(request, username=username, password=password)
-            if user:
-                # Verify user is a school admin of this school
-                if user.role == 'schooladmin' and user.school == school:
-                    login(request, user)
-                    messages.success(request, f'Welcome back, {user.get_full_name() or user.username}!')
-                    return redirect('school_admin_dashboard', school_slug=school_slug)
-                else:
-                    messages.error(request, 'Access denied. You are not authorized for this school.')
-            else:
-                messages.error(request, 'Invalid username or password.')
-        else:
-            messages.error(request, 'Please fill in all fields.')
-    
-    context = {
-        'school': school,
-        'role': 'School Administrator',
-        'login_url': 'school_admin_login',
-        'dashboard_url': 'school_admin_dashboard'
-    }
-    return render(request, 'accounts/login/school_admin_login.html', context)
+    return role_login(request, 'schooladmin', request.school)
 
 def super_admin_login(request):
     """Super admin login (global access)"""
-    if request.method == 'POST':
-        username = request.POST.get('username')
-        password = request.POST.get('password')
-        
-        if username and password:
-            user = authenticate(request, username=username, password=password)
-            if user:
-                # Verify user is a super admin
-                if user.role == 'superadmin':
-                    login(request, user)
-                    messages.success(request, f'Welcome back, {user.get_full_name() or user.username}!')
-                    return redirect('super_admin_dashboard')
-                else:
-                    messages.error(request, 'Access denied. Super Admin access required.')
-            else:
-                messages.error(request, 'Invalid username or password.')
-        else:
-            messages.error(request, 'Please fill in all fields.')
-    
-    context = {
-        'role': 'Super Administrator',
-        'login_url': 'super_admin_login',
-        'dashboard_url': 'super_admin_dashboard'
-    }
-    return render(request, 'accounts/login/super_admin_login.html', context)
+    return role_login(request, 'superadmin')
 
 # ==================== SECURITY DECORATORS ====================
 
+def _check_school_access(user, school, school_slug):
+    """Return a redirect for anonymous users, raise if the user can't see this school"""
+    if not user.is_authenticated:
+        return redirect('student_login', school_slug=school_slug)
+    
+    # Super admin can access any school
+    if user.role == 'superadmin':
+        return None
+    
+    # Check if user belongs to this school
+    if user.school_id != school.pk:
+        raise PermissionDenied("You don't have access to this school.")
+    
+    return None
+
 def require_school_access(school_slug_param='school_slug'):
-    """Decorator to ensure user has access to the specified school"""
+    """Decorator to ensure user has access to the specified school (sync or async views)"""
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            async def wrapper(request, *args, **kwargs):
+                school_slug = kwargs.get(school_slug_param)
+                school = request.school = await sync_to_async(get_school)(school_slug)
+                
+                response = _check_school_access(await aget_auth(request), school, school_slug)
+                if response is not None:
+                    return response
+                
+                with use_shard(shard_for_school(school)):
+                    return await view_func(request, *args, **kwargs)
+            return wrapper
+        
         def wrapper(request, *args, **kwargs):
             school_slug = kwargs.get(school_slug_param)
-            school = get_object_or_404(School, slug=school_slug)
+            school = request.school = get_school(school_slug)
             
-            if not request.user.is_authenticated:
-                return redirect('student_login', school_slug=school_slug)
+            response = _check_school_access(get_auth(request), school, school_slug)
+            if response is not None:
+                return response
             
-            # Super admin can access any school
-            if request.user.role == 'superadmin':
+            # The school's own database, when SCHOOL_SHARDS is set
+            with use_shard(shard_for_school(school)):
                 return view_func(request, *args, **kwargs)
-            
-            # Check if user belongs to this school
-            if request.user.school != school:
-                raise PermissionDenied("You don't have access to this school.")
-            
-            return view_func(request, *args, **kwargs)
         return wrapper
     return decorator
 
+def _check_role(user, required_role):
+    """Return a redirect for anonymous users, raise if the user lacks the role"""
+    if not user.is_authenticated:
+        return redirect('super_admin_login')
+    
+    if user.role != required_role:
+        raise PermissionDenied(f"Access denied. {required_role.title()} role required.")
+    
+    return None
+
 def require_role(required_role):
-    """Decorator to ensure user has the required role"""
+    """Decorator to ensure user has the required role (sync or async views)"""
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            async def wrapper(request, *args, **kwargs):
+                response = _check_role(await aget_auth(request), required_role)
+                if response is not None:
+                    return response
+                
+                return await view_func(request, *args, **kwargs)
+            return wrapper
+        
         def wrapper(request, *args, **kwargs):
-            if not request.user.is_authenticated:
-                return redirect('super_admin_login')
-            
-            if request.user.role != required_role:
-                raise PermissionDenied(f"Access denied. {required_role.title()} role required.")
+            response = _check_role(get_auth(request), required_role)
+            if response is not None:
+                return response
             
             return view_func(request, *args, **kwargs)
         return wrapper
@@ -195,50 +220,36 @@ def dashboard_redirect(request):
 
 @login_required
 @require_role('superadmin')
+@replica_reads
 def super_admin_dashboard(request):
     """Super Admin Dashboard - Shows all data across all schools"""
     
-    # Get all data across all schools
-    total_schools = School.objects.count()
-    total_teachers = User.objects.filter(role='teacher').count()
-    total_students = User.objects.filter(role='student').count()
-    total_classes = Class.objects.count()
-    
-    # Chart data
-    super_admin_count = User.objects.filter(role='superadmin').count()
-    school_admin_count = User.objects.filter(role='schooladmin').count()
+    # School/user/class totals, cached until one of those models changes
+    kpis = get_super_admin_kpis()
     
     # Recent activity
-    recent_schools = School.objects.order_by('-created_at')[:5]
-    recent_announcements = Announcement.objects.order_by('-created_at')[:10]
-    
-    # Statistics
-    schools_with_most_students = School.objects.annotate(
-        student_count=Count('user', filter=Q(user__role='student'))
-    ).order_by('-student_count')[:5]
+    recent_announcements = announcements.get_feed([announcements.ALL], 10)
     
     context = {
-        'total_schools': total_schools,
-        'total_teachers': total_teachers,
-        'total_students': total_students,
-        'total_classes': total_classes,
-        'super_admin_count': super_admin_count,
-        'school_admin_count': school_admin_count,
-        'recent_schools': recent_schools,
+        **kpis,
         'recent_announcements': recent_announcements,
-        'schools_with_most_students': schools_with_most_students,
+        'fragment_versions': {
+            'top_schools': fragment_version(SUPER_ADMIN_KPIS),
+            'announcements': fragment_version(ANNOUNCEMENTS),
+        },
     }
     
     return render(request, 'accounts/dashboards/super_admin.html', context)
 
 @login_required
 @require_school_access()
+@replica_reads
 def school_admin_dashboard(request, school_slug):
     """School Admin Dashboard - Shows data for their school only"""
-    school = get_object_or_404(School, slug=school_slug)
+    school = request.school
     
     # Additional security check
-    if request.user.role != 'schooladmin':
+    if request.auth.role != 'schooladmin':
         raise PermissionDenied("School Admin access required.")
     
     # Get data for this school only
@@ -252,9 +263,8 @@ def school_admin_dashboard(request, school_slug):
     total_classes = school_classes.count()
     
     # Recent activity for this school
-    recent_announcements = Announcement.objects.filter(
-        Q(school=school) | Q(school__isnull=True)
-    ).order_by('-created_at')[:10]
+    feed_audiences = [announcements.school_audience(school.pk), announcements.GLOBAL]
+    recent_announcements = announcements.get_feed(feed_audiences, 10)
     
     # Class statistics
     classes_with_enrollment = school_classes.annotate(
@@ -271,54 +281,50 @@ def school_admin_dashboard(request, school_slug):
         'school_classes': school_classes[:10],
         'recent_announcements': recent_announcements,
         'classes_with_enrollment': classes_with_enrollment,
+        'fragment_versions': {
+            'announcements': fragment_version(*map(audience_namespace, feed_audiences)),
+        },
     }
     
     return render(request, 'accounts/dashboards/school_admin.html', context)
 
 @login_required
 @require_school_access()
+@replica_reads
 def teacher_dashboard(request, school_slug):
     """Teacher Dashboard - Shows only their classes and students"""
-    school = get_object_or_404(School, slug=school_slug)
+    school = request.school
     
     # Additional security check
-    if request.user.role != 'teacher':
+    if request.auth.role != 'teacher':
         raise PermissionDenied("Teacher access required.")
     
     # Get teacher's classes
-    teacher_classes = Class.objects.filter(teacher=request.user)
+    teacher_classes = Class.objects.filter(teacher_id=request.auth.pk)
+    class_ids = list(teacher_classes.values_list('pk', flat=True))
     
     # Get students enrolled in teacher's classes
     student_enrollments = StudentEnrollment.objects.filter(
-        class_enrolled__in=teacher_classes
+        class_enrolled__in=class_ids
     ).select_related('student', 'class_enrolled')
     
     # Get recent grades for teacher's classes
     recent_grades = Grade.objects.filter(
-        class_enrolled__in=teacher_classes
-    ).order_by('-created_at')[:10]
+        class_enrolled__in=class_ids
+    ).select_related('student', 'class_enrolled').order_by('-created_at')[:10]
     
     # Statistics
-    total_classes = teacher_classes.count()
+    total_classes = len(class_ids)
     total_students = student_enrollments.values('student').distinct().count()
     
-    # Class performance (average grades)
-    class_performance = []
-    for class_obj in teacher_classes:
-        avg_grade = Grade.objects.filter(
-            class_enrolled=class_obj
-        ).aggregate(avg_grade=Avg('grade'))['avg_grade'] or 0
-        
-        class_performance.append({
-            'class': class_obj,
-            'avg_grade': round(avg_grade, 2),
-            'student_count': StudentEnrollment.objects.filter(class_enrolled=class_obj).count()
-        })
+    # Class performance (average grades), cached until one of the classes changes
+    class_performance = get_class_performance(class_ids)
     
     # Recent announcements for teacher's classes
-    recent_announcements = Announcement.objects.filter(
-        Q(class_target__in=teacher_classes) | Q(school=school)
-    ).order_by('-created_at')[:5]
+    feed_audiences = [announcements.school_audience(school.pk)] + [
+        announcements.class_audience(class_id) for class_id in class_ids
+    ]
+    recent_announcements = announcements.get_feed(feed_audiences, 5)
     
     context = {
         'teacher_classes': teacher_classes,
@@ -328,65 +334,231 @@ def teacher_dashboard(request, school_slug):
         'total_students': total_students,
         'class_performance': class_performance,
         'recent_announcements': recent_announcements,
+        'fragment_versions': {
+            'class_performance': fragment_version(*map(class_namespace, class_ids)),
+            'announcements': fragment_version(*map(audience_namespace, feed_audiences)),
+        },
     }
     
     return render(request, 'accounts/dashboards/teacher.html', context)
 
 @login_required
 @require_school_access()
+@replica_reads
 def student_dashboard(request, school_slug):
     """Student Dashboard - Shows only their own data"""
-    school = get_object_or_404(School, slug=school_slug)
+    school = request.school
     
     # Additional security check
-    if request.user.role != 'student':
+    if request.auth.role != 'student':
         raise PermissionDenied("Student access required.")
     
     # Get student's enrollments
-    student_enrollments = StudentEnrollment.objects.filter(
-        student=request.user
-    ).select_related('class_enrolled', 'class_enrolled__teacher')
+    student_enrollments = list(StudentEnrollment.objects.filter(
+        student_id=request.auth.pk
+    ).select_related('class_enrolled', 'class_enrolled__teacher'))
     
     # Get student's grades
     student_grades = Grade.objects.filter(
-        student=request.user
-    ).order_by('-created_at')
+        student_id=request.auth.pk
+    ).select_related('class_enrolled').order_by('-created_at', '-pk')
     
-    # Calculate GPA
-    if student_grades.exists():
-        gpa = student_grades.aggregate(avg_grade=Avg('grade'))['avg_grade']
-        gpa = round(gpa, 2) if gpa else 0
-    else:
-        gpa = 0
+    # Precomputed per-class statistics
+    student_stats = {
+        stats.class_enrolled_id: stats
+        for stats in GradeStatistics.objects.filter(student_id=request.auth.pk)
+    }
+    
+    # GPA and averages as a percentage of each grade's max, cached until one of the graded classes changes
+    grade_report = get_student_report(request.auth.pk, list(student_stats))
     
     # Recent grades
     recent_grades = student_grades[:10]
     
-    # Grades by class
-    grades_by_class = {}
-    for enrollment in student_enrollments:
-        class_grades = student_grades.filter(class_enrolled=enrollment.class_enrolled)
-        if class_grades.exists():
-            class_avg = class_grades.aggregate(avg_grade=Avg('grade'))['avg_grade']
-            grades_by_class[enrollment.class_enrolled] = {
-                'grades': class_grades[:5],
-                'average': round(class_avg, 2) if class_avg else 0
-            }
+    # Five most recent grades and the average in each class, cached until one of the classes changes
+    student_classes = [enrollment.class_enrolled for enrollment in student_enrollments]
+    grades_by_class = get_grades_by_class(request.auth.pk, student_classes)
     
     # Recent announcements for student's classes
-    student_classes = [enrollment.class_enrolled for enrollment in student_enrollments]
-    recent_announcements = Announcement.objects.filter(
-        Q(class_target__in=student_classes) | Q(school=school)
-    ).order_by('-created_at')[:5]
+    feed_audiences = [announcements.school_audience(school.pk)] + [
+        announcements.class_audience(class_obj.pk) for class_obj in student_classes
+    ]
+    recent_announcements = announcements.get_feed(feed_audiences, 5)
     
     context = {
         'student_enrollments': student_enrollments,
         'student_grades': student_grades,
         'recent_grades': recent_grades,
-        'gpa': gpa,
+        'gpa': grade_report['gpa'],
+        'average_percent': grade_report['percent'],
+        'grade_report': grade_report,
         'grades_by_class': grades_by_class,
         'recent_announcements': recent_announcements,
-        'total_classes': student_enrollments.count(),
+        'total_classes': len(student_enrollments),
+        'fragment_versions': {
+            'grades_by_class': fragment_version(*(class_namespace(class_obj.pk) for class_obj in student_classes)),
+            'announcements': fragment_version(*map(audience_namespace, feed_audiences)),
+        },
     }
     
     return render(request, 'accounts/dashboards/student.html', context)
+
+# ==================== GRADEBOOK EXPORT ====================
+
+GRADEBOOK_COLUMNS = [
+    ('student__username', 'student'),
+    ('student__first_name', 'first_name'),
+    ('student__last_name', 'last_name'),
+    ('class_enrolled__name', 'class'),
+    ('class_enrolled__subject', 'subject'),
+    ('assignment_name', 'assignment'),
+    ('category', 'category'),
+    ('grade', 'grade'),
+    ('max_grade', 'max_grade'),
+    ('created_at', 'created_at'),
+]
+
+class Echo:
+    """File-like object whose write() just hands the line back to csv.writer"""
+    def write(self, value):
+        return value
+
+def stream_gradebook(grades, filename, chunk_size=2000):
+    """Stream grades as CSV without building model instances or holding the result set"""
+    # Rows are read after the view returns, so pin the database (shard or replica) chosen now
+    rows = grades.using(grades.db).order_by('class_enrolled', 'student', 'pk').values_list(
+        *[field for field, _ in GRADEBOOK_COLUMNS]
+    ).iterator(chunk_size=chunk_size)
+    writer = csv.writer(Echo())
+    
+    def lines():
+        yield writer.writerow([header for _, header in GRADEBOOK_COLUMNS])
+        for row in rows:
+            yield writer.writerow(row)
+    
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+@require_school_access()
+@replica_reads
+def school_gradebook_export(request, school_slug):
+    """Download every grade in the school as CSV (school admins only)"""
+    if request.auth.role not in ('schooladmin', 'superadmin'):
+        raise PermissionDenied("School Admin access required.")
+    
+    grades = Grade.objects.filter(class_enrolled__school=request.school)
+    return stream_gradebook(grades, f'{request.school.slug}-gradebook.csv')
+
+def get_gradebook_class(request, class_id):
+    """The requested class, if the user is its teacher or a school admin"""
+    class_obj = get_object_or_404(Class, pk=class_id, school=request.school)
+    
+    if request.auth.role == 'teacher':
+        if class_obj.teacher_id != request.auth.pk:
+            raise PermissionDenied("You don't teach this class.")
+    elif request.auth.role not in ('schooladmin', 'superadmin'):
+        raise PermissionDenied("Teacher access required.")
+    
+    return class_obj
+
+@login_required
+@require_school_access()
+@replica_reads
+def class_gradebook_export(request, school_slug, class_id):
+    """Download one class's grades as CSV (its teacher or a school admin)"""
+    class_obj = get_gradebook_class(request, class_id)
+    grades = Grade.objects.filter(class_enrolled=class_obj)
+    return stream_gradebook(grades, f'{request.school.slug}-class-{class_obj.pk}-gradebook.csv')
+
+# ==================== PAGINATED ROSTERS ====================
+
+def roster_page_size():
+    return getattr(settings, 'ROSTER_PAGE_SIZE', 50)
+
+@login_required
+@require_school_access()
+@replica_reads
+def school_roster(request, school_slug):
+    """Every student or teacher in the school, a page at a time"""
+    if request.auth.role not in ('schooladmin', 'superadmin'):
+        raise PermissionDenied("School Admin access required.")
+    
+    role = request.GET.get('role', 'student')
+    if role not in ('student', 'teacher'):
+        role = 'student'
+    
+    page = paginate_keyset(
+        User.objects.filter(school=request.school, role=role),
+        ('username', 'pk'),
+        cursor=request.GET.get('cursor'),
+        page_size=roster_page_size(),
+    )
+    
+    context = {
+        'school': request.school,
+        'role': role,
+        'page': page,
+    }
+    return render(request, 'accounts/roster/roster.html', context)
+
+@login_required
+@require_school_access()
+@replica_reads
+def school_class_list(request, school_slug):
+    """Every class in the school, a page at a time"""
+    if request.auth.role not in ('schooladmin', 'superadmin'):
+        raise PermissionDenied("School Admin access required.")
+    
+    enrollment_count = StudentEnrollment.objects.filter(
+        class_enrolled=OuterRef('pk')
+    ).values('class_enrolled').annotate(enrollment_count=Count('pk')).values('enrollment_count')
+    classes = Class.objects.filter(school=request.school).select_related('teacher').annotate(
+        enrollment_count=Coalesce(Subquery(enrollment_count), 0)
+    )
+    page = paginate_keyset(
+        classes, ('created_at', 'pk'), cursor=request.GET.get('cursor'), page_size=roster_page_size()
+    )
+    
+    context = {
+        'school': request.school,
+        'page': page,
+    }
+    return render(request, 'accounts/roster/class_list.html', context)
+
+@login_required
+@require_school_access()
+@replica_reads
+def class_gradebook(request, school_slug, class_id):
+    """A class's grades, newest first, a page at a time"""
+    class_obj = get_gradebook_class(request, class_id)
+    
+    page = paginate_keyset(
+        Grade.objects.filter(class_enrolled=class_obj).select_related('student'),
+        ('-created_at', '-pk'),
+        cursor=request.GET.get('cursor'),
+        page_size=roster_page_size(),
+    )
+    
+    context = {
+        'school': request.school,
+        'class_obj': class_obj,
+        'page': page,
+    }
+    return render(request, 'accounts/roster/gradebook.html', context)
+
+# ==================== BACKGROUND WORK ====================
+
+@login_required
+@require_school_access()
+@require_POST
+def school_recompute_reports(request, school_slug):
+    """Queue a recompute of every student's grade report (see tasks.py)"""
+    if request.auth.role != 'schooladmin':
+        raise PermissionDenied("School Admin access required.")
+    
+    schedule_school_reports(request.school)
+    messages.success(request, 'Grade reports are being recomputed in the background.')
+    return redirect('school_admin_dashboard', school_slug=school_slug)
+